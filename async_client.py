@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+import asyncio
+import datetime
+import functools
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from traceback import print_exc
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from client import GladosClient
+from scheduler import CronSchedule
+from sender import (BACKOFF_SECONDS, MAX_RETRIES, RATE_BURST,
+                    RATE_PER_SECOND, SEND_TIMEOUT, SlackError, TokenBucket,
+                    can_coalesce, coalesce)
+from storage import (Storage, create_engine, handler_session, load_config,
+                     run_in_session)
+
+EXECUTOR_WORKERS = 8
+
+
+def task_or_thread():
+    '''
+        The scope of a plugin's db_session under the asyncio runtime: every
+        task on the loop gets its own session, so overlapping coroutines
+        never commit or remove each other's work, and executor threads get
+        one each as before.
+    '''
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task or threading.get_ident()
+
+
+class AsyncSlackSender:
+    '''
+        The event loop counterpart of sender.SlackSender: the same
+        per-channel ordering, throttling, retries and coalescing, but every
+        channel is drained by a task on the loop instead of a thread.
+        `send` may be called from any thread and returns a
+        concurrent.futures.Future; async plugins can await it with
+        asyncio.wrap_future.
+    '''
+
+    def __init__(self, debug=False, rate=RATE_PER_SECOND, burst=RATE_BURST):
+        self.debug = debug
+        self.rate = rate
+        self.burst = burst
+        self.loop = None
+        self.session = None
+        # sends made before the loop started
+        self.early = []
+        self.pending = {}
+        self.buckets = {}
+        self.drains = set()
+
+    def start(self, loop, session):
+        self.loop = loop
+        self.session = session
+        for item in self.early:
+            self.enqueue(*item)
+        self.early = []
+
+    def send(self, url, data):
+        future = Future()
+        if self.loop is None:
+            self.early.append((url, data, future))
+        else:
+            self.loop.call_soon_threadsafe(self.enqueue, url, data, future)
+        return future
+
+    def enqueue(self, url, data, future):
+        channel = data['channel']
+        item = (url, data, future)
+        if channel in self.pending:
+            self.pending[channel].append(item)
+            return
+        self.pending[channel] = deque([item])
+        if channel not in self.buckets:
+            self.buckets[channel] = TokenBucket(self.rate, self.burst)
+        task = self.loop.create_task(self.drain(channel))
+        self.drains.add(task)
+        task.add_done_callback(self.drains.discard)
+
+    async def drain(self, channel):
+        bucket = self.buckets[channel]
+        queue = self.pending[channel]
+        while queue:
+            url, data, future = queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            await asyncio.sleep(bucket.delay())
+            futures = [future]
+            if can_coalesce(data):
+                data = coalesce(queue, url, data, futures)
+            try:
+                result = await self.post(url, data)
+            # pylint: disable=broad-except
+            except Exception as e:
+                print('Problem sending to {}:\n{}'.format(channel, e))
+                for waiting in futures:
+                    waiting.set_exception(e)
+            else:
+                for waiting in futures:
+                    waiting.set_result(result)
+        del self.pending[channel]
+
+    async def post(self, url, data):
+        # form fields must be strings; requests did this for us
+        form = {k: str(v) for k, v in data.items()}
+        timeout = aiohttp.ClientTimeout(total=SEND_TIMEOUT)
+        attempt = 0
+        while True:
+            try:
+                async with self.session.post(url, data=form,
+                                             timeout=timeout) as response:
+                    if self.debug:
+                        print(response.status, url)
+                    retry_after = response.headers.get('Retry-After')
+                    if response.status != 429 or attempt == MAX_RETRIES:
+                        body = await response.json(content_type=None)
+                        if not body.get('ok'):
+                            raise SlackError(body.get('error',
+                                                      'unknown error'))
+                        return body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+                retry_after = None
+            if retry_after is None:
+                await asyncio.sleep(BACKOFF_SECONDS * 2 ** attempt)
+            else:
+                await asyncio.sleep(float(retry_after))
+            attempt += 1
+
+    async def close(self):
+        '''
+            Wait for everything queued so far to be sent.
+        '''
+        while self.drains:
+            await asyncio.gather(*self.drains)
+
+
+class AsyncGladosClient(GladosClient):
+    '''
+        Runs GLaDOS on a single asyncio event loop. The websocket reader,
+        the timed plugin clock and all outbound HTTP share the loop.
+        Plugins may define `async def handle_message`. Synchronous handlers
+        run in an executor, never on the loop, and those of plugins that
+        don't set max_concurrency run one at a time, as they would inline
+        under GladosClient.
+    '''
+
+    def __init__(self, slack_token, debug=False, lazy_bootstrap=False):
+        if aiohttp is None:
+            raise RuntimeError('The asyncio runtime needs aiohttp installed')
+        self.loop = None
+        self.semaphores = {}
+        self.tasks = set()
+        super().__init__(slack_token, debug=debug, handler_workers=0,
+                         lazy_bootstrap=lazy_bootstrap,
+                         sender=AsyncSlackSender(debug=debug))
+
+    def init_memory(self):
+        self.storage = Storage(create_engine(**load_config()),
+                               scopefunc=task_or_thread)
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+        )
+        async with aiohttp.ClientSession() as session:
+            self.sender.start(self.loop, session)
+            timer = self.loop.create_task(self.run_timer())
+            try:
+                async with session.ws_connect(self.slack_url,
+                                              heartbeat=30) as socket:
+                    if self.debug:
+                        print('Hello!')
+                    async for message in socket:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self.handle_message(message.data)
+                        elif message.type == aiohttp.WSMsgType.ERROR:
+                            break
+            finally:
+                timer.cancel()
+                if self.tasks:
+                    await asyncio.wait(self.tasks)
+                await self.sender.close()
+
+    async def run_timer(self):
+        schedule = CronSchedule(self.timed_plugins)
+        while schedule.next_deadline() is not None:
+            delay = schedule.next_deadline() - datetime.datetime.now()
+            await asyncio.sleep(max(0, delay.total_seconds()))
+            for plugin in schedule.pop_due(datetime.datetime.now()):
+                self.run_timed_plugin(plugin)
+
+    def run_handler(self, plugin, handler, *args):
+        if asyncio.iscoroutinefunction(handler):
+            call = functools.partial(self.run_coroutine, plugin.db_session,
+                                     handler, *args)
+            task = self.loop.create_task(self.run_limited(plugin, call))
+        else:
+            # nothing blocking runs on the loop, where it would hold up the
+            # websocket and every send
+            call = functools.partial(self.loop.run_in_executor, None,
+                                     run_in_session, plugin.db_session,
+                                     handler, *args)
+            task = self.loop.create_task(self.run_limited(
+                plugin, call, plugin.max_concurrency <= 0
+            ))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def redispatch(self, msg):
+        self.loop.call_soon_threadsafe(self.dispatch_message, msg)
+
+    @staticmethod
+    async def run_coroutine(session, handler, *args):
+        # each run is a task of its own, so this commits and removes only
+        # the session this coroutine used
+        with handler_session(session):
+            await handler(*args)
+
+    async def run_limited(self, plugin, call, serialized=False):
+        '''
+            Run `call` once fewer than the plugin's max_concurrency of its
+            handlers are running, one at a time for plugins that didn't set
+            it. A handler that overruns handler_timeout is reported and
+            stops counting, unless `serialized`: a thread can't be stopped,
+            and a plugin that never opted in must not have two handlers
+            running at once, so its next handler waits for it regardless.
+        '''
+        if plugin not in self.semaphores:
+            self.semaphores[plugin] = asyncio.Semaphore(
+                max(1, plugin.max_concurrency)
+            )
+        async with self.semaphores[plugin]:
+            job = asyncio.ensure_future(call())
+            try:
+                await asyncio.wait_for(asyncio.shield(job),
+                                       plugin.handler_timeout)
+            except asyncio.TimeoutError:
+                print('{} handler timed out after {}s'.format(
+                    plugin.plugin_name, plugin.handler_timeout
+                ))
+                if not serialized:
+                    job.cancel()
+                    return
+                try:
+                    await job
+                # pylint: disable=broad-except
+                except Exception:
+                    print_exc()
+            # pylint: disable=broad-except
+            except Exception:
+                print_exc()
+
+    def close(self):
+        self.teardown_plugins()
+        self.resolver.shutdown(wait=True)
+        self.channel_log.stop()
+        self.channel_log.join()
+        if self.debug:
+            print('You monster')
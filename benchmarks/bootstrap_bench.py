@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+'''
+    Times a cold start against a fake Slack web API served from localhost,
+    with every call taking LATENCY seconds: bootstrapping from rtm.start
+    against paging the workspace in with rtm.connect, and then how long the
+    dispatch thread is held up by a burst of messages from users it hasn't
+    seen yet. Run from the repository root with
+    `python -m benchmarks.bootstrap_bench`.
+'''
+
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue
+from threading import Thread
+from urllib.parse import parse_qs, urlparse
+
+import client
+import directory
+from channel_log import ChannelLogWriter
+from directory import Directory, SlackAPI
+from dispatch import TriggerIndex
+
+USERS = 20000
+CHANNELS = 2000
+# a round trip to slack's web API, give or take
+LATENCY = 0.02
+# messages from users not listed yet, as just after a lazy bootstrap
+UNKNOWN_SENDERS = 100
+
+
+def workspace():
+    users = [{'id': 'U{}'.format(i), 'name': 'user{}'.format(i)}
+             for i in range(USERS)]
+    channels = [{'id': 'C{}'.format(i), 'name': 'channel{}'.format(i)}
+                for i in range(CHANNELS)]
+    return users, channels
+
+
+class FakeSlack(BaseHTTPRequestHandler):
+    users, channels = workspace()
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        url = urlparse(self.path)
+        method = url.path.rsplit('/', 1)[1]
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = getattr(self, method.replace('.', '_'))(params)
+        body['ok'] = True
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def rtm_start(self, params):
+        return {'url': 'ws://localhost', 'self': {'id': 'UBOT'},
+                'users': self.users, 'channels': self.channels}
+
+    def rtm_connect(self, params):
+        return {'url': 'ws://localhost', 'self': {'id': 'UBOT'}}
+
+    def users_list(self, params):
+        return self.page('members', self.users, params)
+
+    def conversations_list(self, params):
+        return self.page('channels', self.channels, params)
+
+    def users_info(self, params):
+        return {'user': self.users[int(params['user'][1:])]}
+
+    def conversations_info(self, params):
+        return {'channel': self.channels[int(params['channel'][1:])]}
+
+    @staticmethod
+    def page(key, items, params):
+        start = int(params.get('cursor', 0))
+        end = start + int(params['limit'])
+        body = {key: items[start:end]}
+        if end < len(items):
+            body['response_metadata'] = {'next_cursor': str(end)}
+        return body
+
+    # pylint: disable=redefined-builtin
+    def log_message(self, format, *args):
+        pass
+
+
+def make_client(log_dir):
+    # everything bootstrapping and dispatch need, without a websocket
+    glados = client.GladosClient.__new__(client.GladosClient)
+    glados.debug = False
+    glados.token = 'token'
+    glados.api = SlackAPI(glados.token)
+    glados.bot_users = set()
+    glados.users = Directory(lookup=glados.lookup_user)
+    glados.channels = Directory(lookup=glados.lookup_channel)
+    glados.debug_channel = None
+    glados.general_channel = None
+    glados.resolver = ThreadPoolExecutor(max_workers=1)
+    glados.queue = Queue()
+    glados.channel_log = ChannelLogWriter(
+        os.path.join(log_dir, '{channel}', '{date}.log')
+    )
+    glados.handler_pool = None
+    glados.plugins = []
+    glados.trigger_index = TriggerIndex([])
+    return glados
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print('{:<40} {:>10.3f} ms'.format(label, elapsed * 1000))
+
+
+def messages():
+    return [json.dumps({'type': 'message', 'channel': 'C0', 'text': 'hi',
+                        'user': 'U{}'.format(i)})
+            for i in range(UNKNOWN_SENDERS)]
+
+
+def dispatch_blocking(glados, burst):
+    # how dispatch went when a miss was looked up where it happened
+    for message in burst:
+        msg = json.loads(message)
+        glados.users.fetch(msg['user'])
+        glados.dispatch_message(msg)
+
+
+def drain(glados, count):
+    for _ in range(count):
+        glados.dispatch_message(glados.queue.get()['msg'])
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSlack)
+    Thread(target=server.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:{}/api'.format(server.server_port)
+    directory.SLACK_API_URL = base + '/{}'
+    client.SLACK_RTM_START_URL = base + '/rtm.start?token={}'
+    client.SLACK_RTM_CONNECT_URL = base + '/rtm.connect?token={}'
+    print('{} users, {} channels, {:.0f} ms per call'.format(
+        USERS, CHANNELS, LATENCY * 1000
+    ))
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        glados = make_client(log_dir)
+        timed('rtm.start bootstrap', glados.bootstrap)
+
+        glados = make_client(log_dir)
+        timed('lazy bootstrap, until plugins load', glados.lazy_bootstrap)
+        timed('lazy bootstrap, every user listed', glados.user_loader.join)
+
+        glados = make_client(log_dir)
+        glados.channels.fetch('C0')
+        timed('{} unknown senders, looked up inline'.format(
+            UNKNOWN_SENDERS
+        ), lambda: dispatch_blocking(glados, messages()))
+
+        glados = make_client(log_dir)
+        glados.channels.fetch('C0')
+        burst = messages()
+        timed('{} unknown senders, dispatch thread'.format(UNKNOWN_SENDERS),
+              lambda: [glados.handle_message(m) for m in burst])
+        timed('{} unknown senders, all handled'.format(UNKNOWN_SENDERS),
+              lambda: drain(glados, UNKNOWN_SENDERS))
+        glados.resolver.shutdown()
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
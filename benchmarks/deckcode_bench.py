@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+'''
+    Fuzzes and times the LoR deck code codec over random decks of real
+    cards: every deck must survive encoding and decoding, and every
+    truncated or corrupted code must decode or raise DecodeError. Then times
+    rendering the decks to attachments. Run from the repository root with
+    `python -m benchmarks.deckcode_bench`.
+'''
+
+import base64
+import os
+import random
+import tempfile
+import time
+
+from plugins.lor_deckcode import (FACTION_IDS, DecodeError, decode_decklist,
+                                  decoded_decks, encode_decklist,
+                                  parse_decklist)
+from plugins.lor_fetcher import (DecklistRenderer, decklist_attachments,
+                                 init_cardsearcher, load_set, set_files)
+
+DECKS = 5000
+DECK_SIZE = 40
+ALPHABET = base64.b32encode(bytes(range(256))).decode('ascii')
+
+
+def random_deck(codes):
+    deck = {}
+    while sum(deck.values()) < DECK_SIZE:
+        # now and then more than the three copies the game allows, which
+        # the codec still has to carry
+        deck[random.choice(codes)] = random.choice([1, 2, 3, 3, 3, 4])
+    return list(deck.items())
+
+
+def corruptions(code):
+    for end in range(len(code)):
+        yield code[:end]
+    for _ in range(10):
+        i = random.randrange(len(code))
+        yield code[:i] + random.choice(ALPHABET) + code[i + 1:]
+
+
+def timed(label, function, items):
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    elapsed = (time.perf_counter() - start) / len(items)
+    print('{:<32} {:>8.1f} us'.format(label, elapsed * 1000000))
+    return results
+
+
+def main():
+    random.seed(0)
+    codes = sorted({card.code for fname in set_files()
+                    for card in load_set(fname)
+                    if card.collectible and card.code[2:4] in FACTION_IDS})
+    decks = [random_deck(codes) for _ in range(DECKS)]
+
+    deck_codes = timed('encode', encode_decklist, decks)
+    decoded = timed('decode', parse_decklist, deck_codes)
+    for deck, code, result in zip(decks, deck_codes, decoded):
+        assert sorted(result) == sorted(deck), code
+    decoded_decks.clear()
+    timed('decode, first time', decode_decklist, deck_codes)
+    timed('decode, reposted', decode_decklist,
+          deck_codes[-decoded_decks.maxsize:])
+
+    corrupt = [bad for code in deck_codes for bad in corruptions(code)]
+    rejected = 0
+    start = time.perf_counter()
+    for code in corrupt:
+        try:
+            parse_decklist(code)
+        except DecodeError:
+            rejected += 1
+    elapsed = (time.perf_counter() - start) / len(corrupt)
+    print('{:<32} {:>8.1f} us  {} of {} rejected'.format(
+        'decode corrupted', elapsed * 1000000, rejected, len(corrupt)
+    ))
+
+    with tempfile.TemporaryDirectory() as directory:
+        searcher = init_cardsearcher(
+            snapshot_path=os.path.join(directory, 'lorcards.pickle')
+        )
+    renderer = DecklistRenderer(searcher)
+    timed('render, every time', lambda code: decklist_attachments(
+        decode_decklist(code), searcher
+    ), deck_codes)
+    timed('render, first time', renderer.render, deck_codes)
+    timed('render, reposted', renderer.render,
+          deck_codes[-renderer.rendered.maxsize:])
+    start = time.perf_counter()
+    renderer.render_many(deck_codes[-renderer.rendered.maxsize:])
+    elapsed = (time.perf_counter() - start) / renderer.rendered.maxsize
+    print('{:<32} {:>8.1f} us'.format('render_many, reposted',
+                                      elapsed * 1000000))
+
+if __name__ == '__main__':
+    main()
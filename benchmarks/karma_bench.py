@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+    Times the karma leaderboard and history queries once a million karma
+    events have been recorded. Run from the repository root with
+    `python -m benchmarks.karma_bench`.
+'''
+
+import os
+import random
+import tempfile
+import time
+from unittest.mock import Mock
+
+from plugins.karma import Karmator
+from storage import Storage, create_engine
+
+EVENTS = 1000000
+NAMES = 20000
+# changes counted between flushes, about a very busy ten seconds' worth
+BATCH_SIZE = 10000
+QUERIES = 1000
+
+
+def timed(label, fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print('{:<32} {:>10.3f} ms'.format(label, elapsed * 1000))
+
+
+def record_events(plugin):
+    names = ['name{}'.format(i) for i in range(NAMES)]
+    for _ in range(EVENTS // BATCH_SIZE):
+        plugin.add_karma([(random.choice(names), random.choice((1, -1)))
+                          for _ in range(BATCH_SIZE)])
+        plugin.flush()
+
+
+def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        url = 'sqlite:///{}'.format(os.path.join(directory, 'memory.db'))
+        storage = Storage(create_engine(url))
+        plugin = Karmator(storage.session(), Mock())
+        plugin.setup()
+
+        timed('record {} events'.format(EVENTS),
+              lambda: record_events(plugin))
+        timed('karma --top 10', lambda: plugin.handle_message(
+            {'type': 'message', 'text': 'karma --top 10', 'channel': 'C'}
+        ), QUERIES)
+        timed('karma --bottom 10', lambda: plugin.handle_message(
+            {'type': 'message', 'text': 'karma --bottom 10', 'channel': 'C'}
+        ), QUERIES)
+        timed('one change', lambda: plugin.add_karma([('name1', 1)]),
+              QUERIES)
+        timed('karma NAME over 30 days', lambda: plugin.handle_message(
+            {'type': 'message', 'text': 'karma name1 over 30 days',
+             'channel': 'C'}
+        ), 100)
+        restarted = Karmator(storage.session(), Mock())
+        timed('load leaderboard at setup', restarted.setup)
+        storage.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+'''
+    Times loading the LoR card database, and measures the memory it holds
+    on to, from the set files and from the snapshot, and reloading it after
+    one set file changes. Then times looking up every card name misspelt and
+    by its start. Run from the repository root
+    with `python -m benchmarks.lor_bench`.
+'''
+
+import gc
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from plugins.lor_fetcher import (LOR_DATA_PATH, CardSearcher,
+                                 init_cardsearcher, load_set,
+                                 reload_cardsearcher, set_files)
+
+REPEAT = 20
+
+
+def load_json_dicts():
+    # what CardSearcher used to keep: every card's full dict, from every file
+    cards_by_id = {}
+    for fname in os.listdir(LOR_DATA_PATH):
+        with open(os.path.join(LOR_DATA_PATH, fname),
+                  encoding='utf-8') as data_file:
+            for card in json.loads(data_file.read()):
+                cards_by_id[card['cardCode']] = card
+    return cards_by_id
+
+
+def build_from_sets():
+    stamps = set_files()
+    return CardSearcher({fname: load_set(fname) for fname in stamps}, stamps)
+
+
+def measure(label, load):
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        load()
+    elapsed = (time.perf_counter() - start) / REPEAT
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print('{:<28} {:>8.1f} ms {:>8.0f} KiB'.format(label, elapsed * 1000,
+                                                   held / 1024))
+
+
+def time_reload(directory):
+    data_path = os.path.join(directory, 'lorcards')
+    shutil.copytree(LOR_DATA_PATH, data_path)
+    snapshot_path = os.path.join(directory, 'reload.pickle')
+    searcher = init_cardsearcher(data_path, snapshot_path)
+    changed = os.path.join(data_path, sorted(os.listdir(data_path))[-1])
+    elapsed = 0
+    for i in range(REPEAT):
+        os.utime(changed, ns=(i, i))
+        start = time.perf_counter()
+        searcher = reload_cardsearcher(searcher, data_path, snapshot_path)
+        elapsed += time.perf_counter() - start
+    print('{:<28} {:>8.1f} ms'.format('reload, one set changed',
+                                      elapsed / REPEAT * 1000))
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        reload_cardsearcher(searcher, data_path, snapshot_path)
+    print('{:<28} {:>8.1f} ms'.format(
+        'reload, nothing changed',
+        (time.perf_counter() - start) / REPEAT * 1000
+    ))
+
+
+def misspell(name):
+    # swap two letters, then drop one
+    i = random.randrange(len(name) - 1)
+    name = name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    i = random.randrange(len(name))
+    return name[:i] + name[i + 1:]
+
+
+def time_lookups(label, searcher, queries):
+    found = 0
+    start = time.perf_counter()
+    for query, name in queries:
+        found += searcher.match_name(query) == name
+    elapsed = (time.perf_counter() - start) / len(queries)
+    print('{:<28} {:>8.3f} ms {:>7.0%} right'.format(label, elapsed * 1000,
+                                                    found / len(queries)))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, 'lorcards.pickle')
+        init_cardsearcher(snapshot_path=snapshot_path)
+        print('{:<28} {:>11} {:>12}'.format('', 'load', 'held'))
+        measure('full json dicts', load_json_dicts)
+        measure('records and indexes', build_from_sets)
+        measure('snapshot', lambda: init_cardsearcher(
+            snapshot_path=snapshot_path
+        ))
+        time_reload(directory)
+
+        searcher = init_cardsearcher(snapshot_path=snapshot_path)
+        names = sorted(searcher.names.sizes)
+        random.seed(0)
+        print('\n{} card names'.format(len(names)))
+        time_lookups('exact name', searcher,
+                     [(name, name) for name in names])
+        time_lookups('misspelt name', searcher,
+                     [(misspell(name), name) for name in names])
+        time_lookups('start of name', searcher,
+                     [(name[:len(name) // 2 + 2], name) for name in names])
+
+if __name__ == '__main__':
+    main()
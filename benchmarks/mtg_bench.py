@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+    Times building the local MTG card store from bulk data shaped like
+    Scryfall's Oracle Cards file, loading it from its snapshot, and looking
+    cards up in it. Run from the repository root with
+    `python -m benchmarks.mtg_bench`.
+'''
+
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from plugins.mtg_cards import init_card_store
+
+CARDS = 30000
+QUERIES = 10000
+WORDS = ['lightning', 'bolt', 'angel', 'goblin', 'guide', 'dark', 'ritual',
+         'llanowar', 'elves', 'serra', 'wrath', 'god', 'counter', 'spell',
+         'shock', 'land', 'tarmogoyf', 'thoughtseize', 'path', 'exile',
+         'sword', 'fire', 'ice', 'stone', 'rain', 'sliver', 'knight',
+         'dragon', 'storm', 'crow']
+TYPES = ['Instant', 'Sorcery', 'Creature — Goblin Warrior', 'Artifact',
+         'Legendary Planeswalker — Jace', 'Enchantment — Aura', 'Land']
+
+
+def card_names():
+    names = set()
+    while len(names) < CARDS:
+        words = random.sample(WORDS, random.randint(1, 4))
+        names.add(' '.join(words).title() + ' {}'.format(len(names) % 97))
+    return sorted(names)
+
+
+def bulk_card(name):
+    return {
+        'name': name,
+        'layout': 'normal',
+        'mana_cost': '{2}{R}',
+        'type_line': random.choice(TYPES),
+        'oracle_text': ' '.join(random.choice(WORDS) for _ in range(30)),
+        'power': '2',
+        'toughness': '2',
+        'multiverse_ids': [random.randint(1, 500000)],
+        'image_uris': {
+            'small': 'https://example.com/small/{}.jpg'.format(name),
+            'normal': 'https://example.com/normal/{}.jpg'.format(name),
+            'large': 'https://example.com/large/{}.jpg'.format(name),
+        },
+    }
+
+
+def timed(label, function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    elapsed = (time.perf_counter() - start) / len(items)
+    print('{:<28} {:>10.4f} ms'.format(label, elapsed * 1000))
+
+
+def main():
+    random.seed(0)
+    names = card_names()
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, 'mtgcards.json')
+        snapshot_path = os.path.join(directory, 'mtgcards.pickle')
+        with open(data_path, 'w', encoding='utf-8') as data_file:
+            data_file.write(json.dumps([bulk_card(name) for name in names]))
+
+        start = time.perf_counter()
+        init_card_store(data_path, snapshot_path)
+        print('{:<28} {:>10.1f} ms'.format(
+            'build from bulk data', (time.perf_counter() - start) * 1000
+        ))
+        start = time.perf_counter()
+        init_card_store(data_path, snapshot_path)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        store = init_card_store(data_path, snapshot_path)
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{:<28} {:>10.1f} ms {:>8.0f} KiB'.format(
+            'load snapshot', elapsed * 1000, held / 1024
+        ))
+
+    queries = random.sample(names, QUERIES)
+    timed('exact name', store.get_card, queries)
+    timed('start of name', store.get_card,
+          [name[:len(name) // 2 + 3].lower() for name in queries])
+    timed('no such card', store.get_card,
+          ['no such card {}'.format(i) for i in range(QUERIES)])
+
+if __name__ == '__main__':
+    main()
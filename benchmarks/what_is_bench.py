@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+'''
+    Times WhatIs recalls with tens of thousands of memories. Run from the
+    repository root with `python -m benchmarks.what_is_bench`.
+'''
+
+import os
+import random
+import string
+import tempfile
+import time
+from unittest.mock import Mock
+
+from plugins.what_is import Item, WhatIs
+from storage import Storage, create_engine
+
+ITEMS = 50000
+QUERIES = 1000
+
+
+def timed(label, fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print('{:<32} {:>10.1f} us'.format(label, elapsed * 1000000))
+
+
+def random_name():
+    return ' '.join(''.join(random.choice(string.ascii_lowercase)
+                            for _ in range(random.randint(3, 9)))
+                    for _ in range(random.randint(1, 3)))
+
+
+def main():
+    random.seed(0)
+    names = list({random_name() for _ in range(ITEMS)})
+    with tempfile.TemporaryDirectory() as directory:
+        url = 'sqlite:///{}'.format(os.path.join(directory, 'memory.db'))
+        storage = Storage(create_engine(url))
+        with storage.engine.begin() as connection:
+            connection.execute(Item.__table__.insert(), [
+                {'name': name, 'alias': 'thing number {}'.format(i)}
+                for i, name in enumerate(names)
+            ])
+        plugin = WhatIs(storage.session(), Mock())
+        timed('setup with {} memories'.format(len(names)), plugin.setup)
+
+        cold = iter(random.sample(names, QUERIES))
+        timed('recall, not cached', lambda: plugin.recall(next(cold)),
+              QUERIES)
+        timed('recall, cached', lambda: plugin.recall(names[0]), QUERIES)
+        timed('recall, unknown', lambda: plugin.recall('no such thing'),
+              QUERIES)
+        misspelt = iter([name[:-1] + 'q' for name in
+                         random.sample(names, QUERIES)])
+        timed('suggestions for a near miss',
+              lambda: plugin.index.suggest(next(misspelt), 3), QUERIES)
+        storage.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import datetime
+import glob
+import gzip
+import os
+import re
+import shutil
+import string
+import time
+from threading import Condition, Thread
+
+from lru import LRUCache
+
+LOG_ENTRY_TEMPLATE = '[{time}] {name}: {message}'
+# buffered lines are written out this often, or sooner once there are
+# FLUSH_BYTES of them
+FLUSH_INTERVAL = 5
+FLUSH_BYTES = 64 * 1024
+# log files are opened on first write, and at most MAX_OPEN_LOGS of them
+# are kept open. Files not written to for LOG_IDLE_TIMEOUT seconds are closed.
+MAX_OPEN_LOGS = 128
+LOG_IDLE_TIMEOUT = 600
+# lines that can't be written, e.g. with the disk full, are tried again with
+# the next batch, and dropped after failing this many times in a row
+WRITE_ATTEMPTS = 3
+
+
+class ChannelLogWriter(Thread):
+    '''
+        Buffers channel log lines in memory and writes them out in batches
+        from a background thread. Every line goes to the file for the day it
+        was logged, so logs roll over at midnight, and with `compress` set
+        the previous day's files are gzipped once the day is over, including
+        any closed early for going quiet and any left over from a restart.
+        Files are only opened when there is something to write to them and
+        are kept in a bounded LRU, so a workspace with thousands of quiet
+        channels only costs a file descriptor per active one.
+    '''
+
+    def __init__(self, template, compress=False,
+                 max_open_logs=MAX_OPEN_LOGS):
+        self.template = template
+        self.compress = compress
+        self.running = True
+        self.wakeup = Condition()
+        # (channel name, date) => list of lines waiting to be written
+        self.buffers = {}
+        self.buffered_bytes = 0
+        # (channel name, date) => open log file
+        self.files = LRUCache(max_open_logs, on_evict=self.close_file)
+        # (channel name, date) => when that file was last written to
+        self.last_write = {}
+        # (channel name, date) => how many writes to it failed in a row
+        self.failures = {}
+        # the day logs were last rolled over on
+        self.day = self.today()
+        super().__init__()
+
+    def write(self, channel_name, name, message):
+        now = datetime.datetime.now()
+        line = LOG_ENTRY_TEMPLATE.format(
+            time=now.strftime('%H:%M:%S'),
+            name=name,
+            message=message + '\n'
+        )
+        key = (channel_name, now.strftime('%Y-%m-%d'))
+        with self.wakeup:
+            self.buffers.setdefault(key, []).append(line)
+            self.buffered_bytes += len(line)
+            if self.buffered_bytes >= FLUSH_BYTES:
+                self.wakeup.notify()
+
+    def run(self):
+        running = True
+        while running:
+            with self.wakeup:
+                if self.running:
+                    self.wakeup.wait(FLUSH_INTERVAL)
+                buffers = self.buffers
+                self.buffers = {}
+                self.buffered_bytes = 0
+                running = self.running
+            self.write_buffers(buffers)
+        for key, log_file in self.files.oldest():
+            self.files.pop(key)
+            self.close_file(key, log_file)
+        self.compress_old_logs(self.today())
+
+    def write_buffers(self, buffers):
+        now = time.monotonic()
+        for key, lines in buffers.items():
+            try:
+                log_file = self.files.get(key)
+                if log_file is None:
+                    log_file = self.open_file(key)
+                log_file.write(''.join(lines))
+                log_file.flush()
+            except OSError as err:
+                self.write_failed(key, lines, err)
+                continue
+            self.failures.pop(key, None)
+            self.last_write[key] = now
+        self.close_old_files(now)
+
+    def write_failed(self, key, lines, err):
+        '''
+            Close a log that couldn't be written to and put its lines back in
+            front of any newer ones, unless it has failed too often or we're
+            stopping, in which case they're dropped.
+        '''
+        log_file = self.files.pop(key)
+        if log_file is not None:
+            self.close_file(key, log_file)
+        failures = self.failures.get(key, 0) + 1
+        with self.wakeup:
+            if failures < WRITE_ATTEMPTS and self.running:
+                print('Could not write the {} log for {}, will retry: '
+                      '{}'.format(key[0], key[1], err))
+                self.failures[key] = failures
+                self.buffers[key] = lines + self.buffers.get(key, [])
+                self.buffered_bytes += sum(len(line) for line in lines)
+                return
+        print('Dropping {} lines of the {} log for {}: {}'.format(
+            len(lines), key[0], key[1], err
+        ))
+        self.failures.pop(key, None)
+
+    def open_file(self, key):
+        channel_name, date = key
+        file_name = self.template.format(channel=channel_name, date=date)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        log_file = open(file_name, 'a+')
+        self.files.put(key, log_file)
+        return log_file
+
+    def close_file(self, key, log_file):
+        self.last_write.pop(key, None)
+        try:
+            log_file.close()
+            if self.compress and key[1] < self.today():
+                compress_file(log_file.name)
+        except OSError as err:
+            print('Could not close the {} log for {}: {}'.format(
+                key[0], key[1], err
+            ))
+
+    def close_old_files(self, now):
+        '''
+            Close the files of days that are over, and of channels that
+            have gone quiet.
+        '''
+        today = self.today()
+        for key, log_file in self.files.oldest():
+            if key[1] < today or \
+               now - self.last_write[key] > LOG_IDLE_TIMEOUT:
+                self.files.pop(key)
+                self.close_file(key, log_file)
+        if today != self.day:
+            self.day = today
+            self.compress_old_logs(today)
+
+    def compress_old_logs(self, today):
+        '''
+            Gzip the logs of days before `today` that aren't open, which
+            close_file left alone because their day wasn't over yet.
+        '''
+        if not self.compress:
+            return
+        for key, file_name in log_files(self.template):
+            if key[1] >= today or key in self.files:
+                continue
+            try:
+                compress_file(file_name)
+            except OSError as err:
+                print('Could not compress the {} log for {}: {}'.format(
+                    key[0], key[1], err
+                ))
+
+    @staticmethod
+    def today():
+        return datetime.date.today().strftime('%Y-%m-%d')
+
+    def stop(self):
+        '''
+            Write out everything buffered so far and close the log files.
+        '''
+        with self.wakeup:
+            self.running = False
+            self.wakeup.notify()
+
+
+def log_files(template):
+    '''
+        Yield the (channel name, date) and file name of every uncompressed
+        log written with `template`.
+    '''
+    pattern = ''
+    for literal, field, _, _ in string.Formatter().parse(template):
+        pattern += re.escape(literal)
+        if field == 'channel':
+            pattern += r'(?P<channel>[^/]+)'
+        elif field == 'date':
+            pattern += r'(?P<date>\d{4}-\d{2}-\d{2})'
+    log_re = re.compile(pattern + '$')
+    for file_name in glob.glob(template.format(channel='*', date='*')):
+        match = log_re.match(file_name)
+        if match:
+            yield (match.group('channel'), match.group('date')), file_name
+
+
+def compress_file(file_name):
+    with open(file_name, 'rb') as log_file:
+        with gzip.open(file_name + '.gz', 'ab') as compressed_file:
+            shutil.copyfileobj(log_file, compressed_file)
+    os.remove(file_name)
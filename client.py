@@ -2,24 +2,28 @@
 
 import datetime
 import json
-import os
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
 from queue import Queue
 from threading import Thread
 from traceback import print_exc
 
 import requests
-import sqlalchemy
-from croniter import croniter
-from sqlalchemy.orm import sessionmaker
 from ws4py.client.threadedclient import WebSocketClient
 
-from plugin_base import DeclarativeBase as Base
+from channel_log import ChannelLogWriter
+from directory import Directory, SlackAPI
+from dispatch import TriggerIndex
 from plugin_base import TimedPluginBase
+from scheduler import CronSchedule, SchedulerThread
+from sender import SlackError, SlackSender, gather
+from storage import (Storage, create_engine, handler_session, load_config,
+                     run_in_session)
+from workers import HANDLER_WORKERS, HandlerPool
 
 SLACK_RTM_START_URL = 'https://slack.com/api/rtm.start?token={}'
+SLACK_RTM_CONNECT_URL = 'https://slack.com/api/rtm.connect?token={}'
 SLACK_POST_MESSAGE_URL = 'https://slack.com/api/chat.postMessage'
 SLACK_ADD_REACTION_URL = 'https://slack.com/api/reactions.add'
 PLUGINS_FILENAME = 'plugins.json'
@@ -28,7 +32,7 @@ PLUGINS_FILENAME = 'plugins.json'
 DEBUG_CHANNEL_NAME = 'aperture-science'
 LOG_FILE_TEMPLATE = '/var/log/glados/{channel}/{date}.log'
 DEBUG_LOG_FILE_TEMPLATE = '/tmp/glados/{channel}/{date}.log'
-LOG_ENTRY_TEMPLATE = '[{time}] {name}: {message}'
+COMPRESS_OLD_LOGS = False
 
 PLUGIN_HELP_RE = re.compile(r'glados,? help (.*)', re.I)
 HELP_RE = re.compile(r'glados,? help', re.I)
@@ -37,6 +41,7 @@ MSG_TYPE_TIMER = 1
 MSG_TYPE_MESSAGE = 2
 MSG_TYPE_CLOSED = 3
 MSG_TYPE_TERMINATE = 4
+MSG_TYPE_RESOLVED = 5
 
 HELP_TEXT = '''
 Hello. I am GLaDOS (Genetic Lifeform and Disk Operating System).
@@ -50,82 +55,174 @@ Contribute to my development at http://github.com/patrickwhite256/glados
 
 
 class GladosClient:
-    def __init__(self, slack_token, debug=False):
-        self.interval_thread = None
+    def __init__(self, slack_token, debug=False,
+                 handler_workers=HANDLER_WORKERS, lazy_bootstrap=False,
+                 sender=None):
+        self.scheduler_thread = None
         self.socket_thread = None
-
-        self.bot_users = []
-        self.users = {}
-        self.channels = {}
+        self.user_loader = None
+
+        self.bot_users = set()
+        # kept current from RTM events, with anything missed looked up by
+        # the resolver, so the dispatch thread never waits on the web API
+        self.users = Directory(lookup=self.lookup_user)
+        self.channels = Directory(lookup=self.lookup_channel)
+        self.resolver = ThreadPoolExecutor(max_workers=1)
+        self.queue = Queue()
         self.debug_channel = None
         self.general_channel = None
         self.debug = debug
         self.token = slack_token
+        self.api = SlackAPI(slack_token)
+        # set before plugins load, as they may send from setup()
+        self.sender = sender or SlackSender(debug=debug)
+        self.handler_pool = None
+        if handler_workers:
+            self.handler_pool = HandlerPool(handler_workers)
+
+        if debug:
+            log_file_template = DEBUG_LOG_FILE_TEMPLATE
+        else:
+            log_file_template = LOG_FILE_TEMPLATE
+        self.channel_log = ChannelLogWriter(log_file_template,
+                                            compress=COMPRESS_OLD_LOGS)
+        self.channel_log.start()
 
-        date = datetime.date.today().strftime('%Y-%m-%d')
-        wsdata = requests.get(SLACK_RTM_START_URL.format(slack_token)).json()
-        self.slack_url = wsdata['url']
-        for user in wsdata['users']:
-            if user.get('is_bot'):
-                self.bot_users.append(user['id'])
-            self.users[user['id']] = user['name']
-        self.bot_id = wsdata['self']['id']
-        self.log_files = dict()
-        for channel in wsdata['channels']:
-            if channel['is_archived']:
-                continue
-            self.channels[channel['id']] = channel['name']
-            if debug:
-                log_file_name = DEBUG_LOG_FILE_TEMPLATE.format(
-                    channel=channel['name'], date=date
-                )
-            else:
-                log_file_name = LOG_FILE_TEMPLATE.format(
-                    channel=channel['name'], date=date
-                )
-            try:
-                os.makedirs(os.path.dirname(log_file_name))
-            except:
-                pass
-            log_file = open(log_file_name, 'a+')
-            self.log_files[channel['id']] = log_file
-            if channel['name'] == DEBUG_CHANNEL_NAME:
-                self.debug_channel = channel['id']
-            if channel['is_general']:
-                self.general_channel = channel['id']
+        if lazy_bootstrap:
+            self.lazy_bootstrap()
+        else:
+            self.bootstrap()
         if self.debug:
             self.general_channel = self.debug_channel
 
         self.plugin_metadata = []
         self.plugins = []
         self.timed_plugins = []
+        self.trigger_index = None
         self.load_plugins()
         self.init_memory()
         self.init_plugins()
 
+    def bootstrap(self):
+        '''
+            Learn about the whole workspace from a single rtm.start call.
+        '''
+        wsdata = requests.get(SLACK_RTM_START_URL.format(self.token)).json()
+        self.slack_url = wsdata['url']
+        for user in wsdata['users']:
+            self.add_user(user)
+        self.bot_id = wsdata['self']['id']
+        for channel in wsdata['channels']:
+            self.add_channel(channel)
+
+    def lazy_bootstrap(self):
+        '''
+            Connect with rtm.connect, which only returns the websocket url,
+            and learn about the workspace through paginated list calls.
+            Channels are listed before plugins load, since plugins look them
+            up by name in setup(). Users are listed in the background, and
+            a message from a user or channel not known yet waits for it to
+            be looked up, off the dispatch thread.
+        '''
+        wsdata = requests.get(SLACK_RTM_CONNECT_URL.format(self.token)).json()
+        self.slack_url = wsdata['url']
+        self.bot_id = wsdata['self']['id']
+        for channel in self.api.pages('conversations.list', 'channels',
+                                      exclude_archived='true',
+                                      types='public_channel'):
+            self.add_channel(channel)
+        self.user_loader = Thread(target=self.load_users)
+        self.user_loader.start()
+
+    def load_users(self):
+        try:
+            for user in self.api.pages('users.list', 'members'):
+                self.add_user(user)
+        except (SlackError, requests.RequestException) as e:
+            print('Could not list users:\n{}'.format(e))
+
+    def lookup_user(self, user_id):
+        try:
+            user = self.api.call('users.info', user=user_id)['user']
+        except (SlackError, requests.RequestException):
+            return None
+        if user.get('is_bot'):
+            self.bot_users.add(user['id'])
+        return user['name']
+
+    def lookup_channel(self, channel_id):
+        try:
+            channel = self.api.call('conversations.info',
+                                    channel=channel_id)['channel']
+        except (SlackError, requests.RequestException):
+            return None
+        # direct messages have no name, and were never logged
+        return channel.get('name')
+
+    def add_user(self, user):
+        if user.get('is_bot'):
+            self.bot_users.add(user['id'])
+        self.users[user['id']] = user['name']
+
+    def add_channel(self, channel):
+        if channel.get('is_archived'):
+            return
+        self.channels[channel['id']] = channel['name']
+        if channel['name'] == DEBUG_CHANNEL_NAME:
+            self.debug_channel = channel['id']
+        if channel.get('is_general'):
+            self.general_channel = channel['id']
+
     def run(self):
-        queue = Queue()
-        self.interval_thread = IntervalThread(queue)
-        self.interval_thread.start()
+        queue = self.queue
+
+        def fire(plugin):
+            queue.put({'type': MSG_TYPE_TIMER, 'plugin': plugin})
+
+        self.scheduler_thread = SchedulerThread(
+            CronSchedule(self.timed_plugins), fire
+        )
+        self.scheduler_thread.start()
         self.socket_thread = GladosWSClient(self.slack_url, queue, self.debug)
         self.socket_thread.start()
         while True:
             message = queue.get()
             if message['type'] == MSG_TYPE_TIMER:
-                self.run_timed_plugins()
+                self.run_timed_plugin(message['plugin'])
             elif message['type'] == MSG_TYPE_CLOSED:
                 self.close()
             elif message['type'] == MSG_TYPE_MESSAGE:
                 self.handle_message(message['msg'])
+            elif message['type'] == MSG_TYPE_RESOLVED:
+                self.dispatch_message(message['msg'])
 
     def handle_message(self, message):
         msg = json.loads(message)
         if self.debug:
             print(message)
         msg_type = msg.get('type')
+        if msg_type in ('team_join', 'user_change'):
+            self.add_user(msg['user'])
+            return
+        if msg_type in ('channel_created', 'channel_joined',
+                        'channel_rename'):
+            # the channel gets a log file as soon as something is said in it
+            self.add_channel(msg['channel'])
+            return
         if msg_type == 'message' and 'text' not in msg:
             # this is more trouble than it's worth handling, seriously
             return
+        if msg_type == 'message' and (
+            self.users.needs_lookup(msg.get('user')) or
+            self.channels.needs_lookup(msg.get('channel'))
+        ):
+            # handled once the resolver has looked them up
+            self.resolver.submit(self.resolve_message, msg)
+            return
+        self.dispatch_message(msg)
+
+    def dispatch_message(self, msg):
+        msg_type = msg.get('type')
         if 'channel' in msg and msg_type == 'message':
             self.log_message(msg['text'], msg.get('user'), msg['channel'])
         if (self.debug and msg.get('channel') != self.debug_channel) or \
@@ -140,10 +237,10 @@ class GladosClient:
             return
         if 'ok' in msg:
             return
-        for plugin in self.plugins:
+        for plugin in self.trigger_index.candidates(msg.get('text')):
             try:
                 if plugin.can_handle_message(msg):
-                    plugin.handle_message(msg)
+                    self.run_handler(plugin, plugin.handle_message, msg)
                     if plugin.consumes_message:
                         return
             # pylint: disable=bare-except
@@ -151,26 +248,64 @@ class GladosClient:
                 print_exc()
                 # TODO: reload that plugin
 
+    def run_handler(self, plugin, handler, *args):
+        '''
+            Run a plugin handler, on the worker pool if the plugin allows it.
+            Whether the message is consumed never depends on the handler, so
+            later plugins can be dispatched without waiting for it.
+        '''
+        if self.handler_pool is None or plugin.max_concurrency <= 0:
+            run_in_session(plugin.db_session, handler, *args)
+            return
+        self.handler_pool.submit(plugin, run_in_session, plugin.db_session,
+                                 handler, *args)
+
+    def resolve_message(self, msg):
+        '''
+            Look up the user and channel of a message, on the resolver
+            thread, then hand it back to be dispatched. Anything that
+            arrived meanwhile may be handled first.
+        '''
+        try:
+            self.users.fetch(msg.get('user'))
+            self.channels.fetch(msg.get('channel'))
+        # pylint: disable=bare-except
+        except:
+            print_exc()
+        self.redispatch(msg)
+
+    def redispatch(self, msg):
+        self.queue.put({'type': MSG_TYPE_RESOLVED, 'msg': msg})
+
     def close(self):
-        self.session.commit()
-        for plugin in self.plugins:
-            plugin.teardown()
-        for log_file in self.log_files.values():
-            log_file.close()
+        if self.handler_pool is not None:
+            self.handler_pool.close()
+        self.teardown_plugins()
+        self.resolver.shutdown(wait=True)
+        self.sender.close()
         print('Stopping threads...')
-        self.interval_thread.stop()
-        self.interval_thread.join()
+        self.channel_log.stop()
+        self.channel_log.join()
+        self.scheduler_thread.stop()
+        self.scheduler_thread.join()
         if self.socket_thread.is_alive():
             self.socket_thread.stop()
             self.socket_thread.join()
         if self.debug:
             print('You monster')
 
+    def teardown_plugins(self):
+        for plugin in self.plugins:
+            try:
+                with handler_session(plugin.db_session):
+                    plugin.teardown()
+            # pylint: disable=bare-except
+            except:
+                print_exc()
+        self.storage.close()
+
     def init_memory(self):
-        engine = sqlalchemy.create_engine('sqlite:///memory.db')
-        Base.metadata.create_all(engine)
-        session_cls = sessionmaker(engine)
-        self.session = session_cls()
+        self.storage = Storage(create_engine(**load_config()))
 
     def load_plugins(self):
         try:
@@ -202,8 +337,9 @@ class GladosClient:
             try:
                 # TODO: a more elegant way of passing data to plugins
                 plugin = plugin_class(
-                    self.session,
+                    self.storage.session(),
                     self.post_message,
+                    send_many=self.post_many,
                     react_to_message=self.react_to_message,
                     reply_to_message=self.reply_to_message,
                     debug=self.debug,
@@ -229,21 +365,38 @@ class GladosClient:
                 ))
 
         for plugin in self.plugins:
-            plugin.setup()
+            with handler_session(plugin.db_session):
+                plugin.setup()
+
+        self.trigger_index = TriggerIndex(self.plugins)
 
     def log_message(self, message, user_id, channel_id):
+        if self.users.needs_lookup(user_id) or \
+           self.channels.needs_lookup(channel_id):
+            # this may be the dispatch thread, which never waits on slack
+            self.resolver.submit(self.resolve_log_message, message, user_id,
+                                 channel_id)
+            return
         try:
-            log_file = self.log_files[channel_id]
+            channel_name = self.channels[channel_id]
         except KeyError:
             return
-        log_file.write(LOG_ENTRY_TEMPLATE.format(
-            time=datetime.datetime.now().strftime('%H:%M:%S'),
-            name=self.users.get(user_id, 'BOT'),
-            message=message + '\n'
-        ))
-        log_file.flush()
+        self.channel_log.write(channel_name, self.users.get(user_id, 'BOT'),
+                               message)
+
+    def resolve_log_message(self, message, user_id, channel_id):
+        try:
+            self.users.fetch(user_id)
+            self.channels.fetch(channel_id)
+        # pylint: disable=bare-except
+        except:
+            print_exc()
+            return
+        self.log_message(message, user_id, channel_id)
 
     def handle_help_message(self, message, channel):
+        if message[:6].lower() != 'glados':
+            return False
         match = PLUGIN_HELP_RE.match(message)
         if match:
             plugin_name = match.group(1).lower()
@@ -278,9 +431,20 @@ class GladosClient:
             data['attachments'] = attachments_json
         else:
             self.log_message(message, self.bot_id, channel)
-        response = requests.post(SLACK_POST_MESSAGE_URL, data=data)
-        if self.debug:
-            print(response)
+        return self.sender.send(SLACK_POST_MESSAGE_URL, data)
+
+    def post_many(self, message, recipients, attachments=None):
+        '''
+            Send the same message to every recipient at once. Each one is its
+            own conversation, so the sender posts them concurrently, within
+            each one's rate limit.
+            Returns a future for a dict of recipient => slack's response, or
+            the exception sending to that recipient failed with.
+        '''
+        return gather({
+            recipient: self.post_message(message, recipient, attachments)
+            for recipient in recipients
+        })
 
     def react_to_message(self, msg, reaction):
         data = {
@@ -289,9 +453,7 @@ class GladosClient:
             'timestamp': msg['ts'],
             'name': reaction
         }
-        response = requests.post(SLACK_ADD_REACTION_URL, data=data)
-        if self.debug:
-            print(response)
+        return self.sender.send(SLACK_ADD_REACTION_URL, data)
 
     def reply_to_message(self, msg, reply_text):
         data = {
@@ -301,23 +463,14 @@ class GladosClient:
             'thread_ts': msg.get('thread_ts') or msg['ts'],
             'as_user': True
         }
-        response = requests.post(SLACK_POST_MESSAGE_URL, data=data)
-        if self.debug:
-            print(response)
+        return self.sender.send(SLACK_POST_MESSAGE_URL, data)
 
     def post_general(self, message):
-        self.post_message(message, self.general_channel)
-
-    def run_timed_plugins(self):
-        now = datetime.datetime.now().replace(second=0, microsecond=0)
+        return self.post_message(message, self.general_channel)
 
-        for plugin in self.timed_plugins:
-            time_iter = croniter(plugin.interval, plugin.last_run_time)
-            next_time = time_iter.get_next(datetime.datetime).replace(
-                second=0, microsecond=0)
-            if next_time <= now:
-                plugin.run_timed_event()
-                plugin.last_run_time = now
+    def run_timed_plugin(self, plugin):
+        plugin.last_run_time = datetime.datetime.now()
+        self.run_handler(plugin, plugin.run_timed_event)
 
 
 class GladosWSClient(Thread):
@@ -352,26 +505,6 @@ class GladosWSClient(Thread):
         self.client.close()
 
 
-class IntervalThread(Thread):
-    def __init__(self, queue):
-        self.queue = queue
-        self.running = True
-        super().__init__()
-
-    def run(self):
-        count = 0
-        while self.running:
-            # sleeps in 1 second intervals so it can be stopped in a short time
-            count += 1
-            if count == 60:
-                count = 0
-                self.queue.put({'type': MSG_TYPE_TIMER})
-            time.sleep(1)
-
-    def stop(self):
-        self.running = False
-
-
 # For debugging
 def main():
     try:
@@ -0,0 +1,103 @@
+import requests
+
+from sender import SlackError
+
+SLACK_API_URL = 'https://slack.com/api/{}'
+PAGE_SIZE = 200
+API_TIMEOUT = 10
+
+
+class SlackAPI:
+    '''
+        A minimal client for the read-only Slack web API methods used to
+        learn about the workspace.
+    '''
+
+    def __init__(self, token, session=None):
+        self.token = token
+        self.session = session or requests.Session()
+
+    def call(self, method, **params):
+        params['token'] = self.token
+        body = self.session.get(SLACK_API_URL.format(method), params=params,
+                                timeout=API_TIMEOUT).json()
+        if not body.get('ok'):
+            raise SlackError(body.get('error', 'unknown error'))
+        return body
+
+    def pages(self, method, key, **params):
+        '''
+            Yield every item of a paginated list method, fetching one page
+            at a time.
+        '''
+        params['limit'] = PAGE_SIZE
+        while True:
+            body = self.call(method, **params)
+            for item in body[key]:
+                yield item
+            cursor = body.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return
+            params['cursor'] = cursor
+
+
+class Directory(dict):
+    '''
+        A map of slack ids to names, with an index from names back to ids.
+        The client keeps it current from RTM events, so plugins holding a
+        reference always see new and renamed users and channels.
+        Ids that aren't known yet can be looked up with `fetch`, which asks
+        `lookup`, if given, for the name or None. That blocks on the web API,
+        so the client only calls it off the dispatch thread. Ids it couldn't
+        find are remembered so they are only asked about once.
+    '''
+
+    def __init__(self, names=None, lookup=None):
+        self.lookup = lookup
+        self.unknown = set()
+        # name => id
+        self.ids = {}
+        super().__init__()
+        for key, name in (names or {}).items():
+            self[key] = name
+
+    def __setitem__(self, key, name):
+        old_name = dict.get(self, key)
+        if old_name is not None and self.ids.get(old_name) == key:
+            del self.ids[old_name]
+        super().__setitem__(key, name)
+        self.ids[name] = key
+        self.unknown.discard(key)
+
+    def __delitem__(self, key):
+        name = dict.__getitem__(self, key)
+        if self.ids.get(name) == key:
+            del self.ids[name]
+        super().__delitem__(key)
+
+    def needs_lookup(self, key):
+        '''
+            Whether `fetch` would have to ask slack about `key`.
+        '''
+        return self.lookup is not None and bool(key) and \
+            key not in self and key not in self.unknown
+
+    def fetch(self, key):
+        '''
+            Return the name for `key`, looking it up if it isn't known yet,
+            or None.
+        '''
+        if not self.needs_lookup(key):
+            return dict.get(self, key)
+        name = self.lookup(key)
+        if name is None:
+            self.unknown.add(key)
+            return None
+        self[key] = name
+        return name
+
+    def id_for(self, name):
+        '''
+            Return the id with the given name, or None.
+        '''
+        return self.ids.get(name)
@@ -0,0 +1,49 @@
+import re
+
+
+class TriggerIndex:
+    '''
+        Routes a message to the plugins that could possibly handle it.
+        Every plugin's literal triggers are folded into one regex, so a
+        single scan of the message text finds all candidate plugins.
+    '''
+
+    def __init__(self, plugins):
+        self.plugins = list(plugins)
+        # plugins that did not declare triggers are asked about everything
+        self.always = set()
+        owners = {}
+        for i, plugin in enumerate(self.plugins):
+            triggers = getattr(plugin, 'triggers', None)
+            if triggers is None:
+                self.always.add(i)
+                continue
+            for trigger in triggers:
+                owners.setdefault(trigger.lower(), set()).add(i)
+
+        # the scan reports the longest literal at each position, so a hit
+        # on a literal also counts for every shorter literal it starts with
+        self.owners = {}
+        for literal in owners:
+            self.owners[literal] = set()
+            for other, plugin_ids in owners.items():
+                if literal.startswith(other):
+                    self.owners[literal] |= plugin_ids
+
+        self.matcher = None
+        if owners:
+            literals = sorted(owners, key=len, reverse=True)
+            self.matcher = re.compile('(?=({}))'.format(
+                '|'.join(re.escape(_) for _ in literals)
+            ), re.I)
+
+    def candidates(self, text):
+        '''
+            Return the plugins that should be asked about a message with
+            the given text, in the order they were loaded.
+        '''
+        plugin_ids = set(self.always)
+        if text and self.matcher is not None:
+            for literal in set(self.matcher.findall(text)):
+                plugin_ids |= self.owners[literal.lower()]
+        return [self.plugins[_] for _ in sorted(plugin_ids)]
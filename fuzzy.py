@@ -0,0 +1,150 @@
+from bisect import bisect_left, insort
+
+# how much of their trigrams two strings must share to count as similar
+SIMILARITY_THRESHOLD = 0.3
+# closest() only measures the edit distance to this many of the keys most
+# similar to the query, with this lower bar as typos break up more trigrams
+CLOSEST_CANDIDATES = 10
+CLOSEST_THRESHOLD = 0.2
+# names at least this long are completed if nothing has exactly that name
+MIN_PREFIX = 3
+
+
+def trigrams(text):
+    # padding lets the start and end of the text count for more
+    padded = '  {} '.format(text)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    '''
+        The number of insertions, deletions, substitutions and swaps of
+        adjacent characters turning `a` into `b` (optimal string alignment),
+        or `limit + 1` if it is more than `limit`.
+    '''
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    # only cells within `limit` of the diagonal can be in range
+    previous = None
+    row = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else too_far] + [too_far] * len(b)
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        best = current[0]
+        for j in range(low, high + 1):
+            distance = min(row[j] + 1, current[j - 1] + 1,
+                           row[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and \
+               a[i - 2] == b[j - 1]:
+                distance = min(distance, previous[j - 2] + 1)
+            current[j] = distance
+            best = min(best, distance)
+        if best > limit:
+            return too_far
+        previous, row = row, current
+    return min(row[-1], too_far)
+
+
+class TrigramIndex:
+    '''
+        A set of strings that can be searched for ones starting with a
+        prefix, using a sorted list, or for ones similar to a query, by the
+        trigrams they have in common with it. Only the strings sharing a
+        trigram with the query are ever looked at.
+    '''
+
+    def __init__(self, keys=()):
+        # trigram => keys containing it. Most trigrams are in only a few
+        # keys, which a list holds in a fraction of the memory of a set.
+        self.postings = {}
+        # key => number of trigrams in it
+        self.sizes = {}
+        self.sorted_keys = []
+        for key in keys:
+            self.add(key, sort=False)
+        self.sorted_keys.sort()
+
+    def add(self, key, sort=True):
+        if key in self.sizes:
+            return
+        grams = trigrams(key)
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(key)
+        self.sizes[key] = len(grams)
+        if sort:
+            insort(self.sorted_keys, key)
+        else:
+            self.sorted_keys.append(key)
+
+    def remove(self, key):
+        if key not in self.sizes:
+            return
+        for gram in trigrams(key):
+            self.postings[gram].remove(key)
+            if not self.postings[gram]:
+                del self.postings[gram]
+        del self.sizes[key]
+        del self.sorted_keys[bisect_left(self.sorted_keys, key)]
+
+    def starting_with(self, prefix, limit):
+        start = bisect_left(self.sorted_keys, prefix)
+        matches = []
+        for key in self.sorted_keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        return matches
+
+    def similar(self, query, limit, threshold=SIMILARITY_THRESHOLD):
+        '''
+            Return up to `limit` keys, most similar first, whose trigrams
+            overlap the query's by at least `threshold` (Jaccard index).
+        '''
+        grams = trigrams(query)
+        shared = {}
+        for gram in grams:
+            for key in self.postings.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        scored = []
+        for key, count in shared.items():
+            score = count / (len(grams) + self.sizes[key] - count)
+            if score >= threshold:
+                scored.append((-score, key))
+        scored.sort()
+        return [key for _, key in scored[:limit]]
+
+    def closest(self, query, max_edits):
+        '''
+            Return the key the fewest edits from the query, if it is within
+            `max_edits`, else None. Ties go to the key sharing more trigrams.
+        '''
+        best = None
+        best_distance = max_edits + 1
+        for key in self.similar(query, CLOSEST_CANDIDATES,
+                                threshold=CLOSEST_THRESHOLD):
+            distance = edit_distance(query, key, best_distance - 1)
+            if distance < best_distance:
+                best, best_distance = key, distance
+                if distance == 0:
+                    break
+        return best
+
+    def suggest(self, query, limit):
+        '''
+            Keys starting with the query, then keys similar to it.
+        '''
+        matches = self.starting_with(query, limit)
+        for key in self.similar(query, limit):
+            if len(matches) == limit:
+                break
+            if key not in matches:
+                matches.append(key)
+        return matches
+
+    def __contains__(self, key):
+        return key in self.sizes
+
+    def __len__(self):
+        return len(self.sizes)
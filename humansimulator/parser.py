@@ -1,3 +1,4 @@
+import gzip
 import html
 import os.path
 import re
@@ -62,7 +63,9 @@ def ignored(message):
 
 def parse_file(path):
     lines = defaultdict(list)
-    with open(path) as corpus_file:
+    # finished days may have been compressed by the channel log writer
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as corpus_file:
         for line in corpus_file:
             res = LINE_RE.match(line)
             if not res:
@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    '''
+        A thread-safe mapping that holds at most `maxsize` items, dropping
+        the least recently used first. `on_evict(key, value)` is called for
+        every item dropped to make room.
+        With a `ttl`, items are also forgotten that many seconds after they
+        were put, e.g. answers from a web service that may change.
+    '''
+
+    def __init__(self, maxsize, on_evict=None, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.ttl = ttl
+        self.clock = clock
+        self.items = OrderedDict()
+        # key => when it expires, if items do
+        self.expires = {}
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                self.items.move_to_end(key)
+            except KeyError:
+                return default
+            if self.expired(key):
+                del self.items[key]
+                del self.expires[key]
+                return default
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if self.ttl is not None:
+                self.expires[key] = self.clock() + self.ttl
+            while len(self.items) > self.maxsize:
+                old_key, old_value = self.items.popitem(last=False)
+                self.expires.pop(old_key, None)
+                if self.on_evict is not None:
+                    self.on_evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            self.expires.pop(key, None)
+            return self.items.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.expires.clear()
+
+    def expired(self, key):
+        return self.ttl is not None and \
+            self.expires.get(key, 0) <= self.clock()
+
+    def oldest(self):
+        '''
+            Return the (key, value) pairs from least to most recently used.
+        '''
+        with self.lock:
+            return list(self.items.items())
+
+    def __contains__(self, key):
+        return key in self.items and not self.expired(key)
+
+    def __len__(self):
+        return len(self.items)
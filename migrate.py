@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import warnings
+from importlib import import_module
+
+import sqlalchemy
+import sqlalchemy.exc
+
+from client import PLUGINS_FILENAME
+from plugin_base import DeclarativeBase as Base
+from storage import MEMORY_URL, create_engine, load_config
+
+BATCH_SIZE = 1000
+
+
+def import_models():
+    '''
+        Import every configured plugin so its tables are known.
+    '''
+    with open(PLUGINS_FILENAME) as plugins_file:
+        for module_name in json.loads(plugins_file.read()):
+            import_module('plugins.{}'.format(module_name))
+
+
+def migrate(source, target, batch_size=BATCH_SIZE, force=False):
+    '''
+        Copy every plugin table from the `source` engine to the `target`
+        engine, which must already have the tables created. Rows are streamed
+        in batches of `batch_size`, so the database never has to fit in
+        memory, and each table is copied in one transaction, so a table
+        that fails part way is left empty rather than half copied.
+        Raises ValueError if the target already has rows in any of the
+        tables, unless `force` is set, in which case they are replaced.
+        Returns a dict of table name => rows copied.
+    '''
+    source_tables = set(sqlalchemy.inspect(source).get_table_names())
+    # sorted_tables puts referenced tables before the ones referring to them
+    tables = [table for table in Base.metadata.sorted_tables
+              if table.name in source_tables]
+    if force:
+        with target.begin() as writer:
+            for table in reversed(tables):
+                writer.execute(table.delete())
+    else:
+        filled = [table.name for table in tables
+                  if count_rows(target, table)]
+        if filled:
+            raise ValueError('The target already has rows in {}; use --force '
+                             'to replace them'.format(', '.join(filled)))
+    copied = {}
+    for table in tables:
+        copied[table.name] = copy_table(source, target, table, batch_size)
+        reset_sequence(target, table)
+    return copied
+
+
+def count_rows(engine, table):
+    query = sqlalchemy.select(sqlalchemy.func.count()).select_from(table)
+    with engine.connect() as connection:
+        return connection.execute(query).scalar()
+
+
+def copy_table(source, target, table, batch_size):
+    # the source may predate columns added to the model since
+    with warnings.catch_warnings():
+        # reflection warns about every index on an expression
+        warnings.simplefilter('ignore', sqlalchemy.exc.SAWarning)
+        source_table = sqlalchemy.Table(table.name, sqlalchemy.MetaData(),
+                                        autoload_with=source)
+    columns = [source_table.c[column.name] for column in table.columns
+               if column.name in source_table.c]
+    query = sqlalchemy.select(*columns)
+    if table.primary_key.columns:
+        query = query.order_by(*[source_table.c[column.name]
+                                 for column in table.primary_key.columns])
+    count = 0
+    with source.connect() as reader, target.begin() as writer:
+        result = reader.execution_options(stream_results=True).execute(query)
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.execute(table.insert(),
+                           [dict(row._mapping) for row in rows])
+            count += len(rows)
+    return count
+
+
+def reset_sequence(engine, table):
+    '''
+        Rows are copied with their ids, so move postgres' id sequence past
+        them.
+    '''
+    if engine.dialect.name != 'postgresql' or 'id' not in table.c:
+        return
+    name = engine.dialect.identifier_preparer.quote(table.name)
+    query = sqlalchemy.text(
+        "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+        "(SELECT MAX(id) FROM {})) WHERE EXISTS (SELECT 1 FROM {})".format(
+            name, name
+        )
+    )
+    with engine.begin() as connection:
+        connection.execute(query, {'table': name})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Copy the GLaDOS memory to another database. The target '
+                    'defaults to the url in storage.json.'
+    )
+    parser.add_argument('--source', default=MEMORY_URL,
+                        help='url of the database to copy from')
+    parser.add_argument('--target', help='url of the database to copy to')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='rows to read and insert at a time')
+    parser.add_argument('--force', action='store_true',
+                        help='replace rows already in the target')
+    args = parser.parse_args()
+
+    config = load_config()
+    if args.target is not None:
+        config['url'] = args.target
+    if config.get('url', MEMORY_URL) == args.source:
+        parser.error('the source and target are the same database')
+
+    import_models()
+    source = sqlalchemy.create_engine(args.source)
+    target = create_engine(**config)
+    try:
+        copied = migrate(source, target, args.batch_size, args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    for table_name, count in copied.items():
+        print('{}: {} rows'.format(table_name, count))
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,32 @@
+from concurrent.futures import Future
+
 from sqlalchemy.ext.declarative import declarative_base
 
+from sender import gather
+
 # pylint: disable=invalid-name
 DeclarativeBase = declarative_base()
 
+# seconds plugins should wait on other web services before giving up
+REQUEST_TIMEOUT = 10
+
 
 class GladosPluginBase(object):
     # set true if the event should not continue propogating
     consumes_message = False
+    # literal strings, one of which must appear (case-insensitively) in the
+    # text of a message before can_handle_message is asked about it.
+    # None means the plugin is asked about every event, [] means never.
+    triggers = None
+    # how many of this plugin's handlers may run at once on the client's
+    # worker pool. 0 runs them inline on the dispatch thread. db_session is
+    # a scoped_session, so every thread (and under the asyncio runtime every
+    # coroutine) gets its own session, and whatever a handler leaves
+    # uncommitted is committed once it returns.
+    max_concurrency = 0
+    # seconds a pooled handler may run before it is reported as hung and
+    # stops counting against max_concurrency
+    handler_timeout = 30
 
     def __init__(self, db_session, send_fn, **kwargs):
         self.send = send_fn
@@ -14,6 +34,33 @@ class GladosPluginBase(object):
         for attr_name, attr in kwargs.items():
             setattr(self, attr_name, attr)
 
+    def send_many(self, message, recipients, attachments=None):
+        '''
+            Send the same message to each of `recipients`, one at a time.
+            The client replaces this with a version that sends to all of them
+            at once. Either way it returns a future for a dict of recipient
+            => slack's response, or the exception sending to that recipient
+            failed with.
+        '''
+        futures = {}
+        for recipient in recipients:
+            future = Future()
+            try:
+                if attachments is None:
+                    result = self.send(message, recipient)
+                else:
+                    result = self.send(message, recipient, attachments)
+            # pylint: disable=broad-except
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                if isinstance(result, Future):
+                    future = result
+                else:
+                    future.set_result(result)
+            futures[recipient] = future
+        return gather(futures)
+
     def setup(self):
         '''
             Perform any necessary setup before this plugin runs
@@ -24,7 +71,7 @@ class GladosPluginBase(object):
         '''
             Perform any necessary teardown before this plugin exits
             The DB session will be committed, so you don't have to worry about
-            that.
+            that. The same goes for setup and every handler.
         '''
         pass
 
@@ -38,6 +85,8 @@ class GladosPluginBase(object):
     def handle_message(self, msg):
         '''
             Handle the message
+            Under the asyncio runtime (run.py --async) this may be a
+            coroutine function.
         '''
         raise NotImplementedError
 
@@ -67,6 +116,11 @@ class TimedPluginBase(GladosPluginBase):
         they should receive a signal and perform some action.
     '''
 
+    # what to do about fire times that passed before the plugin got to run:
+    # 'once' runs once for all of them, 'all' runs once for each of them
+    # and 'skip' drops them
+    missed_runs = 'once'
+
     def __init__(self, *args, **kwargs):
         self.last_run_time = None
         super().__init__(*args, **kwargs)
@@ -77,6 +131,7 @@ class TimedPluginBase(GladosPluginBase):
             Timed Plugins must include an "interval" property that returns
             a cron syntax interval (as usable by croniter) at which to run
             the `timed_event` method. Plugins may specify this as an attribute.
+            A sixth field gives second-level precision, e.g. '* * * * * */10'.
             The 'base' time will be the time the GLaDOS daemon started.
         '''
         raise NotImplementedError('Timed plugins must include an interval!')
@@ -84,5 +139,7 @@ class TimedPluginBase(GladosPluginBase):
     def run_timed_event(self):
         '''
             The event to run at the interval specified by `interval`
+            Like handle_message, this may be a coroutine function under the
+            asyncio runtime.
         '''
         raise NotImplementedError('Timed plugins must include a timed event!')
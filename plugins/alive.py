@@ -12,6 +12,7 @@ Usage: glados, are you alive?
 
 class IAmAlive(GladosPluginBase):
     consumes_message = True
+    triggers = ['alive']
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
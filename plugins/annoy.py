@@ -4,6 +4,7 @@ from plugin_base import TimedPluginBase
 class Annoying(TimedPluginBase):
     help_text = 'I\'M REALLY ANNOYING'
     interval = '* * * * *'
+    triggers = []
 
     def __init__(self, *args, **kwargs):
         self.channels = {}
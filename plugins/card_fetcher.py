@@ -3,11 +3,18 @@
 import re
 import requests
 
-from plugin_base import GladosPluginBase
+from lru import LRUCache
+from plugin_base import GladosPluginBase, REQUEST_TIMEOUT
+from plugins.mtg_cards import (GATHERER_IMG_TPL, MTG_DATA_PATH, MagicCard,
+                               init_card_store)
 
-GATHERER_IMG_TPL = 'http://gatherer.wizards.com/Handlers/Image.ashx?multiverseid={}&type=card'
 CARD_NOT_FOUND_ERR_TPL = 'Whoops, looks like {} isn\'t a magic card'
 MTGSTOCKS_LINK_TPL = '<{}|MTGStocks.com> price for {}'
+# how many answers from the web APIs are kept, and for how many seconds.
+# Cards only change with errata, prices change all the time.
+REMOTE_CACHE_SIZE = 256
+CARD_CACHE_TTL = 24 * 60 * 60
+PRICE_CACHE_TTL = 60 * 60
 
 # [[cardname]] fetches a card's image
 cardimg_re = re.compile(r'.*?\[\[(.+?)\]\]')
@@ -24,75 +31,134 @@ $$cardname:setname$$ will find a price for a specific printing
 '''
 
 class CardFetcher(GladosPluginBase):
+    '''
+        Cards are looked up in the bulk data at MTG_DATA_PATH, if there is
+        any, and only go to deckbrew if they aren't there. Answers from the
+        web APIs are cached for a while.
+    '''
     consumes_message = True
+    triggers = ['[[', '{{', '$$']
+    max_concurrency = 4
+    data_path = MTG_DATA_PATH
+
+    def __init__(self, *args, **kwargs):
+        self.store = None
+        # lower cased name => card
+        self.remote_cards = LRUCache(REMOTE_CACHE_SIZE, ttl=CARD_CACHE_TTL)
+        # (lower cased name, lower cased set) => price
+        self.prices = LRUCache(REMOTE_CACHE_SIZE, ttl=PRICE_CACHE_TTL)
+        super().__init__(*args, **kwargs)
+
+    def setup(self):
+        self.store = init_card_store(self.data_path)
+        if self.store is None:
+            print('No MTG bulk data at {}, every card will be looked up '
+                  'on deckbrew'.format(self.data_path))
+
+    def get_card(self, cardname):
+        if self.store is not None:
+            card = self.store.get_card(cardname)
+            if card is not None:
+                return card
+        key = cardname.lower()
+        card = self.remote_cards.get(key)
+        if card is None:
+            card = get_card_obj(cardname)
+            # misses aren't kept, in case they were deckbrew having trouble
+            if card is not None:
+                self.remote_cards.put(key, card)
+        return card
+
+    def find_cards(self, names):
+        '''
+            Look each name up once, however many times it was mentioned.
+            Returns a dict of lower cased name => card, or None.
+        '''
+        cards = {}
+        for name in names:
+            if name.lower() not in cards:
+                cards[name.lower()] = self.get_card(name)
+        return cards
+
+    def get_price(self, cardname, setname=None):
+        key = (cardname.lower(), (setname or '').lower())
+        price = self.prices.get(key)
+        if price is None:
+            price = get_card_price(cardname, setname)
+            if price is not None:
+                self.prices.put(key, price)
+        return price
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
             return None
-        return cardimg_re.match(msg['text']) or oracle_re.match(msg['text']) or price_re.match(msg['text'])
+        return cardimg_re.match(msg['text']) or \
+            oracle_re.match(msg['text']) or \
+            price_re.match(msg['text'])
 
     def handle_message(self, msg):
         cardimg_matches = cardimg_re.findall(msg['text'])
         oracle_matches = oracle_re.findall(msg['text'])
         pricing_matches = price_re.findall(msg['text'])
+        cards = self.find_cards(cardimg_matches + oracle_matches)
 
         for match in cardimg_matches:
 
-            card_obj = get_card_obj(match)
+            card_obj = cards[match.lower()]
 
             if not card_obj:
                 self.send(CARD_NOT_FOUND_ERR_TPL.format(match), msg['channel'])
                 continue
 
-            img_url = GATHERER_IMG_TPL.format(card_obj['id'])
-
             attachments = [{
-                'fallback': card_obj['name'],
-                'image_url': img_url
+                'fallback': card_obj.name,
+                'image_url': card_obj.image_url
             }]
 
             self.send('', msg['channel'], attachments)
 
         for match in oracle_matches:
 
-            card_obj = get_card_obj(match)
+            card_obj = cards[match.lower()]
 
             if not card_obj:
                 self.send(CARD_NOT_FOUND_ERR_TPL.format(match), msg['channel'])
                 continue
 
             card_attachment = {
-                'fallback': card_obj['name'],
-                'title': card_obj['name'],
+                'fallback': card_obj.name,
+                'title': card_obj.name,
                 'fields': [
                     {
                         'title': 'Mana Cost',
-                        'value': format_mana(card_obj['manaCost']),
+                        'value': format_mana(card_obj.mana_cost),
                         'short': True
                     },
                     {
                         'title': 'Types',
-                        'value': '{} - {}'.format(card_obj['type'], card_obj['subType']),
+                        'value': '{} - {}'.format(card_obj.type,
+                                                  card_obj.subtype),
                         'short': True
                     },
                     {
                         'title': 'Text',
-                        'value': format_mana(card_obj['description']),
+                        'value': format_mana(card_obj.text),
                         'short': False
                     }
                 ]
             }
 
-            if 'Creature' in card_obj['type']:
+            if 'Creature' in card_obj.type:
                 card_attachment['fields'].append({
                     'title': 'P/T',
-                    'value': '{}/{}'.format(card_obj['power'], card_obj['toughness']),
+                    'value': '{}/{}'.format(card_obj.power,
+                                            card_obj.toughness),
                     'short': True
                 })
-            if 'Planeswalker' in card_obj['type']:
+            if 'Planeswalker' in card_obj.type:
                 card_attachment['fields'].append({
                     'title': 'Loyalty',
-                    'value': card_obj['loyalty'],
+                    'value': card_obj.loyalty,
                     'short': True
                 })
 
@@ -101,7 +167,7 @@ class CardFetcher(GladosPluginBase):
 
         for match in pricing_matches:
             args = match.split(':')[:2]
-            card_obj = get_card_price(*args)
+            card_obj = self.get_price(*args)
 
             if not card_obj:
                 self.send(CARD_NOT_FOUND_ERR_TPL.format(match), msg['channel'])
@@ -144,7 +210,8 @@ class CardFetcher(GladosPluginBase):
 
 
             attachments = [card_attachment]
-            self.send(MTGSTOCKS_LINK_TPL.format(card_obj['link'], match), msg['channel'], attachments, unfurl=False)
+            self.send(MTGSTOCKS_LINK_TPL.format(card_obj['link'], match),
+                      msg['channel'], attachments, unfurl=False)
 
     @property
     def help_text(self):
@@ -152,54 +219,41 @@ class CardFetcher(GladosPluginBase):
 
 
 '''
-Query a web API for a card with the given name
+Query a web API for a card with the given name, for cards missing from the
+bulk data.
 Implementation subject to change as various MTG APIs are created and destroyed
-Should always return a JSON in the mtgdb.info format:
-
-*id                 Integer     : multiverse Id
-*name               String      : name of the card
-*description        String      : the cards actions
-*manaCost           String      : the description of mana to cast spell
-*type               String      : the type of card
-*subType            String      : subtype of card
-*power              Integer     : attack strength
-*toughness          Integer     : defense strength
-*loyalty            Integer     : loyalty points usually on planeswalkers
-
-
-* indicates properties that are currently in use and must be present in the returned json
+Should always return a MagicCard, or None if there's no such card.
 '''
 
 
 def get_card_obj(cardname):
 
     query_url = 'https://api.deckbrew.com/mtg/cards?name={}'.format(cardname)
-    r = requests.get(query_url)
+    r = requests.get(query_url, timeout=REQUEST_TIMEOUT)
 
-    if (r.status_code != requests.codes.ok) or (not r.json()):
+    if r.status_code != requests.codes.ok:
+        return None
+    results = r.json()
+    if not results:
         return None
 
-    api_json = next((card for card in r.json() if card['name'].lower() == cardname.lower()), None)
-
-    if (api_json is None):
-        if (len(r.json()) > 0):
-            api_json = r.json()[0]
-        else:
-            return None
-
-    formatted_json = {
-        'id': api_json['editions'][0]['multiverse_id'],
-        'name': api_json['name'],
-        'description': api_json['text'],
-        'manaCost': api_json['cost'],
-        'type': (' ').join(api_json.get('types', [])).title(),
-        'subType': (' ').join(api_json.get('subtypes', [])).title(),
-        'power': api_json.get('power', ''),
-        'toughness': api_json.get('toughness', ''),
-        'loyalty': api_json.get('loyalty', '')
-    }
-
-    return formatted_json
+    api_json = next((card for card in results
+                     if card['name'].lower() == cardname.lower()),
+                    results[0])
+
+    return MagicCard(
+        name=api_json['name'],
+        mana_cost=api_json['cost'],
+        type=(' ').join(api_json.get('types', [])).title(),
+        subtype=(' ').join(api_json.get('subtypes', [])).title(),
+        text=api_json['text'],
+        power=api_json.get('power', ''),
+        toughness=api_json.get('toughness', ''),
+        loyalty=api_json.get('loyalty', ''),
+        image_url=GATHERER_IMG_TPL.format(
+            api_json['editions'][0]['multiverse_id']
+        ),
+    )
 
 
 def get_card_price(cardname, setname=None):
@@ -209,16 +263,15 @@ def get_card_price(cardname, setname=None):
     if (setname):
         params['set'] = setname
 
-    r = requests.get(query_url, params)
+    r = requests.get(query_url, params, timeout=REQUEST_TIMEOUT)
 
-    if (r.status_code != requests.codes.ok) or (not r.json()):
+    if r.status_code != requests.codes.ok:
         return None
-
-    return r.json()
+    return r.json() or None
 
 
-# replaces all manacost sequences (denoted by characters or numbers wrapped in {})
-# with the appropriate manacost emoticons
+# replaces all manacost sequences (denoted by characters or numbers wrapped
+# in {}) with the appropriate manacost emoticons
 def format_mana(string):
     return re.sub(r'\{(.+?)\}', format_mana_symbol, string)
 
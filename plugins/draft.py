@@ -21,6 +21,7 @@ class Drafto(GladosPluginBase):
         super().__init__(*args, **kwargs)
         self.draft = None
     consumes_message = False
+    triggers = ['draft', 'pick']
 
     def setup(self):
         pass # TODO: load draft
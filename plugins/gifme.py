@@ -4,7 +4,7 @@ from urllib.parse import urlencode
 
 import requests
 
-from plugin_base import GladosPluginBase
+from plugin_base import GladosPluginBase, REQUEST_TIMEOUT
 
 SEARCH_URL_TPL = 'https://api.imgur.com/3/gallery/search/top.json?{0}'
 MAX_BYTES      = 1024 * 1024
@@ -16,6 +16,8 @@ HELP_TEXT = 'I regret everything.'
 
 class GifMe(GladosPluginBase):
     consumes_message = True
+    triggers = ['gif']
+    max_concurrency = 4
 
     def setup(self):
         with open('.imgur-client-token') as f:
@@ -39,7 +41,8 @@ class GifMe(GladosPluginBase):
             'Authorization': 'Client-ID {0}'.format(self.client_id)
         }
 
-        resp = requests.get(query_url, headers=headers)
+        resp = requests.get(query_url, headers=headers,
+                            timeout=REQUEST_TIMEOUT)
 
         def send_fail_msg(err=None, nsfw=False):
             if err:
@@ -31,7 +31,28 @@ notify_re = re.compile(r'.*@(\w+)')
 
 
 class Groups(GladosPluginBase):
+    '''
+        The names of every group's members are kept in memory, loaded with
+        one query at setup and updated as groups change, so notifying a
+        group, or ignoring an @mention that isn't one, doesn't touch the db.
+    '''
     consumes_message = False
+    triggers = ['group', '@']
+
+    def __init__(self, *args, **kwargs):
+        # group name => names of its members
+        self.members = {}
+        super().__init__(*args, **kwargs)
+
+    def setup(self):
+        self.members = {}
+        rows = self.db_session.query(Group.name, GroupUser.name).outerjoin(
+            Group.users
+        )
+        for groupname, username in rows:
+            names = self.members.setdefault(groupname, [])
+            if username is not None:
+                names.append(username)
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message':
@@ -66,10 +87,7 @@ class Groups(GladosPluginBase):
         return user
 
     def get_id_for_user(self, name):
-        for user_id, username in self.users.items():
-            if username == name:
-                return user_id
-        return None
+        return self.users.id_for(name)
 
     def create_group(self, groupname, user, channel):
         existing = self.db_session.query(Group).filter_by(
@@ -86,6 +104,7 @@ class Groups(GladosPluginBase):
         new_group = Group(name=groupname, owner=owner, users=[owner])
         self.db_session.add(new_group)
         self.db_session.commit()
+        self.members[groupname] = [owner.name]
         self.send('Success: group @{} created.'.format(groupname), channel)
 
     def delete_group(self, groupname, user, channel):
@@ -109,6 +128,7 @@ class Groups(GladosPluginBase):
             return
         self.db_session.delete(group)
         self.db_session.commit()
+        self.members.pop(groupname, None)
         self.send('Success: group @{} deleted.'.format(groupname), channel)
 
     def add_to_group(self, name, groupname, user, channel):
@@ -144,6 +164,7 @@ class Groups(GladosPluginBase):
             return
         group.users.append(user)
         self.db_session.commit()
+        self.members[groupname].append(name)
         self.send('Success: {} added to @{}.'.format(name, groupname), channel)
 
     def remove_from_group(self, name, groupname, user, channel):
@@ -195,6 +216,7 @@ class Groups(GladosPluginBase):
             return
         group.users.remove(user)
         self.db_session.commit()
+        self.members[groupname].remove(name)
         self.send(
             'Success: {} removed from @{}.'.format(name, groupname),
             channel
@@ -245,20 +267,17 @@ class Groups(GladosPluginBase):
         )
 
     def notify_group(self, groupname, user, channel):
-        group = self.db_session.query(Group).filter_by(
-            name=groupname
-        ).first()
-        if not group:
+        members = self.members.get(groupname)
+        if members is None:
             return
-        for group_user in group.users:
-            self.send(
-                'User @{} has notified group @{} in channel #{}'.format(
-                    self.users[user],
-                    groupname,
-                    self.channels[channel]
-                ),
-                '@{}'.format(group_user.name)
-            )
+        return self.send_many(
+            'User @{} has notified group @{} in channel #{}'.format(
+                self.users[user],
+                groupname,
+                self.channels[channel]
+            ),
+            ['@{}'.format(member) for member in members]
+        )
 
     def handle_message(self, msg):
         handler_mapping = [
@@ -295,7 +314,7 @@ class Group(Base):
     __tablename__ = 'group'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    name = sqlalchemy.Column(sqlalchemy.String, unique=True)
+    name = sqlalchemy.Column(sqlalchemy.String(255), unique=True)
     owner = sqlalchemy.orm.relationship('GroupUser', back_populates='owned')
     onwer_id = sqlalchemy.Column(
         sqlalchemy.Integer,
@@ -313,6 +332,6 @@ class GroupUser(Base):
     __tablename__ = 'groupuser'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    name = sqlalchemy.Column(sqlalchemy.String)
-    user_id = sqlalchemy.Column(sqlalchemy.String, unique=True)
+    name = sqlalchemy.Column(sqlalchemy.String(255))
+    user_id = sqlalchemy.Column(sqlalchemy.String(255), unique=True)
     owned = sqlalchemy.orm.relationship('Group', back_populates='owner')
@@ -4,13 +4,15 @@ import re
 
 import requests
 
-from plugin_base import GladosPluginBase
+from plugin_base import GladosPluginBase, REQUEST_TIMEOUT
 
 HELP_TEXT = 'Don\'t bother. You wouldn\'t understand.'
 
 
 class BeHipster(GladosPluginBase):
     consumes_message = True
+    triggers = ['hipster']
+    max_concurrency = 2
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
@@ -20,7 +22,8 @@ class BeHipster(GladosPluginBase):
 
     def handle_message(self, msg):
         hipster_json = requests.get(
-            'http://hipsterjesus.com/api/?paras=1&type=hipster-cetric'
+            'http://hipsterjesus.com/api/?paras=1&type=hipster-cetric',
+            timeout=REQUEST_TIMEOUT
         ).json()
         hipster_text = hipster_json['text'].split('.')[0].split('<p>')[1] + '.'
         self.send(hipster_text, msg['channel'])
@@ -13,6 +13,7 @@ IMITATE_RE = re.compile(r'^glados,? imitate (\w+)', re.I)
 
 class Imitator(GladosPluginBase):
     consumes_message = True
+    triggers = ['imitate']
 
     def setup(self):
         self.model_set = ModelSet.from_config('config.yaml')
@@ -1,15 +1,29 @@
 #!/usr/bin/env python
 
+import datetime
 import re
+from bisect import bisect_left, insort
+from threading import Lock
 
 import sqlalchemy
 
+from lru import LRUCache
 from plugin_base import DeclarativeBase as Base
-from plugin_base import GladosPluginBase
+from plugin_base import TimedPluginBase
 
 KARMA_RE = re.compile(r'karma ([A-Za-z_]+)', re.I)
+# flags, so they can't be mistaken for names that anyone gives karma to
+RANK_RE = re.compile(r'karma --(top|bottom)(?: (\d+))?$', re.I)
+HISTORY_RE = re.compile(r'karma ([A-Za-z_]+) over (\d+) days?', re.I)
 ADD_RE = re.compile(r'([A-Za-z_]+)\+\+', re.I)
 TAKE_RE = re.compile(r'([A-Za-z_]+)--', re.I)
+# how often counted karma is written out
+FLUSH_INTERVAL = '* * * * * */10'
+# how many names' totals are kept in memory
+KARMA_CACHE_SIZE = 1024
+# how many names karma --top/--bottom list by default, and at most
+RANK_COUNT = 5
+MAX_RANK_COUNT = 25
 
 HELP_TEXT = '''
 A plugin for tracking karma.
@@ -17,11 +31,71 @@ Usage:
 NAME++
 NAME--
 karma NAME
+karma NAME over N days
+karma --top [N]
+karma --bottom [N]
 '''
 
 
-class Karmator(GladosPluginBase):
+class Leaderboard:
+    '''
+        Every name's net karma in a sorted list that is updated one change at
+        a time, so the top and bottom of it are just slices.
+    '''
+
+    def __init__(self, scores=None):
+        # name => score
+        self.scores = dict(scores or {})
+        # (score, name), lowest first
+        self.ranked = sorted((score, name)
+                             for name, score in self.scores.items())
+
+    def add(self, name, delta):
+        old_score = self.scores.get(name)
+        if old_score is None:
+            old_score = 0
+        else:
+            del self.ranked[bisect_left(self.ranked, (old_score, name))]
+        self.scores[name] = old_score + delta
+        insort(self.ranked, (old_score + delta, name))
+
+    def top(self, count):
+        return [(name, score)
+                for score, name in self.ranked[:-count - 1:-1]]
+
+    def bottom(self, count):
+        return [(name, score) for score, name in self.ranked[:count]]
+
+
+class Karmator(TimedPluginBase):
+    '''
+        Karma changes are counted in memory and written to the db together
+        every few seconds, and at teardown. Totals read from the db are
+        cached, so `karma NAME` only queries for names not seen lately.
+        Every change is also kept as a KarmaEvent for `karma NAME over N
+        days`, and a Leaderboard loaded at setup answers `karma --top`.
+    '''
     consumes_message = False
+    triggers = ['karma', '++', '--']
+    interval = FLUSH_INTERVAL
+
+    def __init__(self, *args, **kwargs):
+        self.lock = Lock()
+        # name => [plus, minus] not written to the db yet
+        self.pending = {}
+        # KarmaEvent rows not written to the db yet
+        self.events = []
+        # name => (plus, minus) as written to the db
+        self.totals = LRUCache(KARMA_CACHE_SIZE)
+        self.leaderboard = Leaderboard()
+        super().__init__(*args, **kwargs)
+
+    def setup(self):
+        self.leaderboard = Leaderboard({
+            name: plus - minus for name, plus, minus in
+            self.db_session.query(KarmaItem.name, KarmaItem.plus,
+                                  KarmaItem.minus)
+        })
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message':
@@ -30,44 +104,139 @@ class Karmator(GladosPluginBase):
             return False
         return \
             KARMA_RE.match(msg['text']) or \
+            RANK_RE.match(msg['text']) or \
             ADD_RE.search(msg['text']) or \
             TAKE_RE.search(msg['text'])
 
     def handle_message(self, msg):
+        rank_match = RANK_RE.match(msg['text'])
+        history_match = HISTORY_RE.match(msg['text'])
         karma_match = KARMA_RE.match(msg['text'])
-        add_match = ADD_RE.search(msg['text'])
-        take_match = TAKE_RE.search(msg['text'])
-        if karma_match:
+        if rank_match:
+            self.send(self.format_ranks(rank_match), msg['channel'])
+        elif history_match:
+            name = history_match.group(1).lower()
+            days = int(history_match.group(2))
+            plus, minus = self.get_history(name, days)
+            self.send('{} over {} days: {} [{}++, {}--]'.format(
+                name, days, plus - minus, plus, minus
+            ), msg['channel'])
+        elif karma_match:
             name = karma_match.group(1).lower()
-            item = self.db_session.query(KarmaItem).filter_by(
-                name=name
-            ).first()
-            if item is None:
-                plus = 0
-                minus = 0
-            else:
-                plus = item.plus
-                minus = item.minus
+            plus, minus = self.get_karma(name)
             self.send('{}: {} [{}++, {}--]'.format(name, plus - minus, plus,
                                                    minus), msg['channel'])
-        elif add_match:
-            name = add_match.group(1).lower()
-            item = self.db_session.query(KarmaItem).filter_by(
-                name=name
-            ).first()
-            if item is None:
-                item = KarmaItem(name=name, plus=0, minus=0)
-                self.db_session.add(item)
-            item.plus += 1
-        elif take_match:
-            name = take_match.group(1).lower()
-            item = self.db_session.query(KarmaItem).filter_by(
-                name=name
-            ).first()
-            if item is None:
-                item = KarmaItem(name=name, plus=0, minus=0)
-                self.db_session.add(item)
-            item.minus += 1
+        else:
+            changes = [(name, 1) for name in ADD_RE.findall(msg['text'])] + \
+                [(name, -1) for name in TAKE_RE.findall(msg['text'])]
+            self.add_karma(changes)
+
+    def add_karma(self, changes):
+        now = datetime.datetime.now()
+        with self.lock:
+            for name, delta in changes:
+                name = name.lower()
+                counts = self.pending.setdefault(name, [0, 0])
+                counts[0 if delta > 0 else 1] += 1
+                self.events.append({'name': name, 'delta': delta,
+                                    'time': now})
+                self.leaderboard.add(name, delta)
+
+    def format_ranks(self, match):
+        count = min(int(match.group(2) or RANK_COUNT), MAX_RANK_COUNT)
+        with self.lock:
+            if match.group(1).lower() == 'top':
+                ranks = self.leaderboard.top(count)
+            else:
+                ranks = self.leaderboard.bottom(count)
+        if not ranks:
+            return 'Nobody has any karma yet.'
+        return '\n'.join('{}. {}: {}'.format(i + 1, name, score)
+                         for i, (name, score) in enumerate(ranks))
+
+    def get_karma(self, name):
+        with self.lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                item = self.db_session.query(KarmaItem).filter_by(
+                    name=name
+                ).first()
+                if item is None:
+                    totals = (0, 0)
+                else:
+                    totals = (item.plus, item.minus)
+                self.totals.put(name, totals)
+            plus, minus = self.pending.get(name, (0, 0))
+            return totals[0] + plus, totals[1] + minus
+
+    def get_history(self, name, days):
+        '''
+            Return the (plus, minus) karma given to `name` in the last `days`
+            days, counted from its events with the (name, time) index.
+        '''
+        self.flush()
+        since = datetime.datetime.now() - datetime.timedelta(days=days)
+        counts = dict(
+            self.db_session.query(
+                KarmaEvent.delta, sqlalchemy.func.count(KarmaEvent.id)
+            ).filter(
+                KarmaEvent.name == name,
+                KarmaEvent.time >= since
+            ).group_by(KarmaEvent.delta)
+        )
+        return counts.get(1, 0), counts.get(-1, 0)
+
+    def run_timed_event(self):
+        self.flush()
+
+    def teardown(self):
+        self.flush()
+
+    def flush(self):
+        '''
+            Add the pending changes to the db as one batch of updates and
+            one of inserts, and append their events.
+        '''
+        with self.lock:
+            if not self.pending:
+                return
+            table = KarmaItem.__table__
+            existing = {
+                name for name, in self.db_session.query(KarmaItem.name).filter(
+                    KarmaItem.name.in_(list(self.pending))
+                )
+            }
+            updates = []
+            inserts = []
+            for name, (plus, minus) in self.pending.items():
+                if name in existing:
+                    updates.append({'item_name': name, 'add_plus': plus,
+                                    'add_minus': minus})
+                else:
+                    inserts.append({'name': name, 'plus': plus,
+                                    'minus': minus})
+            if updates:
+                self.db_session.execute(
+                    table.update().where(
+                        table.c.name == sqlalchemy.bindparam('item_name')
+                    ).values(
+                        plus=table.c.plus + sqlalchemy.bindparam('add_plus'),
+                        minus=table.c.minus + sqlalchemy.bindparam('add_minus')
+                    ),
+                    updates
+                )
+            if inserts:
+                self.db_session.execute(table.insert(), inserts)
+            self.db_session.execute(KarmaEvent.__table__.insert(),
+                                    self.events)
+            self.db_session.commit()
+            for name, (plus, minus) in self.pending.items():
+                totals = self.totals.get(name)
+                if totals is not None:
+                    self.totals.put(name, (totals[0] + plus,
+                                           totals[1] + minus))
+            self.pending = {}
+            self.events = []
 
     @property
     def help_text(self):
@@ -78,6 +247,22 @@ class KarmaItem(Base):
     __tablename__ = 'karmaitems'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    name = sqlalchemy.Column(sqlalchemy.String)
+    name = sqlalchemy.Column(sqlalchemy.String(255), unique=True,
+                             index=True)
     plus = sqlalchemy.Column(sqlalchemy.Integer)
     minus = sqlalchemy.Column(sqlalchemy.Integer)
+
+
+class KarmaEvent(Base):
+    '''
+        One NAME++ (delta 1) or NAME-- (delta -1). Only ever appended to.
+    '''
+    __tablename__ = 'karmaevents'
+    __table_args__ = (
+        sqlalchemy.Index('ix_karmaevents_name_time', 'name', 'time'),
+        {'sqlite_autoincrement': True}
+    )
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    name = sqlalchemy.Column(sqlalchemy.String(255))
+    delta = sqlalchemy.Column(sqlalchemy.Integer)
+    time = sqlalchemy.Column(sqlalchemy.DateTime)
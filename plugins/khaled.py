@@ -12,6 +12,7 @@ Usage: glados another one
 
 class Khaled(GladosPluginBase):
     consumes_message = True
+    triggers = ['another one']
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
@@ -0,0 +1,180 @@
+import base64
+import binascii
+
+from lru import LRUCache
+
+# the high nibble of the first byte is the format, the low one the version
+LOR_DECKCODE_FORMAT = 1
+LOR_DECKCODE_VERSION = 2
+FACTIONS = {
+    0: 'DE',
+    1: 'FR',
+    2: 'IO',
+    3: 'NX',
+    4: 'PZ',
+    5: 'SI',
+    6: 'BW',
+    9: 'MT',
+}
+FACTION_IDS = {name: faction_id for faction_id, name in FACTIONS.items()}
+# how many decoded decks are kept, by code
+DECK_CACHE_SIZE = 256
+
+decoded_decks = LRUCache(DECK_CACHE_SIZE)
+
+
+class DecodeError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def read_varint(data, offset):
+    '''
+        Read a little endian base 128 number from the memoryview `data` at
+        `offset`, returning it and the offset after it.
+    '''
+    if offset >= len(data):
+        raise DecodeError('Unexpected EOF')
+    # nearly everything in a deck code fits in one byte
+    if data[offset] < 0x80:
+        return data[offset], offset + 1
+    result = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise DecodeError('Unexpected EOF')
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte & 0x80 == 0:
+            return result, offset
+
+
+def write_varint(out, value):
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def card_code(set_id, faction_id, card_n):
+    return '{}{:03}'.format(card_prefix(set_id, faction_id), card_n)
+
+
+def card_prefix(set_id, faction_id):
+    try:
+        faction_name = FACTIONS[faction_id]
+    except KeyError:
+        raise DecodeError('Unknown faction code')
+    return '{:02}{}'.format(set_id, faction_name)
+
+
+def split_card_code(code):
+    '''
+        Return the (set, faction, number) of a card code like 01IO012.
+    '''
+    try:
+        return int(code[:2]), FACTION_IDS[code[2:4]], int(code[4:])
+    except (KeyError, ValueError):
+        raise ValueError('Not a card code: {}'.format(code))
+
+
+def normalize_deck_code(deckstr):
+    '''
+        The same code however it was pasted: without whitespace or padding
+        and in upper case.
+    '''
+    return ''.join(deckstr.split()).rstrip('=').upper()
+
+
+def decode_decklist(deckstr):
+    '''
+        Return the deck a code is for, as a tuple of (card code, count)
+        pairs, e.g. ('01IO012', 3), or raise DecodeError. Decks are cached
+        by code, as the same one tends to be posted over and over.
+    '''
+    deckstr = normalize_deck_code(deckstr)
+    deck = decoded_decks.get(deckstr)
+    if deck is None:
+        deck = parse_decklist(deckstr)
+        decoded_decks.put(deckstr, deck)
+    return deck
+
+
+def parse_decklist(deckstr):
+    # manually pad
+    padded = deckstr + '=' * (-len(deckstr) % 8)
+    try:
+        data = memoryview(base64.b32decode(padded))
+    except binascii.Error:
+        raise DecodeError('Error parsing base 32')
+    if not data:
+        raise DecodeError('Unexpected EOF')
+    if data[0] >> 4 != LOR_DECKCODE_FORMAT or \
+       data[0] & 0xf > LOR_DECKCODE_VERSION:
+        raise DecodeError('Unknown version string')
+
+    cards = []
+    offset = 1
+    # cards with 3 copies come first, then 2, then 1, each grouped by set
+    # and faction
+    for card_count in range(3, 0, -1):
+        n_groups, offset = read_varint(data, offset)
+        for _ in range(n_groups):
+            n_cards, offset = read_varint(data, offset)
+            set_id, offset = read_varint(data, offset)
+            faction_id, offset = read_varint(data, offset)
+            prefix = card_prefix(set_id, faction_id)
+            for _ in range(n_cards):
+                card_n, offset = read_varint(data, offset)
+                cards.append(('{}{:03}'.format(prefix, card_n), card_count))
+    # then any with more copies, one at a time
+    while offset < len(data):
+        card_count, offset = read_varint(data, offset)
+        set_id, offset = read_varint(data, offset)
+        faction_id, offset = read_varint(data, offset)
+        card_n, offset = read_varint(data, offset)
+        cards.append((card_code(set_id, faction_id, card_n), card_count))
+    return tuple(cards)
+
+
+def encode_decklist(deck):
+    '''
+        Return the code for a deck of (card code, count) pairs. Raises
+        ValueError for anything that isn't a card code.
+    '''
+    # count => (set, faction) => card numbers
+    groups = {3: {}, 2: {}, 1: {}}
+    others = []
+    for code, card_count in deck:
+        set_id, faction_id, card_n = split_card_code(code)
+        if card_count in groups:
+            groups[card_count].setdefault((set_id, faction_id), []).append(
+                card_n
+            )
+        elif card_count > 3:
+            others.append((card_count, set_id, faction_id, card_n))
+        else:
+            raise ValueError('Bad count for {}: {}'.format(code, card_count))
+
+    out = bytearray([LOR_DECKCODE_FORMAT << 4 | LOR_DECKCODE_VERSION])
+    for card_count in range(3, 0, -1):
+        # smallest groups first, as the game writes them
+        by_size = sorted(groups[card_count].items(),
+                         key=lambda group: (len(group[1]), group[0]))
+        write_varint(out, len(by_size))
+        for (set_id, faction_id), numbers in by_size:
+            write_varint(out, len(numbers))
+            write_varint(out, set_id)
+            write_varint(out, faction_id)
+            for card_n in sorted(numbers):
+                write_varint(out, card_n)
+    for values in sorted(others):
+        for value in values:
+            write_varint(out, value)
+    return base64.b32encode(bytes(out)).decode('ascii').rstrip('=')
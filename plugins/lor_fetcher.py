@@ -1,37 +1,40 @@
 #!usr/bin/env python
 
-import base64
-import binascii
-import io
 import json
 import os
 import re
+from threading import Lock
 
-from plugin_base import GladosPluginBase
+from fuzzy import MIN_PREFIX, TrigramIndex
+from lru import LRUCache
+from plugin_base import TimedPluginBase
+from plugins.lor_deckcode import (DecodeError, decode_decklist,
+                                  normalize_deck_code)
+from plugins.lor_search import Card, CardIndex, QueryError, is_search
+from snapshot import file_stamp, read_snapshot, write_snapshot
 
 LOR_DATA_PATH = 'lorcards'
+# the cards and their indexes, pickled, so startup doesn't parse the set files
+# again unless they change. Bump the version when what's pickled changes.
+LOR_SNAPSHOT_PATH = '.lorcards.pickle'
+SNAPSHOT_VERSION = 5
+# how often the set files are checked for changes
+RELOAD_INTERVAL = '* * * * * */30'
 
 NOT_FOUND_ERR_TPL = 'No match found for {}.'
+# how many more search results are listed after the first
+MAX_OTHER_MATCHES = 10
+# how many decks' rendered attachments are kept, by deck code
+DECKLIST_CACHE_SIZE = 128
 
 CARD_RE = re.compile(r'.*?\[\[([^\]]+)\]\]')
 DECK_RE = re.compile(r'.*?\{\{([^\}]+)\}\}')
 
-LOR_DECKCODE_VERSION = 0x12
-FACTIONS = {
-    0: 'DE',
-    1: 'FR',
-    2: 'IO',
-    3: 'NX',
-    4: 'PZ',
-    5: 'SI',
-    6: 'BW',
-    9: 'MT',
-}
-
 HELP_TEXT = '''
-[[cardname]] searches for card name
+[[cardname]] searches for card name; the start of a name, or a close
+misspelling of one, works too
 
-extras (not yet implemented):
+or search with filters:
     o:"deal damage"
     o:challenger
     t:unit
@@ -39,20 +42,33 @@ extras (not yet implemented):
     r:rare
     reg:demacia
     cmc=3
-    pow=2
-    tou=1
+    pow>=2
+    tou<1
 
 e.g.
 [[t:champion pow=0 o:survive]]
 '''
 
 
-class LoRFetcher(GladosPluginBase):
+class LoRFetcher(TimedPluginBase):
+    '''
+        The set files are checked for changes every so often, and any new or
+        changed ones are loaded into a new CardSearcher on a worker, which
+        then replaces the old one. Messages are answered with the old cards
+        until then.
+    '''
     consumes_message = True
+    triggers = ['[[', '{{']
+    interval = RELOAD_INTERVAL
+    max_concurrency = 2
+    data_path = LOR_DATA_PATH
+    snapshot_path = LOR_SNAPSHOT_PATH
 
     def __init__(self, *args, **kwargs):
         self.channels = {}
         self.card_searcher = None
+        self.decklists = None
+        self.reloading = Lock()
         self.channel = None
         self.debug_channel = None
         super().__init__(*args, **kwargs)
@@ -63,7 +79,31 @@ class LoRFetcher(GladosPluginBase):
                 self.debug_channel = channel_id
             if channel_name == 'leagueoflegends':
                 self.channel = channel_id
-        self.card_searcher = init_cardsearcher()
+        self.use_card_searcher(init_cardsearcher(self.data_path,
+                                                 self.snapshot_path))
+
+    def use_card_searcher(self, searcher):
+        # decks rendered with the old cards are dropped along with them
+        self.decklists = DecklistRenderer(searcher)
+        self.card_searcher = searcher
+
+    def run_timed_event(self):
+        # a slow reload may still be running
+        if not self.reloading.acquire(blocking=False):
+            return
+        try:
+            searcher = reload_cardsearcher(self.card_searcher, self.data_path,
+                                           self.snapshot_path)
+            if searcher is not self.card_searcher:
+                self.use_card_searcher(searcher)
+                print('Reloaded LoR cards from {}'.format(', '.join(sorted(
+                    searcher.sets
+                ))))
+        # e.g. a set file still being copied in; it's tried again next time
+        except (OSError, ValueError) as e:
+            print('Could not reload LoR cards:\n{}'.format(e))
+        finally:
+            self.reloading.release()
 
     def get_card(self, carddata):
         return self.card_searcher.get_card(carddata)
@@ -72,28 +112,41 @@ class LoRFetcher(GladosPluginBase):
         if msg['type'] != 'message' or 'message' in msg:
             return None
 
-        if msg.get('channel', 'D')[0] != 'D' and msg['channel'] != self.channel and msg['channel'] != self.debug_channel:
+        if msg.get('channel', 'D')[0] != 'D' and \
+           msg['channel'] != self.channel and \
+           msg['channel'] != self.debug_channel:
             return None
 
         return CARD_RE.match(msg['text']) or DECK_RE.match(msg['text'])
 
     def handle_message(self, msg):
-        deck_match = DECK_RE.match(msg['text'])
-        if deck_match:
-            deck_code = deck_match.group(1)
-            try:
-                deck = decode_decklist(deck_code)
-            except DecodeError as err:
-                self.send('Could not decode decklist: {}'.format(err.msg), msg['channel'])
-                return
-
-            self.send('', msg['channel'], decklist_attachments(deck, self.card_searcher))
+        deck_codes = DECK_RE.findall(msg['text'])
+        if deck_codes:
+            decks = self.decklists.render_many(deck_codes)
+            for deck_code, attachments in decks.items():
+                if isinstance(attachments, DecodeError):
+                    self.send('Could not decode decklist {}: {}'.format(
+                        deck_code, attachments.msg
+                    ), msg['channel'])
+                else:
+                    self.send('', msg['channel'], attachments)
 
             return
 
         card_matches = CARD_RE.findall(msg['text'])
 
         for match in card_matches:
+            try:
+                searching = is_search(match)
+            except QueryError as err:
+                self.send('Could not search: {}'.format(err.msg),
+                          msg['channel'])
+                continue
+
+            if searching:
+                self.send_search_results(match, msg['channel'])
+                continue
+
             cards = self.get_card(match)
 
             if not cards:
@@ -104,23 +157,45 @@ class LoRFetcher(GladosPluginBase):
             if len(cards) > 1:
                 fields.append({
                     'title': 'Associated Cards',
-                    'value': ', '.join([card['name'] for card in cards[1:]]),
+                    'value': ', '.join([card.name for card in cards[1:]]),
                 })
 
-            attachments = [({
-                'title': cards[0]['name'],
-                'fallback': cards[0]['name'],
-                'image_url': cards[0]['assets'][0]['gameAbsolutePath'],
-                'fields': fields,
-                # 'blocks': cardblock(card),
-            })]
+            self.send('', msg['channel'], [card_attachment(cards[0], fields)])
 
-            self.send('', msg['channel'], attachments)
+    def send_search_results(self, query, channel):
+        cards = self.card_searcher.search(query)
+        if not cards:
+            self.send(NOT_FOUND_ERR_TPL.format(query), channel)
+            return
+
+        fields = []
+        others = [card.name for card in cards[1:MAX_OTHER_MATCHES + 1]]
+        if len(cards) > MAX_OTHER_MATCHES + 1:
+            others.append('and {} more'.format(
+                len(cards) - MAX_OTHER_MATCHES - 1
+            ))
+        if others:
+            fields.append({
+                'title': 'Other Matches',
+                'value': ', '.join(others),
+            })
+
+        self.send('', channel, [card_attachment(cards[0], fields)])
 
     @property
     def help_text(self):
         return HELP_TEXT
 
+
+def card_attachment(card, fields):
+    return {
+        'title': card.name,
+        'fallback': card.name,
+        'image_url': card.image_url,
+        'fields': fields,
+        # 'blocks': cardblock(card),
+    }
+
 USELESS_KEYWORDS = [
     'Burst',
     'Fast',
@@ -143,13 +218,13 @@ def cardblock(card):
         'type': 'section',
         'text': {
             'type': 'mrkdwn',
-            'text': card['descriptionRaw'],
+            'text': card.description,
         }
     }
 
     typeline = {
         'type': 'plain_text',
-        'text': card['type'],
+        'text': card.type,
     }
     pairs = []
 
@@ -165,10 +240,10 @@ def cardblock(card):
         'text': '*Cost*',
     }, {
         'type': 'plain_text',
-        'text': str(card['cost']),
+        'text': str(card.cost),
     }))
 
-    filtered_keywords = filter_useless_keywords(card['keywords'])
+    filtered_keywords = filter_useless_keywords(card.keywords)
     if filtered_keywords:
         pairs.append(({
             'type': 'mrkdwn',
@@ -184,21 +259,23 @@ def cardblock(card):
         'text': '*Region*',
     }, {
         'type': 'plain_text',
-        'text': card['region'],
+        'text': card.region,
     }))
 
-    if card['type'] == 'Unit':
-        if card['supertype'] == 'Champion':
+    if card.type == 'Unit':
+        if card.supertype == 'Champion':
             typeline['text'] = 'Unit - Champion'
-            if card['levelupDescriptionRaw']:
-                block['text']['text'] = block['text']['text'] + '\n*Level Up*: ' + card['levelupDescriptionRaw']
+            if card.levelup_description:
+                block['text']['text'] = block['text']['text'] + \
+                    '\n*Level Up*: ' + card.levelup_description
 
-        block['text']['text'] = block['text']['text'] + '\n\n{} / {}'.format(card['attack'], card['health'])
+        block['text']['text'] = block['text']['text'] + \
+            '\n\n{} / {}'.format(card.attack, card.health)
 
-    if card['type'] == 'Spell':
-        typeline['text'] = 'Spell - {}'.format(card['spellSpeed'])
-        if card['supertype'] == 'Champion':
-            typeline['text'] = 'Champion Spell - {}'.format(card['spellSpeed'])
+    if card.type == 'Spell':
+        typeline['text'] = 'Spell - {}'.format(card.spell_speed)
+        if card.supertype == 'Champion':
+            typeline['text'] = 'Champion Spell - {}'.format(card.spell_speed)
 
     if len(pairs) % 2 == 1:
         pairs.append(({
@@ -223,14 +300,32 @@ LEVELED_RE = re.compile('(.+) (2|ii|l)$')
 
 
 class CardSearcher:
-    def __init__(self):
+    '''
+        Looks up cards by name, id or filter query.
+        `sets` maps each set file's name to the cards in it, and `stamps` to
+        the set_files() stamp it had when they were read.
+        Names not matching a card exactly are completed, or else matched to
+        the closest name within a few typos.
+    '''
+
+    def __init__(self, sets, stamps):
+        self.sets = sets
+        self.stamps = stamps
         self.cards_by_name = {}
         self.cards_by_id = {}
-        for fname in os.listdir(LOR_DATA_PATH):
-            with open(os.path.join(LOR_DATA_PATH, fname), encoding='utf-8') as data_file:
-                all_cards = json.loads(data_file.read())
-            for card in all_cards:
+        for fname in sorted(sets):
+            for card in sets[fname]:
                 self.add_card(card)
+        self.index = CardIndex(self.cards_by_id.values())
+        # level 2 champions are found through LEVELED_RE
+        self.names = TrigramIndex(name for name in self.cards_by_name
+                                  if not name.endswith('_2'))
+
+    def search(self, query):
+        '''
+            Return the cards matching a filter query, best match first.
+        '''
+        return self.index.search(query)
 
     def get_card(self, carddata):
         card = None
@@ -238,102 +333,173 @@ class CardSearcher:
 
         match = LEVELED_RE.match(cardname)
         if match:
-            card = self.cards_by_name.get('{}_2'.format(match.group(1)))
+            name = self.match_name(match.group(1))
+            if name is not None:
+                card = self.cards_by_name.get('{}_2'.format(name))
 
         if not card:
-            card = self.cards_by_name.get(cardname)
-            if not card:
+            name = self.match_name(cardname)
+            if name is None:
                 return None
+            card = self.cards_by_name[name]
         cards = [card]
 
-        refs = card['associatedCardRefs']
+        refs = card.associated
         for card_id in refs:
             card = self.cards_by_id[card_id]
             cards.append(card)
         return cards
 
+    def match_name(self, name):
+        '''
+            Return the card name `name` is, starts or was likely a typo of,
+            or None.
+        '''
+        if name in self.cards_by_name:
+            return name
+        if len(name) >= MIN_PREFIX:
+            completions = self.complete(name, 1)
+            if completions:
+                return completions[0]
+        # about one typo per four letters
+        return self.names.closest(name, len(name) // 4 + 1)
+
+    def complete(self, prefix, limit):
+        '''
+            Return up to `limit` card names starting with `prefix`.
+        '''
+        return self.names.starting_with(prefix.lower(), limit)
+
     def get_card_by_id(self, card_id):
         return self.cards_by_id[card_id]
 
     def add_card(self, card):
-        self.cards_by_id[card['cardCode']] = card
-        if card['type'] == 'Unit' and card['supertype'] == 'Champion' and card['levelupDescriptionRaw'] == '':
-            self.cards_by_name['{}_2'.format(card['name'].lower())] = card
+        self.cards_by_id[card.code] = card
+        if card.type == 'Unit' and card.supertype == 'Champion' and \
+           card.levelup_description == '':
+            self.cards_by_name['{}_2'.format(card.name.lower())] = card
             return
-        self.cards_by_name[card['name'].lower()] = card
-
-
-def init_cardsearcher():
-    return CardSearcher()
-
-
-class DecodeError(Exception):
-    def __init__(self, msg):
-        self.msg = msg
+        self.cards_by_name[card.name.lower()] = card
 
 
-def read_varint(stream):
-    res = 0
-    while True:
-        b = stream.read(1)
-        if b == '':
-            raise DecodeError('Unexpected EOF')
-        b = ord(b)
-        val = b & 0x7f
-        res = (res << 7) + val
-        if b & 0x80 == 0:
-            break
-    return res
+def set_files(path=LOR_DATA_PATH):
+    '''
+        Return a dict of set file name => (mtime, size), which changes
+        whenever the file does.
+    '''
+    return {fname: file_stamp(os.path.join(path, fname))
+            for fname in os.listdir(path) if fname.endswith('.json')}
 
 
-def card_code(set_id, faction_id, card_n):
+def load_set(fname, path=LOR_DATA_PATH):
+    '''
+        Return the cards in a set file. Raises OSError or ValueError if it
+        can't be read, e.g. while it is still being copied in.
+    '''
+    with open(os.path.join(path, fname), encoding='utf-8') as data_file:
+        cards = json.loads(data_file.read())
     try:
-        faction_name = FACTIONS[faction_id]
-    except KeyError:
-        raise DecodeError('Unknown faction code')
-    return '{:02}{}{:03}'.format(set_id, faction_name, card_n)
-
-
-# returns a list of codes and values (e.g. ("01IO012", 3)) or throws DecodeError
-def decode_decklist(deckstr):
-    # manually pad
-    deckstr += '=' * (8 - len(deckstr) % 8)
-    try:
-        b = base64.b32decode(deckstr)
-    except binascii.Error:
-        raise DecodeError('Error parsing base 32')
-    stream = io.BytesIO(b)
-    version_data = read_varint(stream)
-    if version_data != LOR_DECKCODE_VERSION:
-        raise DecodeError('Unknown version string')
-
-    cards = []
-    for card_count in range(3, 0, -1):
-        n_sf = read_varint(stream)
-        for _ in range(n_sf):
-            n_cards = read_varint(stream)
-            set_id = read_varint(stream)
-            faction_id = read_varint(stream)
-            for _ in range(n_cards):
-                cards.append((card_code(set_id, faction_id, read_varint(stream)), card_count))
-
-    return cards
+        return [Card.from_json(card) for card in cards]
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError('Bad card in {}: {!r}'.format(fname, e))
+
+
+def init_cardsearcher(path=LOR_DATA_PATH, snapshot_path=LOR_SNAPSHOT_PATH):
+    '''
+        Load the card searcher from its snapshot, bringing it up to date with
+        the set files if any of them changed since the snapshot was taken.
+    '''
+    searcher = read_snapshot(snapshot_path, SNAPSHOT_VERSION)
+    if searcher is None:
+        searcher = CardSearcher({}, {})
+    return reload_cardsearcher(searcher, path, snapshot_path)
+
+
+def reload_cardsearcher(searcher, path=LOR_DATA_PATH,
+                        snapshot_path=LOR_SNAPSHOT_PATH):
+    '''
+        Return `searcher` if no set file was added, changed or removed since
+        it was built. Otherwise return (and snapshot) a new one, parsing only
+        the new and changed files again.
+    '''
+    stamps = set_files(path)
+    if stamps == searcher.stamps:
+        return searcher
+    sets = {}
+    for fname, stamp in stamps.items():
+        if searcher.stamps.get(fname) == stamp:
+            sets[fname] = searcher.sets[fname]
+        else:
+            sets[fname] = load_set(fname, path)
+    searcher = CardSearcher(sets, stamps)
+    write_snapshot(snapshot_path, SNAPSHOT_VERSION, searcher)
+    return searcher
+
+
+class DecklistRenderer:
+    '''
+        Renders decks to attachments with the cards from `searcher`, and
+        keeps the attachments for the last few deck codes. Make a new one
+        when the cards are reloaded, so nothing rendered from the old cards
+        is shown again.
+    '''
+
+    def __init__(self, searcher, size=DECKLIST_CACHE_SIZE):
+        self.searcher = searcher
+        self.rendered = LRUCache(size)
+
+    def render(self, deck_code):
+        '''
+            Return the attachments for a deck code, or raise DecodeError.
+        '''
+        deck_code = normalize_deck_code(deck_code)
+        attachments = self.rendered.get(deck_code)
+        if attachments is None:
+            attachments = decklist_attachments(decode_decklist(deck_code),
+                                               self.searcher)
+            self.rendered.put(deck_code, attachments)
+        return attachments
+
+    def render_many(self, deck_codes):
+        '''
+            Render a batch of decks, e.g. every deck in a tournament's
+            lists. Returns a dict of normalized deck code => its attachments,
+            or the DecodeError it raised, in the order the codes were given,
+            so the same deck pasted two ways is only rendered once.
+        '''
+        decks = {}
+        for deck_code in deck_codes:
+            deck_code = normalize_deck_code(deck_code)
+            if deck_code in decks:
+                continue
+            try:
+                decks[deck_code] = self.render(deck_code)
+            except DecodeError as err:
+                decks[deck_code] = err
+        return decks
 
 
 def decklist_attachments(deck, searcher):
-    parsed_cards = {'champion': [], 'Spell': [], 'Landmark': [], 'follower': []}
+    parsed_cards = {'champion': [], 'Spell': [], 'Landmark': [],
+                    'follower': [], 'other': []}
     for card_id, card_count in deck:
-        card = searcher.get_card_by_id(card_id)
-        card_txt = '[{}] {} x{}'.format(card['cost'], card['name'], card_count)
-        if card['type'] == 'Unit':
-            if card['supertype'] == 'Champion':
+        card = searcher.cards_by_id.get(card_id)
+        if card is None:
+            # e.g. from a set newer than the set files
+            parsed_cards['other'].append('{} x{}'.format(card_id, card_count))
+            continue
+        card_txt = '[{}] {} x{}'.format(card.cost, card.name, card_count)
+        if card.type == 'Unit':
+            if card.supertype == 'Champion':
                 parsed_cards['champion'].append(card_txt)
             else:
                 parsed_cards['follower'].append(card_txt)
+        elif card.type in parsed_cards:
+            parsed_cards[card.type].append(card_txt)
         else:
-            parsed_cards[card['type']].append(card_txt)
+            parsed_cards['other'].append(card_txt)
 
-    return [
+    attachments = [
         {
             'fallback': 'Runeterra Decklist',
             'blocks': [
@@ -350,7 +516,9 @@ def decklist_attachments(deck, searcher):
                         },
                         {
                             'type': 'plain_text',
-                            'text': '\n'.join(sorted(parsed_cards['champion'])),
+                            'text': '\n'.join(
+                                sorted(parsed_cards['champion'])
+                            ),
                         },
                         {
                             'type': 'plain_text',
@@ -366,14 +534,39 @@ def decklist_attachments(deck, searcher):
                         },
                         {
                             'type': 'plain_text',
-                            'text': '\n'.join(sorted(parsed_cards['Landmark'])),
+                            'text': '\n'.join(
+                                sorted(parsed_cards['Landmark'])
+                            ),
                         },
                         {
                             'type': 'plain_text',
-                            'text': '\n'.join(sorted(parsed_cards['follower'])),
+                            'text': '\n'.join(
+                                sorted(parsed_cards['follower'])
+                            ),
                         },
                     ],
                 }
             ],
         },
     ]
+    if parsed_cards['other']:
+        attachments[0]['blocks'][0]['fields'].extend([
+            {
+                'type': 'mrkdwn',
+                'text': '*Other*',
+            },
+            {
+                'type': 'plain_text',
+                'text': '\n'.join(sorted(parsed_cards['other'])),
+            },
+        ])
+    return attachments
+
+
+if __name__ == '__main__':
+    # rebuild the snapshot ahead of time, e.g. after adding a set. Go
+    # through the module so what's pickled doesn't refer to __main__.
+    from plugins import lor_fetcher
+    print('{} cards indexed'.format(
+        len(lor_fetcher.init_cardsearcher().cards_by_id)
+    ))
@@ -0,0 +1,266 @@
+import re
+from array import array
+from bisect import bisect_left
+from sys import intern
+
+from snapshot import Record
+
+# key:value, key=value, key<value, ... or a bare word, either maybe quoted
+TERM_RE = re.compile(r'(?:(\w+)(:|<=|>=|!=|=|<|>))?("[^"]*"|\S+)')
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+TEXT_KEYS = ['o']
+# filter key => the index built for it
+CATEGORY_KEYS = {
+    't': 'types',
+    's': 'speeds',
+    'r': 'rarities',
+    'reg': 'regions',
+}
+# filter key => the card field it compares
+NUMBER_KEYS = {
+    'cmc': 'cost',
+    'pow': 'attack',
+    'tou': 'health',
+}
+# array typecode for lists of card positions
+POSITION_TYPE = 'I'
+
+
+class Card(Record):
+    '''
+        The parts of a card from the set files that LoRFetcher shows or
+        searches; art, flavour text and the like are left out.
+    '''
+    __slots__ = ('code', 'name', 'type', 'supertype', 'subtypes', 'cost',
+                 'attack', 'health', 'description', 'levelup_description',
+                 'keywords', 'spell_speed', 'rarity', 'region', 'collectible',
+                 'image_url', 'associated')
+
+    @classmethod
+    def from_json(cls, card):
+        # the short strings most cards share are interned so they're only
+        # held (and pickled) once
+        return cls(
+            code=card['cardCode'],
+            name=card['name'],
+            type=intern(card['type']),
+            supertype=intern(card['supertype']),
+            subtypes=tuple(intern(_) for _ in card['subtypes']),
+            cost=card['cost'],
+            attack=card['attack'],
+            health=card['health'],
+            description=card['descriptionRaw'],
+            levelup_description=card['levelupDescriptionRaw'],
+            keywords=tuple(intern(_) for _ in card['keywords']),
+            spell_speed=intern(card['spellSpeed']),
+            rarity=intern(card['rarity']),
+            region=intern(card['region']),
+            collectible=card['collectible'],
+            image_url=card['assets'][0]['gameAbsolutePath'],
+            associated=tuple(card['associatedCardRefs']),
+        )
+
+
+class QueryError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+
+def normalize_value(value):
+    return ''.join(WORD_RE.findall(value.lower()))
+
+
+def card_text(card):
+    '''
+        Everything `o:` searches: rules text, level up text and keywords.
+    '''
+    return ' '.join([card.description, card.levelup_description] +
+                    list(card.keywords))
+
+
+def card_categories(card):
+    types = [card.type, card.supertype] + list(card.subtypes)
+    return {
+        'types': [normalize_value(_) for _ in types if _],
+        'speeds': [normalize_value(card.spell_speed)],
+        'rarities': [normalize_value(card.rarity)],
+        'regions': [normalize_value(card.region)],
+    }
+
+
+def parse_query(query):
+    '''
+        Return a list of (key, operator, value) terms. Bare words have no key
+        or operator.
+    '''
+    terms = []
+    for match in TERM_RE.finditer(query):
+        key, operator, value = match.groups()
+        value = value.strip('"')
+        if key is not None:
+            key = key.lower()
+            if key not in TEXT_KEYS and key not in CATEGORY_KEYS and \
+               key not in NUMBER_KEYS:
+                raise QueryError('Unknown filter {}'.format(key))
+            if key not in NUMBER_KEYS and operator not in (':', '='):
+                raise QueryError('{} can only be compared with :'.format(key))
+            if key in NUMBER_KEYS and not value.isdigit():
+                raise QueryError('{} must be compared with a number'.format(
+                    key
+                ))
+        terms.append((key, operator, value))
+    return terms
+
+
+def is_search(query):
+    '''
+        Whether the query uses any filters, rather than being a card name.
+    '''
+    return any(key is not None for key, _, _ in parse_query(query))
+
+
+class CardIndex:
+    '''
+        Indexes built once over every card to answer filter queries:
+        word => cards for names and for rules text, value => cards for
+        types, speeds, rarities and regions, and the cards sorted by each
+        number, so every filter is a lookup or a bisect and a query is an
+        intersection of sets of card positions.
+    '''
+
+    def __init__(self, cards):
+        self.cards = list(cards)
+        self.name_words = {}
+        self.text_words = {}
+        self.texts = []
+        self.categories = {index: {} for index in CATEGORY_KEYS.values()}
+        self.numbers = {}
+        for position, card in enumerate(self.cards):
+            for word in tokenize(card.name):
+                self.name_words.setdefault(word, set()).add(position)
+            text = card_text(card).lower()
+            self.texts.append(text)
+            for word in tokenize(text):
+                self.text_words.setdefault(word, set()).add(position)
+            for index, values in card_categories(card).items():
+                for value in values:
+                    self.categories[index].setdefault(value, set()).add(
+                        position
+                    )
+        # the indexes are kept (and pickled) as sorted arrays of positions,
+        # which take a fraction of the memory of sets
+        self.name_words = compact(self.name_words)
+        self.text_words = compact(self.text_words)
+        self.categories = {index: compact(values)
+                           for index, values in self.categories.items()}
+        for field in NUMBER_KEYS.values():
+            # positions sorted by the field, and the field's values in the
+            # same order to bisect
+            positions = sorted(
+                range(len(self.cards)),
+                key=lambda i, f=field: getattr(self.cards[i], f)
+            )
+            self.numbers[field] = (
+                [getattr(self.cards[i], field) for i in positions],
+                array(POSITION_TYPE, positions)
+            )
+        # so words can be matched by prefix
+        self.sorted_text_words = sorted(self.text_words)
+
+    def search(self, query):
+        '''
+            Return the cards matching every term of the query, collectible
+            cards first, then by cost and name.
+        '''
+        matches = None
+        for key, operator, value in parse_query(query):
+            if key is None:
+                found = self.find_name(value)
+            elif key in TEXT_KEYS:
+                found = self.find_text(value)
+            elif key in CATEGORY_KEYS:
+                found = self.find_category(CATEGORY_KEYS[key], value)
+            else:
+                found = self.find_number(NUMBER_KEYS[key], operator,
+                                         int(value))
+            matches = set(found) if matches is None else \
+                matches.intersection(found)
+            if not matches:
+                return []
+        if matches is None:
+            return []
+        cards = [self.cards[position] for position in matches]
+        cards.sort(key=lambda card: (not card.collectible, card.cost,
+                                     card.name))
+        return cards
+
+    def find_name(self, value):
+        return intersect(self.name_words.get(word, ())
+                         for word in tokenize(value))
+
+    def find_text(self, value):
+        words = tokenize(value)
+        found = intersect(self.find_text_prefix(word) for word in words)
+        if len(words) > 1:
+            phrase = value.lower()
+            found = {position for position in found
+                     if phrase in self.texts[position]}
+        return found
+
+    def find_text_prefix(self, prefix):
+        found = set()
+        start = bisect_left(self.sorted_text_words, prefix)
+        for word in self.sorted_text_words[start:]:
+            if not word.startswith(prefix):
+                break
+            found.update(self.text_words[word])
+        return found
+
+    def find_category(self, index, value):
+        values = self.categories[index]
+        value = normalize_value(value)
+        if value in values:
+            return values[value]
+        # e.g. reg:piltover or t:champ
+        found = set()
+        for name, positions in values.items():
+            if name.startswith(value):
+                found.update(positions)
+        return found
+
+    def find_number(self, field, operator, value):
+        values, positions = self.numbers[field]
+        lower = bisect_left(values, value)
+        upper = bisect_left(values, value + 1)
+        if operator in (':', '='):
+            selected = positions[lower:upper]
+        elif operator == '!=':
+            selected = positions[:lower] + positions[upper:]
+        elif operator == '<':
+            selected = positions[:lower]
+        elif operator == '<=':
+            selected = positions[:upper]
+        elif operator == '>':
+            selected = positions[upper:]
+        else:
+            selected = positions[lower:]
+        return set(selected)
+
+
+def compact(index):
+    return {key: array(POSITION_TYPE, sorted(positions))
+            for key, positions in index.items()}
+
+
+def intersect(sets):
+    result = None
+    for found in sets:
+        result = set(found) if result is None else result.intersection(found)
+        if not result:
+            return set()
+    return result or set()
@@ -0,0 +1,109 @@
+import json
+from sys import intern
+
+from fuzzy import MIN_PREFIX, TrigramIndex
+from snapshot import Record, file_stamp, read_snapshot, write_snapshot
+
+# Scryfall's "Oracle Cards" bulk data (https://scryfall.com/docs/api/bulk-data)
+MTG_DATA_PATH = 'mtgcards.json'
+# the parsed cards, pickled, so startup doesn't parse the bulk data again
+# unless it changes
+MTG_SNAPSHOT_PATH = '.mtgcards.pickle'
+SNAPSHOT_VERSION = 2
+
+GATHERER_IMG_TPL = 'http://gatherer.wizards.com/Handlers/Image.ashx' \
+    '?multiverseid={}&type=card'
+# what else is in the bulk data, that nobody means by a card's name
+SKIPPED_LAYOUTS = {'art_series', 'token', 'double_faced_token', 'emblem'}
+
+
+class MagicCard(Record):
+    '''
+        What CardFetcher shows of a card, from the bulk data or a web API.
+    '''
+    __slots__ = ('name', 'mana_cost', 'type', 'subtype', 'text', 'power',
+                 'toughness', 'loyalty', 'image_url')
+
+    @classmethod
+    def from_scryfall(cls, card):
+        # split, flip and double faced cards keep most things on each face
+        faces = card.get('card_faces') or [card]
+        front = faces[0]
+        types, _, subtypes = front['type_line'].partition(' — ')
+        images = card.get('image_uris') or front.get('image_uris') or {}
+        image_url = images.get('normal', '')
+        if not image_url and card.get('multiverse_ids'):
+            image_url = GATHERER_IMG_TPL.format(card['multiverse_ids'][0])
+        return cls(
+            name=card['name'],
+            mana_cost=card.get('mana_cost', front.get('mana_cost', '')),
+            type=intern(types),
+            subtype=intern(subtypes),
+            text='\n//\n'.join(face.get('oracle_text', '') for face in faces),
+            power=front.get('power', ''),
+            toughness=front.get('toughness', ''),
+            loyalty=front.get('loyalty', ''),
+            image_url=image_url,
+        )
+
+
+class CardStore:
+    '''
+        Every card from the bulk data by lower cased name, with the names
+        in a TrigramIndex so they can be completed. `stamp` is the bulk data
+        file's file_stamp() when it was read.
+    '''
+
+    def __init__(self, cards, stamp):
+        self.stamp = stamp
+        self.cards_by_name = {}
+        for card in cards:
+            self.cards_by_name.setdefault(card.name.lower(), card)
+        # each half of a split or double faced card finds the whole card
+        for card in cards:
+            for face in card.name.lower().split(' // '):
+                self.cards_by_name.setdefault(face, card)
+        self.names = TrigramIndex(self.cards_by_name)
+
+    def get_card(self, name):
+        '''
+            Return the card called `name`, or else the first one whose name
+            starts with it, or None.
+        '''
+        name = name.lower()
+        card = self.cards_by_name.get(name)
+        if card is None and len(name) >= MIN_PREFIX:
+            completions = self.complete(name, 1)
+            if completions:
+                card = self.cards_by_name[completions[0]]
+        return card
+
+    def complete(self, prefix, limit):
+        '''
+            Return up to `limit` card names starting with `prefix`.
+        '''
+        return self.names.starting_with(prefix.lower(), limit)
+
+    def __len__(self):
+        return len(self.cards_by_name)
+
+
+def init_card_store(path=MTG_DATA_PATH, snapshot_path=MTG_SNAPSHOT_PATH):
+    '''
+        Return a CardStore of the bulk data at `path`, from its snapshot
+        unless the file changed since, or None if there's no bulk data.
+    '''
+    try:
+        stamp = file_stamp(path)
+    except FileNotFoundError:
+        return None
+    store = read_snapshot(snapshot_path, SNAPSHOT_VERSION)
+    if store is not None and store.stamp == stamp:
+        return store
+    with open(path, encoding='utf-8') as data_file:
+        cards = [MagicCard.from_scryfall(card)
+                 for card in json.loads(data_file.read())
+                 if card.get('layout') not in SKIPPED_LAYOUTS]
+    store = CardStore(cards, stamp)
+    write_snapshot(snapshot_path, SNAPSHOT_VERSION, store)
+    return store
@@ -6,6 +6,7 @@ from plugin_base import TimedPluginBase
 class PDReminder(TimedPluginBase):
     interval = '0 15 * * 0'
     help_text = 'Reminds you to do PD.'
+    triggers = []
 
     def can_handle_message(self, msg):
         return False
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import heapq
 import re
 
 import sqlalchemy
@@ -22,14 +23,23 @@ REMIND_RE = re.compile(r'glados,? remind me ((?P<at_t>at '
 
 class RemindMe(TimedPluginBase):
     help_text = HELP_TEXT
-    interval = '* * * * *'
+    # checking the heap is cheap, so look every second
+    interval = '* * * * * *'
+    triggers = ['remind me']
 
     def __init__(self, *args, **kwargs):
         self.channels = {}
         self.debug_channel = None
+        # (time, event id) of every pending reminder
+        self.upcoming = []
         super().__init__(*args, **kwargs)
 
     def setup(self):
+        self.upcoming = [
+            (time, event_id) for event_id, time in
+            self.db_session.query(Event.id, Event.time)
+        ]
+        heapq.heapify(self.upcoming)
         for channel_id, channel_name in self.channels.items():
             if channel_name == 'aperture-science':
                 self.debug_channel = channel_id
@@ -62,7 +72,8 @@ class RemindMe(TimedPluginBase):
             if msg_match.group('ampm') == 'p':
                 hour += 12
             minute = int(msg_match.group('min'))
-            time = now.replace(hour=hour, minute=minute)
+            time = now.replace(hour=hour, minute=minute, second=0,
+                               microsecond=0)
             if time < now:
                 time = time + timedelta(days=1)
         remind_what = msg_match.group('what')
@@ -70,6 +81,7 @@ class RemindMe(TimedPluginBase):
         event.time = time
         self.db_session.add(event)
         self.db_session.commit()
+        heapq.heappush(self.upcoming, (time, event.id))
 
         time_fmt = 'at {}'.format(time.strftime('%I:%M%P'))
         if time.date() != now.date():
@@ -83,15 +95,20 @@ class RemindMe(TimedPluginBase):
             time_fmt, remind_what), msg['channel'])
 
     def run_timed_event(self):
-        events = self.db_session.query(Event).all()
         now = datetime.now()
+        if not self.upcoming or self.upcoming[0][0] > now:
+            return
+        while self.upcoming and self.upcoming[0][0] <= now:
+            heapq.heappop(self.upcoming)
+        events = self.db_session.query(Event).filter(
+            Event.time <= now
+        ).order_by(Event.time)
         for event in events:
-            if event.time < now:
-                self.send(
-                    '@{}, you asked me to remind you {}'.format(event.user,
-                                                                event.what),
-                    event.channel)
-                self.db_session.delete(event)
+            self.send(
+                '@{}, you asked me to remind you {}'.format(event.user,
+                                                            event.what),
+                event.channel)
+            self.db_session.delete(event)
         self.db_session.commit()
 
 
@@ -99,7 +116,7 @@ class Event(Base):
     __tablename__ = 'event'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    user = sqlalchemy.Column(sqlalchemy.String)
-    channel = sqlalchemy.Column(sqlalchemy.String)
-    what = sqlalchemy.Column(sqlalchemy.String)
-    time = sqlalchemy.Column(sqlalchemy.DateTime)
+    user = sqlalchemy.Column(sqlalchemy.String(255))
+    channel = sqlalchemy.Column(sqlalchemy.String(255))
+    what = sqlalchemy.Column(sqlalchemy.Text)
+    time = sqlalchemy.Column(sqlalchemy.DateTime, index=True)
@@ -5,7 +5,7 @@ import requests
 import sqlalchemy
 
 from plugin_base import DeclarativeBase as Base
-from plugin_base import TimedPluginBase
+from plugin_base import REQUEST_TIMEOUT, TimedPluginBase
 
 HELP_TEXT = '''
 A plugin to fetch spoilers.
@@ -22,7 +22,7 @@ SUBSCRIBE_RE = re.compile(r'glados (un)?subscribe', re.I)
 
 
 def fetch_card_list():
-    page = requests.get(ALL_CARDS_URL)
+    page = requests.get(ALL_CARDS_URL, timeout=REQUEST_TIMEOUT)
     if page.status_code != requests.codes.ok:
         return []
 
@@ -43,7 +43,7 @@ def fetch_card_list():
 
 
 def fetch_card_name(url):
-    page = requests.get(url)
+    page = requests.get(url, timeout=REQUEST_TIMEOUT)
     if page.status_code != requests.codes.ok:
         return 'Name not available'
     soup = BeautifulSoup(page.text, 'html.parser')
@@ -53,6 +53,9 @@ def fetch_card_name(url):
 class FetchSpoilers(TimedPluginBase):
     help_text = HELP_TEXT
     interval = '* * * * *'
+    triggers = ['subscribe']
+    # scraping the spoiler site is slow, so keep it off the dispatch thread
+    max_concurrency = 1
 
     def __init__(self, *args, **kwargs):
         self.channels = {}
@@ -120,16 +123,15 @@ class FetchSpoilers(TimedPluginBase):
         if not new_cards:
             return
         subscriptions = self.db_session.query(Subscription).all()
-        for sub in subscriptions:
-            message = None
-            if len(new_cards) == 1:
-                message = 'New spoiler: {}'.format(new_cards[0].name)
-            else:
-                card_list = ''.join(
-                    ['\n- {}'.format(card.name) for card in new_cards]
-                )
-                message = 'New spoilers: {}'.format(card_list)
-            self.send(message, '@{}'.format(sub.user))
+        if len(new_cards) == 1:
+            message = 'New spoiler: {}'.format(new_cards[0].name)
+        else:
+            card_list = ''.join(
+                ['\n- {}'.format(card.name) for card in new_cards]
+            )
+            message = 'New spoilers: {}'.format(card_list)
+        self.send_many(message, ['@{}'.format(sub.user)
+                                 for sub in subscriptions])
         for card in new_cards:
             attachment = {
                 'fallback': card.name,
@@ -145,13 +147,13 @@ class Card(Base):
     __tablename__ = 'card'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    name = sqlalchemy.Column(sqlalchemy.String)
-    url = sqlalchemy.Column(sqlalchemy.String)
-    image_url = sqlalchemy.Column(sqlalchemy.String)
+    name = sqlalchemy.Column(sqlalchemy.String(255))
+    url = sqlalchemy.Column(sqlalchemy.String(1024))
+    image_url = sqlalchemy.Column(sqlalchemy.String(1024))
 
 
 class Subscription(Base):
     __tablename__ = 'spoilersubscription'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    user = sqlalchemy.Column(sqlalchemy.String)
+    user = sqlalchemy.Column(sqlalchemy.String(255))
@@ -7,6 +7,7 @@ from plugin_base import GladosPluginBase
 
 class HereComesTheSun(GladosPluginBase):
     consumes_message = True
+    triggers = ['sun']
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
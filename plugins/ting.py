@@ -8,6 +8,7 @@ from plugin_base import GladosPluginBase
 
 class Ting(GladosPluginBase):
     consumes_message = True
+    triggers = ['ye']
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
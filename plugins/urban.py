@@ -4,7 +4,7 @@ import re
 
 import requests
 
-from plugin_base import GladosPluginBase
+from plugin_base import GladosPluginBase, REQUEST_TIMEOUT
 
 SEARCH_RE = re.compile(r'glados,? urban me (.+)', re.I)
 URBAN_API_TPL = 'http://api.urbandictionary.com/v0/define?term={}'
@@ -22,6 +22,8 @@ def italicize(string):
 
 class UrbanMe(GladosPluginBase):
     consumes_message = True
+    triggers = ['urban me']
+    max_concurrency = 4
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message':
@@ -33,7 +35,8 @@ class UrbanMe(GladosPluginBase):
     def handle_message(self, msg):
         search_match = SEARCH_RE.search(msg['text'])
         search_query = search_match.group(1)
-        response = requests.get(URBAN_API_TPL.format(search_query)).json()
+        response = requests.get(URBAN_API_TPL.format(search_query),
+                                timeout=REQUEST_TIMEOUT).json()
         if response['list']:
             message_text = ''
             result = response['list'][0]
@@ -4,11 +4,18 @@ import re
 
 import sqlalchemy
 
+from fuzzy import TrigramIndex
+from lru import LRUCache
 from plugin_base import DeclarativeBase as Base
 from plugin_base import GladosPluginBase
+from storage import create_index
 
 MEMORY_RE = re.compile(r'glados,? know that ((?:(?!\sis).)+)\sis\s(.+)', re.I)
 RECALL_RE = re.compile(r'glados,? what is (.+)', re.I)
+# how many memories are kept in memory
+CACHE_SIZE = 4096
+# how many near misses to offer for a name we don't know
+SUGGESTION_COUNT = 3
 
 HELP_TEXT = '''
 A plugin that remembers what things are.
@@ -19,7 +26,23 @@ glados, what is NAME
 
 
 class WhatIs(GladosPluginBase):
+    '''
+        Every name we know is kept in memory, mapped to its item's id, so
+        unknown names never reach the db and known ones are fetched by
+        primary key, or straight from an LRU cache of recent recalls.
+        Names are matched case-insensitively, and unknown ones get
+        suggestions from a trigram index of the known ones.
+    '''
     consumes_message = True
+    triggers = ['know that', 'what is']
+
+    def __init__(self, *args, **kwargs):
+        # normalized name => item id
+        self.names = {}
+        self.index = TrigramIndex()
+        # normalized name => (name, alias)
+        self.cache = LRUCache(CACHE_SIZE)
+        super().__init__(*args, **kwargs)
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message':
@@ -28,34 +51,92 @@ class WhatIs(GladosPluginBase):
             return False
         return MEMORY_RE.search(msg['text']) or RECALL_RE.search(msg['text'])
 
+    def setup(self):
+        self.names = {}
+        # lower cased name => (item id, name, alias), for the unique index
+        lowered = {}
+        for item_id, name, alias in self.db_session.query(
+            Item.id, Item.name, Item.alias
+        ).order_by(Item.id):
+            if name.lower() in lowered:
+                # names used to be case sensitive; the newest memory wins
+                old_id, old_name, old_alias = lowered[name.lower()]
+                print('Merging WhatIs memory {!r} is {!r} into {!r} is '
+                      '{!r}'.format(old_name, old_alias, name, alias))
+                self.db_session.query(Item).filter_by(id=old_id).delete()
+            lowered[name.lower()] = (item_id, name, alias)
+            # names that only differ by what normalize() drops, like `foo`
+            # and `foo?`, keep their rows; the newest is the one recalled
+            self.names[normalize(name)] = item_id
+        create_index(self.db_session.connection(), ITEM_NAME_INDEX)
+        self.index = TrigramIndex(self.names)
+
     def handle_message(self, msg):
         memory_match = MEMORY_RE.search(msg['text'])
         recall_match = RECALL_RE.search(msg['text'])
         if memory_match:
             name = memory_match.group(1)
             alias = memory_match.group(2)
-            item = self.db_session.query(Item).filter_by(name=name).first()
-            if item is None:
-                item = Item(name=name, alias=alias)
-                self.db_session.add(item)
-            else:
-                item.alias = alias
-            message_text = 'I will remember that {} is {}'.format(name, alias),
+            self.remember(name, alias)
+            message_text = 'I will remember that {} is {}'.format(name, alias)
             self.send(message_text, msg['channel'])
         if recall_match:
             i_name = recall_match.group(1)
-            item = self.db_session.query(Item).filter_by(name=i_name).first()
-            msg = {
-                'id': 4,
-                'type': 'message',
-                'channel': msg['channel']
-            }
-            if item is None:
-                message_text = '{0} is {0}'.format(i_name)
+            memory = self.recall(i_name)
+            if memory is not None:
+                message_text = '{} is {}'.format(*memory)
             else:
-                message_text = '{} is {}'.format(item.name, item.alias)
+                message_text = '{0} is {0}'.format(i_name)
+                suggestions = self.index.suggest(normalize(i_name),
+                                                 SUGGESTION_COUNT)
+                if suggestions:
+                    message_text += '\nDid you mean: {}?'.format(
+                        ', '.join(self.recall(key)[0] for key in suggestions)
+                    )
             self.send(message_text, msg['channel'])
 
+    def remember(self, name, alias):
+        key = normalize(name)
+        item = None
+        if key in self.names:
+            item = self.db_session.query(Item).filter_by(
+                id=self.names[key]
+            ).first()
+        if item is not None and item.name.lower() != name.lower():
+            # renaming `foo?` to `foo` mustn't collide with an older `foo`
+            item = self.db_session.query(Item).filter(
+                sqlalchemy.func.lower(Item.name) == name.lower()
+            ).first() or item
+        if item is None:
+            item = Item(name=name, alias=alias)
+            self.db_session.add(item)
+        else:
+            item.name = name
+            item.alias = alias
+        self.db_session.commit()
+        self.names[key] = item.id
+        self.index.add(key)
+        self.cache.put(key, (name, alias))
+
+    def recall(self, name):
+        '''
+            Return the (name, alias) remembered for `name`, or None.
+            Names nobody has taught us are turned away without a query.
+        '''
+        key = normalize(name)
+        if key not in self.names:
+            return None
+        memory = self.cache.get(key)
+        if memory is None:
+            item = self.db_session.query(Item).filter_by(
+                id=self.names[key]
+            ).first()
+            if item is None:
+                return None
+            memory = (item.name, item.alias)
+            self.cache.put(key, memory)
+        return memory
+
     @property
     def help_text(self):
         return HELP_TEXT
@@ -65,5 +146,14 @@ class Item(Base):
     __tablename__ = 'items'
     __table_args__ = {'sqlite_autoincrement': True}
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    name = sqlalchemy.Column(sqlalchemy.String)
-    alias = sqlalchemy.Column(sqlalchemy.String)
+    name = sqlalchemy.Column(sqlalchemy.String(255))
+    alias = sqlalchemy.Column(sqlalchemy.Text)
+
+
+ITEM_NAME_INDEX = sqlalchemy.Index('ix_items_lower_name',
+                                   sqlalchemy.func.lower(Item.name),
+                                   unique=True)
+
+
+def normalize(name):
+    return name.strip().rstrip('?').strip().lower()
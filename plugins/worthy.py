@@ -10,6 +10,7 @@ WORTHY_TEXT = 'May his return come quickly, and may we be found worthy'
 
 class MHRCQAMWBFW(GladosPluginBase):
     consumes_message = True
+    triggers = ['bolas', 'nicky b']
 
     def can_handle_message(self, msg):
         if msg['type'] != 'message' or 'message' in msg:
@@ -15,13 +15,28 @@ def main():
         sys.exit(1)
 
     debug = False
-    if len(sys.argv) > 1:
-        if len(sys.argv) == 2 and sys.argv[1] == '--debug':
+    use_async = False
+    lazy_bootstrap = False
+    for arg in sys.argv[1:]:
+        if arg == '--debug':
             debug = True
+        elif arg == '--async':
+            use_async = True
+        elif arg == '--lazy-bootstrap':
+            lazy_bootstrap = True
         else:
-            print('Usage: {} [--debug]'.format(sys.argv[0]))
-
-    gclient = GladosClient(token, debug=debug)
+            print('Usage: {} [--debug] [--async] [--lazy-bootstrap]'.format(
+                sys.argv[0]
+            ))
+
+    if use_async:
+        # aiohttp is only needed for the asyncio runtime
+        from async_client import AsyncGladosClient
+        gclient = AsyncGladosClient(token, debug=debug,
+                                    lazy_bootstrap=lazy_bootstrap)
+    else:
+        gclient = GladosClient(token, debug=debug,
+                               lazy_bootstrap=lazy_bootstrap)
 
     try:
         gclient.run()
@@ -0,0 +1,95 @@
+import datetime
+import heapq
+import itertools
+from threading import Condition, Thread
+
+from croniter import croniter
+
+# what a timed plugin does about fire times that passed before it got to run
+MISSED_RUN_ONCE = 'once'  # run once for all of them
+MISSED_RUN_ALL = 'all'    # run once for each of them
+MISSED_RUN_SKIP = 'skip'  # don't run for them at all
+# how late a run can be before it counts as missed
+MISSED_RUN_GRACE = datetime.timedelta(seconds=1)
+
+
+class CronSchedule:
+    '''
+        A min-heap of timed plugins keyed by their next fire time.
+        Each plugin's cron iterator is built once and only advanced when
+        the plugin fires, so checking the schedule costs nothing until the
+        earliest deadline passes.
+    '''
+
+    def __init__(self, plugins):
+        self.heap = []
+        self.counter = itertools.count()
+        for plugin in plugins:
+            times = croniter(plugin.interval, plugin.last_run_time)
+            self.push(plugin, times, times.get_next(datetime.datetime))
+
+    def push(self, plugin, times, fire_time):
+        # the counter breaks ties so plugins themselves are never compared
+        heapq.heappush(self.heap,
+                       (fire_time, next(self.counter), plugin, times))
+
+    def next_deadline(self):
+        if not self.heap:
+            return None
+        return self.heap[0][0]
+
+    def pop_due(self, now):
+        '''
+            Return the plugins due to run at `now`, once per run they should
+            make, and schedule their next fire times.
+        '''
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_time, _, plugin, times = heapq.heappop(self.heap)
+            missed = []
+            while fire_time <= now:
+                missed.append(fire_time)
+                fire_time = times.get_next(datetime.datetime)
+            self.push(plugin, times, fire_time)
+
+            policy = getattr(plugin, 'missed_runs', MISSED_RUN_ONCE)
+            if policy == MISSED_RUN_ALL:
+                due.extend([plugin] * len(missed))
+            elif policy == MISSED_RUN_SKIP:
+                if now - missed[-1] <= MISSED_RUN_GRACE:
+                    due.append(plugin)
+            else:
+                due.append(plugin)
+        return due
+
+
+class SchedulerThread(Thread):
+    '''
+        Sleeps until the earliest deadline in a CronSchedule and hands every
+        due plugin to `fire`, which should not block.
+    '''
+
+    def __init__(self, schedule, fire):
+        self.schedule = schedule
+        self.fire = fire
+        self.running = True
+        self.wakeup = Condition()
+        super().__init__()
+
+    def run(self):
+        with self.wakeup:
+            while self.running:
+                now = datetime.datetime.now()
+                for plugin in self.schedule.pop_due(now):
+                    self.fire(plugin)
+                deadline = self.schedule.next_deadline()
+                if deadline is None:
+                    self.wakeup.wait()
+                else:
+                    delay = deadline - datetime.datetime.now()
+                    self.wakeup.wait(max(0, delay.total_seconds()))
+
+    def stop(self):
+        with self.wakeup:
+            self.running = False
+            self.wakeup.notify()
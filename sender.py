@@ -0,0 +1,228 @@
+import functools
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SEND_WORKERS = 4
+SEND_TIMEOUT = 10
+
+# slack allows roughly one message per second per channel, with short bursts
+RATE_PER_SECOND = 1
+RATE_BURST = 3
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 1
+# plain text messages waiting for the same channel are merged into one of up
+# to this many characters
+MAX_COALESCED_LENGTH = 4000
+
+
+class SlackError(Exception):
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    return session
+
+
+def can_coalesce(data):
+    return bool(data.get('text')) and \
+        'attachments' not in data and \
+        'thread_ts' not in data
+
+
+def same_options(data, other):
+    return {k: v for k, v in data.items() if k != 'text'} == \
+        {k: v for k, v in other.items() if k != 'text'}
+
+
+def coalesce(queue, url, data, futures):
+    '''
+        Pull the plain text messages queued right behind `data` into one
+        message. Their futures are added to `futures`.
+    '''
+    texts = [data['text']]
+    length = len(data['text'])
+    while queue:
+        next_url, next_data, next_future = queue[0]
+        if next_url != url or \
+           not can_coalesce(next_data) or \
+           not same_options(data, next_data) or \
+           length + len(next_data['text']) > MAX_COALESCED_LENGTH:
+            break
+        queue.popleft()
+        if not next_future.set_running_or_notify_cancel():
+            continue
+        texts.append(next_data['text'])
+        length += len(next_data['text']) + 1
+        futures.append(next_future)
+    if len(texts) == 1:
+        return data
+    return dict(data, text='\n'.join(texts))
+
+
+def gather(futures):
+    '''
+        Return a future for a dict of key => result of every future in the
+        `futures` dict, or the exception it failed with, once they are all
+        done.
+    '''
+    combined = Future()
+    results = {}
+    lock = Lock()
+    if not futures:
+        combined.set_result(results)
+        return combined
+
+    def done(key, future):
+        try:
+            result = future.result()
+        # pylint: disable=broad-except
+        except Exception as e:
+            result = e
+        with lock:
+            results[key] = result
+            finished = len(results) == len(futures)
+        if finished:
+            combined.set_result(results)
+
+    for key, future in futures.items():
+        future.add_done_callback(functools.partial(done, key))
+    return combined
+
+
+class TokenBucket:
+    '''
+        A token bucket that hands out reservations: taking a token always
+        succeeds, and says how long to wait before the token may be used.
+    '''
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def delay(self):
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+class SlackSender:
+    '''
+        Posts to the Slack web API from a pool of worker threads.
+        Requests for the same channel are sent in the order they were
+        queued, while different channels are sent in parallel over a shared
+        keep-alive connection pool.
+        Each channel is throttled by a token bucket, rate limited requests
+        are retried after slack's Retry-After. A message for an idle channel
+        is sent straight away, and plain text messages that queued up
+        behind one still being sent are merged into a single message.
+    '''
+
+    def __init__(self, workers=SEND_WORKERS, session=None, debug=False,
+                 rate=RATE_PER_SECOND, burst=RATE_BURST):
+        self.debug = debug
+        self.session = session or make_session(workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = Lock()
+        self.rate = rate
+        self.burst = burst
+        # channel => deque of (url, data, future) waiting to send
+        self.pending = {}
+        self.buckets = {}
+
+    def send(self, url, data):
+        '''
+            Queue a POST of `data` to `url`. Returns a Future that resolves
+            to the decoded response, or raises SlackError if slack refused it.
+        '''
+        future = Future()
+        channel = data['channel']
+        item = (url, data, future)
+        with self.lock:
+            if channel in self.pending:
+                # a worker is already draining this channel
+                self.pending[channel].append(item)
+                return future
+            self.pending[channel] = deque([item])
+            if channel not in self.buckets:
+                self.buckets[channel] = TokenBucket(self.rate, self.burst)
+        self.executor.submit(self.drain, channel)
+        return future
+
+    def drain(self, channel):
+        bucket = self.buckets[channel]
+        while True:
+            with self.lock:
+                queue = self.pending[channel]
+                if not queue:
+                    del self.pending[channel]
+                    return
+                url, data, future = queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            time.sleep(bucket.delay())
+            futures = [future]
+            if can_coalesce(data):
+                with self.lock:
+                    data = coalesce(self.pending[channel], url, data,
+                                    futures)
+            try:
+                result = self.post(url, data)
+            # pylint: disable=broad-except
+            except Exception as e:
+                print('Problem sending to {}:\n{}'.format(channel, e))
+                for waiting in futures:
+                    waiting.set_exception(e)
+            else:
+                for waiting in futures:
+                    waiting.set_result(result)
+
+    def post(self, url, data):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, data=data,
+                                             timeout=SEND_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+                attempt += 1
+                continue
+            if self.debug:
+                print(response)
+            if response.status_code == 429 and attempt < MAX_RETRIES:
+                retry_after = response.headers.get('Retry-After')
+                if retry_after is None:
+                    time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+                else:
+                    time.sleep(float(retry_after))
+                attempt += 1
+                continue
+            body = response.json()
+            if not body.get('ok'):
+                raise SlackError(body.get('error', 'unknown error'))
+            return body
+
+    def close(self):
+        '''
+            Wait for everything queued so far to be sent.
+        '''
+        self.executor.shutdown(wait=True)
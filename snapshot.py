@@ -0,0 +1,67 @@
+import os
+import pickle
+
+
+class Record:
+    '''
+        A plain record of the fields named in a subclass's __slots__.
+        Records pickle as their class and a tuple of the values, which is
+        smaller and quicker to load than every field by name.
+    '''
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+    def __reduce__(self):
+        return (record_from_values, (
+            type(self), tuple(getattr(self, name) for name in self.__slots__)
+        ))
+
+
+def record_from_values(cls, values):
+    record = cls.__new__(cls)
+    for name, value in zip(cls.__slots__, values):
+        setattr(record, name, value)
+    return record
+
+
+def file_stamp(path):
+    '''
+        Return the (mtime, size) of a file, which changes whenever it does.
+    '''
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_snapshot(path, version):
+    '''
+        Return what was pickled to `path` by write_snapshot, or None if
+        nothing was or it was written with another `version`. Bump the
+        version whenever what's pickled changes.
+    '''
+    try:
+        with open(path, 'rb') as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    # pylint: disable=broad-except
+    except Exception as e:
+        print('Ignoring unreadable snapshot {}:\n{}'.format(path, e))
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != version:
+        return None
+    return snapshot.get('value')
+
+
+def write_snapshot(path, version, value):
+    # written aside and moved into place, so a reader never sees half of it
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as snapshot_file:
+            pickle.dump({'version': version, 'value': value}, snapshot_file,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print('Could not write snapshot {}:\n{}'.format(path, e))
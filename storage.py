@@ -0,0 +1,175 @@
+import json
+import warnings
+from contextlib import contextmanager
+
+import sqlalchemy
+import sqlalchemy.exc
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.schema import CreateIndex
+
+from plugin_base import DeclarativeBase as Base
+
+STORAGE_FILENAME = 'storage.json'
+MEMORY_URL = 'sqlite:///memory.db'
+POOL_SIZE = 8
+MAX_OVERFLOW = 10
+# seconds before a pooled connection is replaced, so server side idle
+# timeouts never hand a plugin a dead connection
+POOL_RECYCLE = 3600
+# run on every new sqlite connection. WAL lets readers carry on while
+# another plugin commits, and busy_timeout makes writers wait their turn for
+# the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+    'cache_size': -8000,
+}
+
+
+def load_config(filename=STORAGE_FILENAME):
+    '''
+        Read the engine settings from `filename`, a JSON object that may set
+        "url", "pool_size", "max_overflow" and "pragmas". Anything left out
+        keeps its default, and pragmas are added to SQLITE_PRAGMAS.
+        No file means the defaults: memory.db, on SQLite.
+    '''
+    try:
+        with open(filename) as config_file:
+            config = json.loads(config_file.read())
+    except FileNotFoundError:
+        return {}
+    unknown = set(config) - {'url', 'pool_size', 'max_overflow', 'pragmas'}
+    if unknown:
+        raise ValueError('Unknown storage settings in {}: {}'.format(
+            filename, ', '.join(sorted(unknown))
+        ))
+    if 'pragmas' in config:
+        pragmas = dict(SQLITE_PRAGMAS)
+        pragmas.update(config['pragmas'])
+        config['pragmas'] = pragmas
+    return config
+
+
+def create_engine(url=MEMORY_URL, pool_size=POOL_SIZE,
+                  max_overflow=MAX_OVERFLOW, pragmas=SQLITE_PRAGMAS):
+    '''
+        Create a pooled engine for `url` with every table in place.
+        Pragmas only apply to SQLite.
+    '''
+    kwargs = {}
+    if url.startswith('sqlite'):
+        # connections are handed between threads by the pool
+        kwargs['connect_args'] = {'check_same_thread': False}
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # an in-memory database only exists on its one connection
+            kwargs['poolclass'] = StaticPool
+        else:
+            kwargs['poolclass'] = QueuePool
+            kwargs['pool_size'] = pool_size
+            kwargs['max_overflow'] = max_overflow
+    else:
+        kwargs['pool_size'] = pool_size
+        kwargs['max_overflow'] = max_overflow
+        kwargs['pool_recycle'] = POOL_RECYCLE
+    engine = sqlalchemy.create_engine(url, **kwargs)
+    if url.startswith('sqlite') and pragmas:
+        set_pragmas_on_connect(engine, pragmas)
+    Base.metadata.create_all(engine)
+    create_missing_indexes(engine)
+    return engine
+
+
+def set_pragmas_on_connect(engine, pragmas):
+    # pylint: disable=unused-argument
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+
+
+def create_missing_indexes(engine):
+    '''
+        create_all skips tables that already exist, including any indexes
+        added to their models since, so create those here.
+        Indexes on expressions can't be reflected, so they are always tried.
+        A unique index the existing rows don't fit is reported and left for
+        its plugin to sort out in setup().
+    '''
+    inspector = sqlalchemy.inspect(engine)
+    table_names = inspector.get_table_names()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in table_names:
+            continue
+        with warnings.catch_warnings():
+            # reflection warns about every index on an expression
+            warnings.simplefilter('ignore', sqlalchemy.exc.SAWarning)
+            existing = {_['name'] for _ in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                with engine.begin() as connection:
+                    create_index(connection, index)
+            except sqlalchemy.exc.IntegrityError as e:
+                print('Could not create index {}:\n{}'.format(index.name, e))
+
+
+def create_index(connection, index):
+    connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+class Storage:
+    '''
+        Hands out sessions on one pooled engine. Every plugin gets its own
+        scoped_session, so nothing one plugin has pending ends up in another
+        plugin's commit, and each thread running a plugin's handlers works
+        in a session of its own. `scopefunc` says what else should get its
+        own session, as for scoped_session; by default each thread does.
+    '''
+
+    def __init__(self, engine, scopefunc=None):
+        self.engine = engine
+        self.session_factory = sessionmaker(engine)
+        self.scopefunc = scopefunc
+        self.sessions = []
+
+    def session(self):
+        session = scoped_session(self.session_factory,
+                                 scopefunc=self.scopefunc)
+        self.sessions.append(session)
+        return session
+
+    def close(self):
+        for session in self.sessions:
+            session.remove()
+        self.engine.dispose()
+
+
+@contextmanager
+def handler_session(session):
+    '''
+        Commit what the handler run inside this block did, or roll it back if
+        it raised, then release the calling thread's session.
+        Plugins may still commit part way through.
+    '''
+    try:
+        yield
+        session.commit()
+    # pylint: disable=bare-except
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.remove()
+
+
+def run_in_session(session, fn, *args):
+    with handler_session(session):
+        return fn(*args)
@@ -0,0 +1,339 @@
+# pylint: disable=redefined-outer-name
+import asyncio
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+import client as client_module
+from async_client import AsyncGladosClient, AsyncSlackSender, task_or_thread
+from plugin_base import GladosPluginBase
+from plugins.karma import KarmaItem
+from sender import SlackError
+from storage import Storage, create_engine
+
+
+class FakeResponse:
+    def __init__(self, body, status=200, headers=None):
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+
+    async def json(self, content_type=None):
+        return self.body
+
+
+class FakePost:
+    def __init__(self, session, data):
+        self.session = session
+        self.data = data
+
+    async def __aenter__(self):
+        session = self.session
+        gate = session.blocked.get(self.data['channel'])
+        if gate is not None:
+            session.waiting.set()
+            await gate.wait()
+        session.sent.append((self.data['channel'], self.data.get('text')))
+        if session.rate_limited:
+            session.rate_limited -= 1
+            return FakeResponse({'ok': False, 'error': 'ratelimited'},
+                                429, {'Retry-After': '0'})
+        if self.data.get('text') == 'bad':
+            return FakeResponse({'ok': False, 'error': 'channel_not_found'})
+        return FakeResponse({'ok': True, 'channel': self.data['channel']})
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    def __init__(self):
+        self.sent = []
+        self.blocked = {}
+        self.waiting = asyncio.Event()
+        self.rate_limited = 0
+
+    def post(self, url, data, timeout=None):
+        return FakePost(self, data)
+
+
+class FakePlugin:
+    plugin_name = 'Fake'
+
+    def __init__(self, max_concurrency, handler_timeout=30):
+        self.max_concurrency = max_concurrency
+        self.handler_timeout = handler_timeout
+        self.db_session = Mock()
+        self.active = 0
+        self.peak = 0
+        self.handled = []
+
+    async def handle_message(self, msg, gate):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await gate.wait()
+        self.active -= 1
+        self.handled.append(msg)
+
+    def handle_blocking(self, msg):
+        self.handled.append((msg, threading.current_thread().name))
+
+
+def make_sender(session):
+    sender = AsyncSlackSender(rate=1000, burst=1000)
+    sender.start(asyncio.get_running_loop(), session)
+    return sender
+
+
+def make_client():
+    # everything run_handler needs, without connecting to slack
+    client = AsyncGladosClient.__new__(AsyncGladosClient)
+    client.loop = asyncio.get_running_loop()
+    client.semaphores = {}
+    client.tasks = set()
+    return client
+
+
+async def finish(client):
+    while client.tasks:
+        await asyncio.wait(client.tasks)
+
+
+@pytest.fixture
+def storage(tmpdir):
+    url = 'sqlite:///{}'.format(tmpdir.join('memory.db'))
+    storage = Storage(create_engine(url), scopefunc=task_or_thread)
+    yield storage
+    storage.close()
+
+
+def test_keeps_channel_order():
+    async def scenario():
+        session = FakeSession()
+        sender = make_sender(session)
+        futures = [sender.send('url', {'channel': 'C1', 'text': str(i),
+                                       'attachments': '[]'})
+                   for i in range(20)]
+        for future in futures:
+            assert (await asyncio.wrap_future(future))['ok']
+        await sender.close()
+        return session.sent
+
+    assert asyncio.run(scenario()) == [('C1', str(i)) for i in range(20)]
+
+
+def test_slow_channel_does_not_block_others():
+    async def scenario():
+        session = FakeSession()
+        gate = session.blocked['SLOW'] = asyncio.Event()
+        sender = make_sender(session)
+        slow = sender.send('url', {'channel': 'SLOW', 'text': 'first'})
+        fast = sender.send('url', {'channel': 'FAST', 'text': 'second'})
+        await asyncio.wrap_future(fast)
+        assert not slow.done()
+        gate.set()
+        await asyncio.wrap_future(slow)
+        return session.sent
+
+    assert asyncio.run(scenario()) == [('FAST', 'second'), ('SLOW', 'first')]
+
+
+def test_coalesces_queued_plain_text():
+    async def scenario():
+        session = FakeSession()
+        gate = session.blocked['C1'] = asyncio.Event()
+        sender = make_sender(session)
+        first = sender.send('url', {'channel': 'C1', 'text': 'first'})
+        await session.waiting.wait()
+        futures = [sender.send('url', {'channel': 'C1', 'text': str(i)})
+                   for i in range(3)]
+        card = sender.send('url', {'channel': 'C1', 'text': 'card',
+                                   'attachments': '[]'})
+        gate.set()
+        await sender.close()
+        assert first.result()['ok']
+        assert futures[0].result() is futures[2].result()
+        assert card.result()['ok']
+        return session.sent
+
+    assert asyncio.run(scenario()) == [
+        ('C1', 'first'),
+        ('C1', '0\n1\n2'),
+        ('C1', 'card'),
+    ]
+
+
+def test_retries_after_rate_limit():
+    async def scenario():
+        session = FakeSession()
+        session.rate_limited = 2
+        sender = make_sender(session)
+        future = sender.send('url', {'channel': 'C1', 'text': 'hi'})
+        assert (await asyncio.wrap_future(future))['ok']
+        bad = sender.send('url', {'channel': 'C1', 'text': 'bad'})
+        with pytest.raises(SlackError):
+            await asyncio.wrap_future(bad)
+        return session.sent
+
+    assert len(asyncio.run(scenario())) == 4
+
+
+def test_sends_queued_before_start():
+    async def scenario():
+        session = FakeSession()
+        sender = AsyncSlackSender(rate=1000, burst=1000)
+        future = sender.send('url', {'channel': 'C1', 'text': 'early'})
+        sender.start(asyncio.get_running_loop(), session)
+        assert (await asyncio.wrap_future(future))['ok']
+        return session.sent
+
+    assert asyncio.run(scenario()) == [('C1', 'early')]
+
+
+def test_runs_unlimited_handlers_off_the_loop_one_at_a_time(capsys):
+    gate = threading.Event()
+
+    def handle_slowly(msg):
+        gate.wait(5)
+
+    async def scenario():
+        client = make_client()
+        plugin = FakePlugin(0, handler_timeout=0.05)
+        client.run_handler(plugin, handle_slowly, 'slow')
+        client.run_handler(plugin, plugin.handle_blocking, 'hi')
+        # the loop is free while the first handler blocks, and the second
+        # waits for it even once it has timed out
+        await asyncio.sleep(0.2)
+        assert not plugin.handled
+        gate.set()
+        await finish(client)
+        return plugin
+
+    plugin = asyncio.run(scenario())
+    assert 'Fake handler timed out after 0.05s' in capsys.readouterr().out
+    assert [msg for msg, _ in plugin.handled] == ['hi']
+    assert plugin.handled[0][1] != threading.current_thread().name
+    assert plugin.db_session.commit.call_count == 2
+    assert plugin.db_session.remove.call_count == 2
+
+
+def test_runs_limited_handlers_in_executor_in_order():
+    async def scenario():
+        client = make_client()
+        plugin = FakePlugin(1)
+        for i in range(5):
+            client.run_handler(plugin, plugin.handle_blocking, i)
+        await finish(client)
+        return plugin
+
+    plugin = asyncio.run(scenario())
+    assert [msg for msg, _ in plugin.handled] == list(range(5))
+    assert all(thread != threading.current_thread().name
+               for _, thread in plugin.handled)
+    assert plugin.db_session.commit.call_count == 5
+
+
+def test_limits_coroutine_concurrency():
+    async def scenario():
+        client = make_client()
+        plugin = FakePlugin(2)
+        gate = asyncio.Event()
+        for i in range(6):
+            client.run_handler(plugin, plugin.handle_message, i, gate)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert plugin.active == 2
+        gate.set()
+        await finish(client)
+        return plugin
+
+    plugin = asyncio.run(scenario())
+    assert plugin.peak == 2
+    assert sorted(plugin.handled) == list(range(6))
+
+
+def test_hung_handler_times_out_and_frees_its_slot(capsys):
+    async def scenario():
+        client = make_client()
+        plugin = FakePlugin(1, handler_timeout=0.05)
+        client.run_handler(plugin, plugin.handle_message, 'hung',
+                           asyncio.Event())
+        gate = asyncio.Event()
+        gate.set()
+        client.run_handler(plugin, plugin.handle_message, 'next', gate)
+        await finish(client)
+        return plugin
+
+    plugin = asyncio.run(scenario())
+    assert plugin.handled == ['next']
+    assert 'Fake handler timed out after 0.05s' in capsys.readouterr().out
+    plugin.db_session.rollback.assert_called_once_with()
+
+
+def test_coroutines_get_their_own_session(storage):
+    session = storage.session()
+    seen = []
+
+    async def remember(name, started, finish):
+        seen.append(session())
+        session.add(KarmaItem(name=name, plus=1, minus=0))
+        started.set()
+        await finish.wait()
+        if name == 'envy':
+            raise ValueError()
+
+    async def overlap():
+        first, second = asyncio.Event(), asyncio.Event()
+        finish = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(AsyncGladosClient.run_coroutine(
+                session, remember, 'roy', first, finish
+            )),
+            asyncio.ensure_future(AsyncGladosClient.run_coroutine(
+                session, remember, 'envy', second, finish
+            )),
+        ]
+        await first.wait()
+        await second.wait()
+        finish.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(overlap())
+    assert results[0] is None
+    assert isinstance(results[1], ValueError)
+    assert seen[0] is not seen[1]
+    names = [item.name for item in session.query(KarmaItem)]
+    assert names == ['roy']
+
+
+class Greeter(GladosPluginBase):
+    def setup(self):
+        self.send('Hello, and again, welcome', 'C1')
+
+    @property
+    def help_text(self):
+        return 'Says hello.'
+
+
+def test_plugins_send_through_the_async_sender_from_setup(tmpdir,
+                                                          monkeypatch):
+    def bootstrap(client):
+        client.slack_url = 'ws://localhost'
+        client.bot_id = 'GLADOS'
+        client.add_channel({'id': 'C1', 'name': 'general'})
+
+    def load_plugins(client):
+        client.plugin_metadata.append({'name': 'Greeter', 'class': Greeter})
+
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setattr(client_module, 'LOG_FILE_TEMPLATE',
+                        str(tmpdir.join('{channel}', '{date}.log')))
+    monkeypatch.setattr(AsyncGladosClient, 'bootstrap', bootstrap)
+    monkeypatch.setattr(AsyncGladosClient, 'load_plugins', load_plugins)
+    monkeypatch.setattr(client_module, 'SlackSender', None)
+    client = AsyncGladosClient('token')
+    client.close()
+    assert isinstance(client.sender, AsyncSlackSender)
+    assert [data['text'] for _, data, _ in client.sender.early] == \
+        ['Hello, and again, welcome']
@@ -0,0 +1,117 @@
+# pylint: disable=redefined-outer-name
+import json
+from unittest.mock import Mock
+
+import pytest
+
+from plugins import card_fetcher
+from plugins.card_fetcher import CardFetcher
+from plugins.mtg_cards import MagicCard, init_card_store
+
+BULK_DATA = [
+    {
+        'name': 'Lightning Bolt',
+        'layout': 'normal',
+        'mana_cost': '{R}',
+        'type_line': 'Instant',
+        'oracle_text': 'Lightning Bolt deals 3 damage to any target.',
+        'image_uris': {'normal': 'https://example.com/bolt.jpg'},
+    },
+    {
+        'name': 'Lightning Angel',
+        'layout': 'normal',
+        'mana_cost': '{1}{R}{W}{U}',
+        'type_line': 'Creature — Angel',
+        'oracle_text': 'Flying, vigilance, haste',
+        'power': '3',
+        'toughness': '4',
+        'multiverse_ids': [106426],
+    },
+    {
+        'name': 'Fire // Ice',
+        'layout': 'split',
+        'mana_cost': '{1}{R} // {1}{U}',
+        'type_line': 'Instant // Instant',
+        'card_faces': [
+            {'name': 'Fire', 'type_line': 'Instant',
+             'oracle_text': 'Fire deals 2 damage divided as you choose.'},
+            {'name': 'Ice', 'type_line': 'Instant',
+             'oracle_text': 'Tap target permanent. Draw a card.'},
+        ],
+        'image_uris': {'normal': 'https://example.com/fire-ice.jpg'},
+    },
+    {
+        'name': 'Goblin',
+        'layout': 'token',
+        'type_line': 'Token Creature — Goblin',
+    },
+]
+
+
+@pytest.fixture
+def paths(tmpdir):
+    data_path = str(tmpdir.join('mtgcards.json'))
+    with open(data_path, 'w', encoding='utf-8') as data_file:
+        data_file.write(json.dumps(BULK_DATA))
+    return data_path, str(tmpdir.join('mtgcards.pickle'))
+
+
+@pytest.fixture
+def plugin(paths):
+    plugin = CardFetcher(None, Mock())
+    plugin.store = init_card_store(*paths)
+    return plugin
+
+
+def test_store(paths, monkeypatch):
+    store = init_card_store(*paths)
+    assert len(store) == 5
+    bolt = store.get_card('LIGHTNING BOLT')
+    assert (bolt.mana_cost, bolt.type, bolt.subtype) == ('{R}', 'Instant', '')
+    assert bolt.image_url == 'https://example.com/bolt.jpg'
+    angel = store.get_card('lightning a')
+    assert (angel.type, angel.subtype, angel.power) == ('Creature', 'Angel',
+                                                        '3')
+    assert angel.image_url.endswith('multiverseid=106426&type=card')
+    assert store.get_card('ice').name == 'Fire // Ice'
+    assert 'Draw a card.' in store.get_card('fire // ice').text
+    assert store.get_card('goblin') is None
+    assert store.get_card('li') is None
+    assert store.complete('Light', 5) == ['lightning angel',
+                                          'lightning bolt']
+
+    def fail(card):
+        raise AssertionError('bulk data parsed again')
+    monkeypatch.setattr(MagicCard, 'from_scryfall', fail)
+    assert init_card_store(*paths).get_card('ice').name == 'Fire // Ice'
+
+
+def test_no_bulk_data(tmpdir):
+    assert init_card_store(str(tmpdir.join('missing.json')),
+                           str(tmpdir.join('missing.pickle'))) is None
+
+
+def test_lookups_deduplicated(plugin, monkeypatch):
+    get_card_obj = Mock(return_value=None)
+    monkeypatch.setattr(card_fetcher, 'get_card_obj', get_card_obj)
+    plugin.handle_message({
+        'type': 'message', 'channel': 'C1',
+        'text': '[[Lightning Bolt]] {{lightning bolt}} [[Black Lotus]] '
+                '{{black lotus}}'
+    })
+    # only the card missing from the bulk data goes to deckbrew, once
+    get_card_obj.assert_called_once_with('Black Lotus')
+    assert plugin.send.call_count == 4
+    image = plugin.send.call_args_list[0][0][2][0]
+    assert image['image_url'] == 'https://example.com/bolt.jpg'
+
+
+def test_remote_cards_cached(plugin, monkeypatch):
+    lotus = MagicCard(name='Black Lotus', mana_cost='{0}', type='Artifact',
+                      subtype='', text='', power='', toughness='',
+                      loyalty='', image_url='')
+    get_card_obj = Mock(return_value=lotus)
+    monkeypatch.setattr(card_fetcher, 'get_card_obj', get_card_obj)
+    assert plugin.get_card('Black Lotus') is lotus
+    assert plugin.get_card('black lotus') is lotus
+    assert get_card_obj.call_count == 1
@@ -0,0 +1,131 @@
+import datetime
+import gzip
+import os
+
+import channel_log
+from channel_log import ChannelLogWriter
+
+
+def test_writes_batched_lines_per_channel(tmpdir):
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    writer = ChannelLogWriter(template)
+    writer.start()
+    writer.write('general', 'patrick', 'hello')
+    writer.write('general', 'glados', 'hello, patrick')
+    writer.write('random', 'patrick', 'potato')
+    writer.stop()
+    writer.join()
+
+    date = datetime.date.today().strftime('%Y-%m-%d')
+    with open(template.format(channel='general', date=date)) as log_file:
+        lines = log_file.read().splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith('] patrick: hello')
+    assert lines[1].endswith('] glados: hello, patrick')
+    with open(template.format(channel='random', date=date)) as log_file:
+        assert log_file.read().endswith('] patrick: potato\n')
+
+
+def test_rotates_and_compresses_old_days(tmpdir):
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    writer = ChannelLogWriter(template, compress=True)
+    writer.write_buffers({
+        ('general', '2020-01-01'): ['[23:59:59] patrick: good night\n'],
+    })
+    old_file_name = template.format(channel='general', date='2020-01-01')
+    assert not os.path.exists(old_file_name)
+    assert not writer.files
+    with gzip.open(old_file_name + '.gz', 'rt') as log_file:
+        assert log_file.read() == '[23:59:59] patrick: good night\n'
+
+
+def test_bounds_open_files(tmpdir):
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    writer = ChannelLogWriter(template, max_open_logs=2)
+    date = datetime.date.today().strftime('%Y-%m-%d')
+    for channel_name in ['one', 'two', 'three', 'one']:
+        writer.write_buffers({(channel_name, date): [channel_name + '\n']})
+        assert len(writer.files) <= 2
+    assert ('one', date) in writer.files
+    assert ('two', date) not in writer.files
+    with open(template.format(channel='one', date=date)) as log_file:
+        assert log_file.read() == 'one\none\n'
+
+
+def test_retries_then_drops_failed_writes(tmpdir, capsys):
+    # a file where the channel's directory should be
+    tmpdir.join('full').write('')
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    writer = ChannelLogWriter(template)
+    date = datetime.date.today().strftime('%Y-%m-%d')
+    writer.write_buffers({('full', date): ['one\n'],
+                          ('fine', date): ['two\n']})
+    assert writer.buffers == {('full', date): ['one\n']}
+    assert 'will retry' in capsys.readouterr().out
+    writer.write('full', 'patrick', 'three')
+    for _ in range(2):
+        buffers = writer.buffers
+        writer.buffers = {}
+        writer.write_buffers(buffers)
+    assert not writer.buffers
+    assert 'Dropping 2 lines of the full log' in capsys.readouterr().out
+    with open(template.format(channel='fine', date=date)) as log_file:
+        assert log_file.read() == 'two\n'
+
+
+def test_keeps_running_after_errors(tmpdir, monkeypatch, capsys):
+    def compress_file(file_name):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(channel_log, 'compress_file', compress_file)
+    tmpdir.join('full').write('')
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    writer = ChannelLogWriter(template, compress=True)
+    writer.write_buffers({
+        ('general', '2020-01-01'): ['[23:59:59] patrick: good night\n'],
+    })
+    assert 'No space left on device' in capsys.readouterr().out
+    writer.start()
+    writer.write('full', 'patrick', 'hello')
+    writer.write('general', 'patrick', 'hello')
+    writer.stop()
+    writer.join()
+    assert 'Dropping 1 lines of the full log' in capsys.readouterr().out
+    date = datetime.date.today().strftime('%Y-%m-%d')
+    with open(template.format(channel='general', date=date)) as log_file:
+        assert log_file.read().endswith('] patrick: hello\n')
+
+
+def test_compresses_logs_closed_early_once_the_day_is_over(tmpdir):
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    writer = ChannelLogWriter(template, compress=True)
+    today = writer.today()
+    writer.write_buffers({('general', today): ['hello\n']})
+    # gone quiet, so closed while its day is still going
+    writer.close_old_files(writer.last_write[('general', today)] +
+                           channel_log.LOG_IDLE_TIMEOUT + 1)
+    file_name = template.format(channel='general', date=today)
+    assert not writer.files
+    assert os.path.exists(file_name)
+
+    writer.today = lambda: '9999-12-31'
+    writer.write_buffers({('random', '9999-12-31'): ['potato\n']})
+    assert not os.path.exists(file_name)
+    with gzip.open(file_name + '.gz', 'rt') as log_file:
+        assert log_file.read() == 'hello\n'
+    assert ('random', '9999-12-31') in writer.files
+
+
+def test_compresses_leftover_logs_on_stop(tmpdir):
+    template = os.path.join(str(tmpdir), '{channel}', '{date}.log')
+    tmpdir.mkdir('general').join('2020-01-01.log').write('old\n')
+    writer = ChannelLogWriter(template, compress=True)
+    writer.start()
+    writer.write('general', 'patrick', 'hello')
+    writer.stop()
+    writer.join()
+    old_file_name = template.format(channel='general', date='2020-01-01')
+    assert not os.path.exists(old_file_name)
+    with gzip.open(old_file_name + '.gz', 'rt') as log_file:
+        assert log_file.read() == 'old\n'
+    today = datetime.date.today().strftime('%Y-%m-%d')
+    assert os.path.exists(template.format(channel='general', date=today))
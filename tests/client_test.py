@@ -0,0 +1,82 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from unittest.mock import Mock
+
+import client
+from directory import Directory
+from dispatch import TriggerIndex
+
+
+class FakePlugin:
+    triggers = None
+    consumes_message = False
+    max_concurrency = 0
+
+    def __init__(self):
+        self.db_session = Mock()
+        self.handled = []
+
+    def can_handle_message(self, msg):
+        return True
+
+    def handle_message(self, msg):
+        self.handled.append(msg['text'])
+
+
+def make_client(lookup_user):
+    # everything handle_message needs, without connecting to slack
+    glados = client.GladosClient.__new__(client.GladosClient)
+    glados.debug = False
+    glados.debug_channel = None
+    glados.bot_users = set()
+    glados.users = Directory(lookup=lookup_user)
+    glados.channels = Directory({'C1': 'general'})
+    glados.resolver = ThreadPoolExecutor(max_workers=1)
+    glados.queue = Queue()
+    glados.channel_log = Mock()
+    glados.handler_pool = None
+    glados.plugins = [FakePlugin()]
+    glados.trigger_index = TriggerIndex(glados.plugins)
+    return glados
+
+
+def message(text, user):
+    return json.dumps({'type': 'message', 'channel': 'C1', 'user': user,
+                       'text': text})
+
+
+def test_looks_up_unknown_users_off_the_dispatch_thread():
+    gate = threading.Event()
+
+    def lookup_user(user_id):
+        gate.wait(5)
+        return 'sorey'
+
+    glados = make_client(lookup_user)
+    glados.users['U1'] = 'rose'
+    glados.handle_message(message('hello', 'U2'))
+    glados.handle_message(message('hi', 'U1'))
+    plugin = glados.plugins[0]
+    assert plugin.handled == ['hi']
+    glados.channel_log.write.assert_called_once_with('general', 'rose', 'hi')
+
+    gate.set()
+    resolved = glados.queue.get(timeout=5)
+    assert resolved['type'] == client.MSG_TYPE_RESOLVED
+    glados.dispatch_message(resolved['msg'])
+    assert plugin.handled == ['hi', 'hello']
+    glados.channel_log.write.assert_called_with('general', 'sorey', 'hello')
+    glados.handle_message(message('again', 'U2'))
+    assert plugin.handled == ['hi', 'hello', 'again']
+    glados.resolver.shutdown()
+
+
+def test_logs_posts_to_unknown_channels_once_resolved():
+    glados = make_client(lambda user_id: None)
+    glados.channels = Directory(lookup=lambda channel_id: 'random')
+    glados.log_message('potato', None, 'C2')
+    glados.resolver.shutdown(wait=True)
+    glados.channel_log.write.assert_called_once_with('random', 'BOT',
+                                                     'potato')
@@ -0,0 +1,79 @@
+from directory import Directory, SlackAPI
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeSlack:
+    '''
+        Serves users.list two users per page, and users.info.
+    '''
+
+    def __init__(self, users):
+        self.users = users
+        self.calls = []
+
+    def get(self, url, params, timeout=None):
+        method = url.rsplit('/', 1)[1]
+        self.calls.append(method)
+        if method == 'users.info':
+            for user in self.users:
+                if user['id'] == params['user']:
+                    return FakeResponse({'ok': True, 'user': user})
+            return FakeResponse({'ok': False, 'error': 'user_not_found'})
+        start = int(params.get('cursor', 0))
+        body = {'ok': True, 'members': self.users[start:start + 2]}
+        if start + 2 < len(self.users):
+            body['response_metadata'] = {'next_cursor': str(start + 2)}
+        return FakeResponse(body)
+
+
+USERS = [{'id': 'U{}'.format(i), 'name': 'user{}'.format(i)}
+         for i in range(5)]
+
+
+def test_pages_through_list():
+    slack = FakeSlack(USERS)
+    api = SlackAPI('token', session=slack)
+    assert list(api.pages('users.list', 'members')) == USERS
+    assert slack.calls == ['users.list'] * 3
+
+
+def test_looks_up_missing_ids_once():
+    slack = FakeSlack(USERS)
+    api = SlackAPI('token', session=slack)
+
+    def lookup(user_id):
+        try:
+            return api.call('users.info', user=user_id)['user']['name']
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    users = Directory(lookup=lookup)
+    assert users.get('U3') is None
+    assert users.needs_lookup('U3')
+    assert users.fetch('U3') == 'user3'
+    assert users.fetch('U3') == 'user3'
+    assert users['U3'] == 'user3'
+    assert users.fetch('NOBODY') is None
+    assert users.fetch('NOBODY') is None
+    assert not users.needs_lookup('NOBODY')
+    assert users.fetch(None) is None
+    assert slack.calls == ['users.info', 'users.info']
+    assert dict(users) == {'U3': 'user3'}
+
+
+def test_indexes_names():
+    users = Directory({'U1': 'alicia', 'U2': 'sorey'})
+    assert users.id_for('sorey') == 'U2'
+    users['U2'] = 'shepherd'
+    assert users.id_for('sorey') is None
+    assert users.id_for('shepherd') == 'U2'
+    del users['U1']
+    assert users.id_for('alicia') is None
+    assert users.get('U1') is None
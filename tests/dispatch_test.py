@@ -0,0 +1,45 @@
+from dispatch import TriggerIndex
+
+
+class FakePlugin:
+    def __init__(self, name, triggers):
+        self.name = name
+        self.triggers = triggers
+
+
+def names(plugins):
+    return [_.name for _ in plugins]
+
+
+def test_routes_only_to_triggered_plugins():
+    index = TriggerIndex([
+        FakePlugin('cards', ['[[', '{{']),
+        FakePlugin('karma', ['karma', '++', '--']),
+        FakePlugin('groups', ['group', '@']),
+    ])
+    assert names(index.candidates('fetch [[Teemo]] please')) == ['cards']
+    assert names(index.candidates('KARMA glados')) == ['karma']
+    assert names(index.candidates('just chatting')) == []
+    assert names(index.candidates('@devs [[Teemo]] c++')) == \
+        ['cards', 'karma', 'groups']
+
+
+def test_keeps_load_order_and_untriggered_plugins():
+    index = TriggerIndex([
+        FakePlugin('everything', None),
+        FakePlugin('never', []),
+        FakePlugin('sun', ['sun']),
+    ])
+    assert names(index.candidates('sunny day')) == ['everything', 'sun']
+    assert names(index.candidates('rainy day')) == ['everything']
+    assert names(index.candidates(None)) == ['everything']
+
+
+def test_overlapping_literals():
+    index = TriggerIndex([
+        FakePlugin('short', ['ay']),
+        FakePlugin('long', ['ayy lmao']),
+        FakePlugin('inner', ['lmao']),
+    ])
+    assert names(index.candidates('AYY LMAO')) == ['short', 'long', 'inner']
+    assert names(index.candidates('ay')) == ['short']
@@ -0,0 +1,33 @@
+from fuzzy import TrigramIndex, edit_distance
+
+
+def test_prefix_and_similar():
+    index = TrigramIndex(['wheatley', 'glados', 'cave johnson', 'caroline'])
+    assert index.starting_with('ca', 5) == ['caroline', 'cave johnson']
+    assert index.similar('gladso', 1) == ['glados']
+    assert index.suggest('cav', 1) == ['cave johnson']
+    index.remove('glados')
+    index.add('chell')
+    assert 'glados' not in index
+    assert index.similar('gladso', 1) == []
+    assert index.starting_with('c', 5) == ['caroline', 'cave johnson',
+                                           'chell']
+
+
+def test_edit_distance():
+    assert edit_distance('garen', 'garen', 2) == 0
+    assert edit_distance('gaern', 'garen', 2) == 1
+    assert edit_distance('jinks', 'jinx', 2) == 2
+    assert edit_distance('tryndamere', 'trndamer', 2) == 2
+    # anything over the limit is limit + 1
+    assert edit_distance('teemo', 'garen', 2) == 3
+    assert edit_distance('vi', 'tryndamere', 1) == 2
+
+
+def test_closest():
+    index = TrigramIndex(['garen', 'tryndamere', 'jinx', 'vanguard sergeant'])
+    assert index.closest('gaern', 2) == 'garen'
+    assert index.closest('tryndamier', 3) == 'tryndamere'
+    assert index.closest('vangaurd sargeant', 3) == 'vanguard sergeant'
+    assert index.closest('jinks', 1) is None
+    assert index.closest('teemo', 2) is None
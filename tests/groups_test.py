@@ -4,6 +4,7 @@ from unittest.mock import Mock
 import pytest
 import sqlalchemy
 
+from directory import Directory
 from plugins import groups
 from plugin_base import DeclarativeBase as Base
 
@@ -26,7 +27,7 @@ def plugin():
     session = session_cls()
     send_fn = Mock()
     # user id => user name
-    users = {
+    users = Directory({
         'PATRICK': 'patrick',
         'ALICIA': 'alicia',
         'SOREY': 'sorey',
@@ -35,17 +36,19 @@ def plugin():
         'LAILAH': 'lailah',
         'DEZEL': 'dezel',
         'EDNA': 'edna'
-    }
+    })
     channels = {
         'LADYLAKE': 'ladylake',
         'CHANNEL': 'general'
     }
-    return groups.Groups(
+    plugin = groups.Groups(
         session,
         send_fn,
         users=users,
         channels=channels
     )
+    plugin.setup()
+    return plugin
 
 
 def test_can_handle_messages(plugin):
@@ -432,3 +435,19 @@ def test_notifies_group_members(plugin):
         assert 'sorey' in args[0][0]
         assert '#ladylake' in args[0][0]
         assert args[0][1] != 'LADYLAKE'
+
+
+def test_notify_uses_members_loaded_at_setup(plugin):
+    plugin.handle_message(format_message('glados create group lords'))
+    plugin.handle_message(format_message('glados add rose to group lords'))
+    restarted = groups.Groups(Mock(), Mock(), users=plugin.users,
+                              channels=plugin.channels)
+    restarted.db_session = plugin.db_session
+    restarted.setup()
+    restarted.db_session = Mock()
+
+    restarted.handle_message(format_message('@nobody hello'))
+    restarted.handle_message(format_message('@lords hello'))
+    recipients = [args[0][1] for args in restarted.send.call_args_list]
+    assert sorted(recipients) == ['@patrick', '@rose']
+    assert not restarted.db_session.mock_calls
@@ -0,0 +1,104 @@
+# pylint: disable=redefined-outer-name
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+import sqlalchemy
+
+from plugins import karma
+from plugin_base import DeclarativeBase as Base
+
+
+def format_message(message, channel_id='CHANNEL'):
+    return {
+        'type': 'message',
+        'text': message,
+        'user': 'PATRICK',
+        'channel': channel_id
+    }
+
+
+@pytest.fixture
+def plugin():
+    # use in-memory
+    engine = sqlalchemy.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session_cls = sqlalchemy.orm.sessionmaker(engine)
+    session = session_cls()
+    return karma.Karmator(session, Mock())
+
+
+def query_karma(plugin, name):
+    plugin.handle_message(format_message('karma {}'.format(name)))
+    return plugin.send.call_args[0][0]
+
+
+def test_counts_every_token(plugin):
+    plugin.handle_message(format_message('python++ java-- python++'))
+    assert query_karma(plugin, 'python') == 'python: 2 [2++, 0--]'
+    assert query_karma(plugin, 'java') == 'java: -1 [0++, 1--]'
+
+
+def test_flush_writes_deltas(plugin):
+    plugin.handle_message(format_message('glados++'))
+    assert plugin.db_session.query(karma.KarmaItem).count() == 0
+    plugin.run_timed_event()
+    plugin.handle_message(format_message('glados++ glados--'))
+    plugin.teardown()
+    item = plugin.db_session.query(karma.KarmaItem).one()
+    assert (item.name, item.plus, item.minus) == ('glados', 2, 1)
+    assert query_karma(plugin, 'glados') == 'glados: 1 [2++, 1--]'
+
+
+def test_reads_through_to_db(plugin):
+    plugin.db_session.add(karma.KarmaItem(name='wheatley', plus=0, minus=3))
+    plugin.db_session.commit()
+    assert query_karma(plugin, 'Wheatley') == 'wheatley: -3 [0++, 3--]'
+    plugin.handle_message(format_message('wheatley++'))
+    assert query_karma(plugin, 'wheatley') == 'wheatley: -2 [1++, 3--]'
+
+
+def test_ranks(plugin):
+    plugin.handle_message(format_message('a++ a++ a++ b++ b++ c-- d++'))
+    plugin.handle_message(format_message('karma --top 2'))
+    assert plugin.send.call_args[0][0] == '1. a: 3\n2. b: 2'
+    plugin.handle_message(format_message('karma --bottom'))
+    assert plugin.send.call_args[0][0] == '1. c: -1\n2. d: 1\n3. b: 2\n4. a: 3'
+
+
+def test_ranks_dont_shadow_names(plugin):
+    plugin.handle_message(format_message('top++ top++ bottom--'))
+    assert plugin.can_handle_message(format_message('karma --top'))
+    assert query_karma(plugin, 'top') == 'top: 2 [2++, 0--]'
+    assert query_karma(plugin, 'bottom') == 'bottom: -1 [0++, 1--]'
+
+
+def test_ranks_load_from_db(plugin):
+    plugin.handle_message(format_message('a++ b--'))
+    plugin.teardown()
+    restarted = karma.Karmator(plugin.db_session, Mock())
+    restarted.setup()
+    restarted.handle_message(format_message('karma --top 1'))
+    assert restarted.send.call_args[0][0] == '1. a: 1'
+
+
+def test_history(plugin):
+    old = datetime.now() - timedelta(days=40)
+    plugin.db_session.add(karma.KarmaEvent(name='cake', delta=1, time=old))
+    plugin.db_session.commit()
+    plugin.handle_message(format_message('cake-- cake-- cake++'))
+    plugin.handle_message(format_message('karma cake over 30 days'))
+    assert plugin.send.call_args[0][0] == 'cake over 30 days: -1 [1++, 2--]'
+
+
+def test_leaderboard_matches_sorting():
+    leaderboard = karma.Leaderboard({'x': 4})
+    expected = {'x': 4}
+    for i in range(200):
+        name = 'n{}'.format(i % 17)
+        delta = 1 if i % 3 else -1
+        leaderboard.add(name, delta)
+        expected[name] = expected.get(name, 0) + delta
+    ranked = sorted(expected.items(), key=lambda item: (item[1], item[0]))
+    assert leaderboard.bottom(5) == ranked[:5]
+    assert leaderboard.top(5) == ranked[::-1][:5]
@@ -0,0 +1,49 @@
+import pytest
+
+from plugins import lor_deckcode
+from plugins.lor_deckcode import (DecodeError, decode_decklist,
+                                  encode_decklist, parse_decklist)
+
+# from the LoR deck code documentation
+DECK_CODE = 'CEAAECABAQJRWHBIFU2DOOYIAEBAMCIMCINCILJZAICACBANE4VCYBABAILR2HRL'
+
+
+def test_decode():
+    deck = parse_decklist(DECK_CODE)
+    assert len(deck) == 24
+    assert deck[0] == ('01PZ019', 2)
+    assert deck[-1] == ('01IO043', 1)
+    assert sum(count for _, count in deck) == 40
+
+
+def test_round_trip():
+    deck = [('01DE012', 3), ('02BW026', 3), ('01IO009', 2), ('06MT001', 1),
+            ('01PZ040', 4)]
+    code = encode_decklist(deck)
+    assert sorted(parse_decklist(code)) == sorted(deck)
+    assert sorted(parse_decklist(encode_decklist(parse_decklist(
+        DECK_CODE
+    )))) == sorted(parse_decklist(DECK_CODE))
+    with pytest.raises(ValueError):
+        encode_decklist([('01XX001', 1)])
+
+
+def test_bad_codes():
+    # every truncation fails cleanly rather than hanging or crashing
+    for end in range(len(DECK_CODE)):
+        try:
+            parse_decklist(DECK_CODE[:end])
+        except DecodeError:
+            pass
+    for code in ('', 'not a deck code', 'AAAAAAAA', 'CEAAE'):
+        with pytest.raises(DecodeError):
+            parse_decklist(code)
+
+
+def test_cached(monkeypatch):
+    deck = decode_decklist(DECK_CODE)
+
+    def fail(deckstr):
+        raise AssertionError('decoded {} again'.format(deckstr))
+    monkeypatch.setattr(lor_deckcode, 'parse_decklist', fail)
+    assert decode_decklist(DECK_CODE) is deck
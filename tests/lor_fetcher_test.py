@@ -0,0 +1,175 @@
+# pylint: disable=redefined-outer-name
+import json
+import os
+import pickle
+from unittest.mock import Mock
+
+import pytest
+
+from plugins import lor_fetcher
+from plugins.lor_deckcode import DecodeError, encode_decklist
+from plugins.lor_fetcher import DecklistRenderer, LoRFetcher, init_cardsearcher
+
+
+def card_json(code, name, card_type='Unit', supertype='', levelup=''):
+    return {
+        'cardCode': code,
+        'name': name,
+        'type': card_type,
+        'supertype': supertype,
+        'subtypes': [],
+        'cost': 1,
+        'attack': 1,
+        'health': 1,
+        'descriptionRaw': '',
+        'levelupDescriptionRaw': levelup,
+        'keywords': [],
+        'spellSpeed': '',
+        'rarity': 'COMMON',
+        'region': 'Demacia',
+        'collectible': True,
+        'assets': [{'gameAbsolutePath': 'http://example.com/{}.png'.format(
+            code
+        )}],
+        'associatedCardRefs': [],
+    }
+
+
+def write_set(path, fname, cards):
+    with open(os.path.join(path, fname), 'w', encoding='utf-8') as set_file:
+        set_file.write(json.dumps(cards))
+
+
+@pytest.fixture
+def paths(tmpdir):
+    data_path = str(tmpdir.mkdir('lorcards'))
+    write_set(data_path, 'set1-en_us.json', [
+        card_json('01DE012', 'Garen', supertype='Champion',
+                  levelup='I\'ve struck twice.'),
+        card_json('01DE012T2', 'Garen', supertype='Champion'),
+        card_json('01DE020', 'Vanguard Sergeant'),
+        card_json('01DE036', 'Vanguard Bannerman'),
+    ])
+    return data_path, str(tmpdir.join('lorcards.pickle'))
+
+
+def test_snapshot_reused(paths, monkeypatch):
+    data_path, snapshot_path = paths
+    searcher = init_cardsearcher(data_path, snapshot_path)
+    assert os.path.exists(snapshot_path)
+    assert searcher.get_card_by_id('01DE012').name == 'Garen'
+
+    def fail(*args):
+        raise AssertionError('set files parsed again')
+    monkeypatch.setattr(lor_fetcher, 'load_set', fail)
+    searcher = init_cardsearcher(data_path, snapshot_path)
+    assert searcher.get_card_by_id('01DE012').name == 'Garen'
+    assert sorted(card.code for card in searcher.search('t:champion')) == \
+        ['01DE012', '01DE012T2']
+
+
+def test_snapshot_rebuilt_on_change(paths):
+    data_path, snapshot_path = paths
+    init_cardsearcher(data_path, snapshot_path)
+    write_set(data_path, 'set2-en_us.json',
+              [card_json('02DE001', 'Laurent Protege')])
+    searcher = init_cardsearcher(data_path, snapshot_path)
+    assert searcher.get_card('laurent protege')[0].code == '02DE001'
+    assert sorted(searcher.sets) == ['set1-en_us.json', 'set2-en_us.json']
+
+
+def test_snapshot_ignored_if_unreadable(paths):
+    data_path, snapshot_path = paths
+    with open(snapshot_path, 'wb') as snapshot_file:
+        pickle.dump({'version': -1}, snapshot_file)
+    searcher = init_cardsearcher(data_path, snapshot_path)
+    assert searcher.get_card_by_id('01DE012').name == 'Garen'
+
+
+def test_misspelt_and_partial_names(paths):
+    searcher = init_cardsearcher(*paths)
+    assert searcher.get_card('Garen')[0].code == '01DE012'
+    assert searcher.get_card('gaern')[0].code == '01DE012'
+    assert searcher.get_card('gaern 2')[0].code == '01DE012T2'
+    assert searcher.get_card('vangaurd sargent')[0].code == '01DE020'
+    assert searcher.get_card('vanguard b')[0].code == '01DE036'
+    assert searcher.get_card('teemo') is None
+    assert searcher.complete('Vanguard', 5) == ['vanguard bannerman',
+                                                'vanguard sergeant']
+
+
+def field_texts(attachments):
+    return [field['text'] for field in attachments[0]['blocks'][0]['fields']]
+
+
+def test_decklists(paths):
+    renderer = DecklistRenderer(init_cardsearcher(*paths))
+    deck_code = encode_decklist([('01DE012', 3), ('01DE020', 2),
+                                 ('01DE999', 1)])
+    attachments = renderer.render(deck_code)
+    texts = field_texts(attachments)
+    assert '[1] Garen x3' in texts
+    assert '[1] Vanguard Sergeant x2' in texts
+    # cards missing from the set files are listed rather than failing
+    assert texts[-2:] == ['*Other*', '01DE999 x1']
+    assert renderer.render(' {}== '.format(deck_code.lower())) is attachments
+
+    decks = renderer.render_many([deck_code, 'nonsense', deck_code.lower(),
+                                  deck_code + '=='])
+    assert list(decks) == [deck_code, 'NONSENSE']
+    assert decks[deck_code] is attachments
+    assert isinstance(decks['NONSENSE'], DecodeError)
+
+
+def test_decklists_dropped_on_reload(paths):
+    plugin = LoRFetcher(None, Mock())
+    plugin.use_card_searcher(init_cardsearcher(*paths))
+    deck_code = encode_decklist([('01DE012', 3)])
+    msg = {'type': 'message', 'channel': 'D1',
+           'text': '{{{{{}}}}} and {{{{{}}}}}'.format(deck_code, 'nonsense')}
+    plugin.handle_message(msg)
+    assert plugin.send.call_count == 2
+    rendered = plugin.send.call_args_list[0][0][2]
+    assert '[1] Garen x3' in field_texts(rendered)
+    assert plugin.send.call_args_list[1][0][0].startswith(
+        'Could not decode decklist NONSENSE'
+    )
+    plugin.use_card_searcher(init_cardsearcher(*paths))
+    assert plugin.decklists.render(deck_code) is not rendered
+
+
+def test_reload(paths, monkeypatch):
+    data_path, snapshot_path = paths
+    plugin = LoRFetcher(None, Mock(), data_path=data_path,
+                        snapshot_path=snapshot_path)
+    plugin.setup()
+    searcher = plugin.card_searcher
+    plugin.run_timed_event()
+    assert plugin.card_searcher is searcher
+
+    loaded = []
+    load_set = lor_fetcher.load_set
+
+    def counted_load_set(fname, path):
+        loaded.append(fname)
+        return load_set(fname, path)
+    monkeypatch.setattr(lor_fetcher, 'load_set', counted_load_set)
+
+    # a set file still being copied in is left until it's complete
+    with open(os.path.join(data_path, 'set2-en_us.json'), 'w') as set_file:
+        set_file.write('[{"cardCode": ')
+    plugin.run_timed_event()
+    assert plugin.card_searcher is searcher
+    write_set(data_path, 'set2-en_us.json', [{'cardCode': '02DE001'}])
+    plugin.run_timed_event()
+    assert plugin.card_searcher is searcher
+
+    write_set(data_path, 'set2-en_us.json',
+              [card_json('02DE001', 'Laurent Protege')])
+    plugin.run_timed_event()
+    # only the new set is read
+    assert loaded == ['set2-en_us.json'] * 3
+    searcher = plugin.card_searcher
+    assert searcher.get_card('laurent protege')[0].code == '02DE001'
+    assert searcher.get_card('garen')[0].code == '01DE012'
+    assert plugin.decklists.searcher is searcher
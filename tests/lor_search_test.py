@@ -0,0 +1,78 @@
+# pylint: disable=redefined-outer-name
+import pytest
+
+from plugins.lor_search import (Card, CardIndex, QueryError, is_search,
+                                parse_query)
+
+
+def make_card(name, card_type='Unit', cost=1, attack=1, health=1,
+              text='', keywords=None, supertype='', region='Demacia',
+              collectible=True):
+    return Card(
+        code=name.upper(),
+        name=name,
+        type=card_type,
+        supertype=supertype,
+        subtypes=(),
+        cost=cost,
+        attack=attack,
+        health=health,
+        description=text,
+        levelup_description='',
+        keywords=tuple(keywords or ()),
+        spell_speed='Fast' if card_type == 'Spell' else '',
+        rarity='COMMON',
+        region=region,
+        collectible=collectible,
+        image_url='',
+        associated=(),
+    )
+
+
+@pytest.fixture
+def index():
+    return CardIndex([
+        make_card('Braum', attack=0, health=6, cost=4, supertype='Champion',
+                  text='The first time I survive damage, summon a Poro.',
+                  region='Freljord'),
+        make_card('Garen', attack=5, health=5, cost=5, supertype='Champion',
+                  keywords=['Regeneration']),
+        make_card('Vanguard Sergeant', attack=3, health=3, cost=3,
+                  keywords=['Challenger']),
+        make_card('Single Combat', card_type='Spell', cost=2, attack=0,
+                  health=0, text='Two units deal damage to each other.'),
+        make_card('Braum Token', attack=0, collectible=False,
+                  supertype='Champion', text='Survives.'),
+    ])
+
+
+def names(cards):
+    return [card.name for card in cards]
+
+
+def test_example_query(index):
+    assert names(index.search('t:champion pow=0 o:survive')) == \
+        ['Braum', 'Braum Token']
+
+
+def test_filters(index):
+    assert names(index.search('o:"deal damage"')) == ['Single Combat']
+    assert names(index.search('o:challenger')) == ['Vanguard Sergeant']
+    assert names(index.search('t:spell s:fast')) == ['Single Combat']
+    assert names(index.search('reg:frel')) == ['Braum']
+    assert names(index.search('cmc>=3 cmc<5')) == ['Vanguard Sergeant',
+                                                   'Braum']
+    assert names(index.search('pow!=0 tou>4')) == ['Garen']
+    assert names(index.search('garen t:unit')) == ['Garen']
+    assert index.search('t:landmark') == []
+
+
+def test_query_errors():
+    assert is_search('t:unit')
+    assert not is_search('Vanguard Sergeant')
+    assert parse_query('o:"deal damage" cmc<3') == [
+        ('o', ':', 'deal damage'), ('cmc', '<', '3')
+    ]
+    for query in ('x:foo', 'cmc=three', 't>unit'):
+        with pytest.raises(QueryError):
+            parse_query(query)
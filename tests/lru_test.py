@@ -0,0 +1,27 @@
+from lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    evicted = []
+    cache = LRUCache(2, on_evict=lambda key, value: evicted.append(key))
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert evicted == ['b']
+    assert 'b' not in cache
+    assert [key for key, _ in cache.oldest()] == ['a', 'c']
+
+
+def test_ttl():
+    now = [0]
+    cache = LRUCache(2, ttl=10, clock=lambda: now[0])
+    cache.put('a', 1)
+    now[0] = 5
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    now[0] = 10
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert len(cache) == 1
@@ -0,0 +1,60 @@
+import pytest
+import sqlalchemy
+
+from migrate import count_rows, migrate
+from plugins.groups import Group, GroupUser
+from plugins.karma import KarmaItem
+from plugins.what_is import Item
+from storage import Storage, create_engine
+
+
+def test_copies_every_row(tmpdir):
+    source = create_engine('sqlite:///{}'.format(tmpdir.join('source.db')))
+    session = Storage(source).session()
+    for i in range(5):
+        session.add(KarmaItem(name='item{}'.format(i), plus=i, minus=0))
+    user = GroupUser(name='patrick', user_id='PATRICK')
+    session.add(Group(name='overwatch', owner=user, users=[user]))
+    session.commit()
+    session.remove()
+
+    target = create_engine('sqlite:///{}'.format(tmpdir.join('target.db')))
+    copied = migrate(source, target, batch_size=2)
+
+    assert copied['karmaitems'] == 5
+    assert copied['g_gu_assoc'] == 1
+    session = Storage(target).session()
+    assert [item.plus for item in session.query(KarmaItem)] == [0, 1, 2, 3, 4]
+    assert session.query(Group).one().users[0].name == 'patrick'
+
+
+def test_refuses_tables_with_rows_unless_forced(tmpdir):
+    source = create_engine('sqlite:///{}'.format(tmpdir.join('source.db')))
+    target = create_engine('sqlite:///{}'.format(tmpdir.join('target.db')))
+    for engine, name in ((source, 'new'), (target, 'old')):
+        session = Storage(engine).session()
+        session.add(KarmaItem(name=name, plus=1, minus=0))
+        session.commit()
+        session.remove()
+    with pytest.raises(ValueError) as excinfo:
+        migrate(source, target)
+    assert 'karmaitems' in str(excinfo.value)
+    assert migrate(source, target, force=True)['karmaitems'] == 1
+    session = Storage(target).session()
+    assert [item.name for item in session.query(KarmaItem)] == ['new']
+
+
+def test_failed_table_is_not_half_copied(tmpdir):
+    source = create_engine('sqlite:///{}'.format(tmpdir.join('source.db')))
+    with source.begin() as connection:
+        connection.execute(sqlalchemy.text('DROP INDEX ix_items_lower_name'))
+    session = Storage(source).session()
+    for name in ['cake', 'portal', 'Cake']:
+        session.add(Item(name=name, alias='a lie'))
+    session.commit()
+    session.remove()
+
+    target = create_engine('sqlite:///{}'.format(tmpdir.join('target.db')))
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        migrate(source, target, batch_size=2)
+    assert count_rows(target, Item.__table__) == 0
@@ -0,0 +1,19 @@
+from concurrent.futures import Future
+from unittest.mock import Mock
+
+from plugin_base import GladosPluginBase
+
+
+def test_send_many_fallback_returns_a_future():
+    sent = Future()
+    sent.set_result({'ok': True})
+    send = Mock(side_effect=[sent, {'ok': True, 'plain': True},
+                             ValueError('channel_not_found')])
+    plugin = GladosPluginBase(None, send)
+    combined = plugin.send_many('hi', ['@sorey', '@rose', '@nobody'])
+    assert isinstance(combined, Future)
+    results = combined.result(5)
+    assert results['@sorey'] == {'ok': True}
+    assert results['@rose']['plain']
+    assert isinstance(results['@nobody'], ValueError)
+    send.assert_called_with('hi', '@nobody')
@@ -1,4 +1,5 @@
 # pylint: disable=redefined-outer-name
+from datetime import datetime, timedelta
 from unittest.mock import Mock
 
 import pytest
@@ -53,3 +54,38 @@ def test_can_handle_messages(plugin):
 
 
 # TODO: use freezegun and actually test this
+
+
+def test_only_due_reminders_fire(plugin):
+    now = datetime.now()
+    plugin.db_session.add(remind.Event(user='patrick', channel='CHANNEL',
+                                       what='to feed the rooster',
+                                       time=now - timedelta(seconds=5)))
+    plugin.db_session.add(remind.Event(user='patrick', channel='CHANNEL',
+                                       what='to buy a rooster',
+                                       time=now + timedelta(hours=1)))
+    plugin.db_session.commit()
+    plugin.setup()
+    plugin.send.reset_mock()
+
+    plugin.run_timed_event()
+    assert plugin.send.call_count == 1
+    assert 'feed the rooster' in plugin.send.call_args[0][0]
+
+    plugin.send.reset_mock()
+    plugin.run_timed_event()
+    assert not plugin.send.called
+    assert plugin.db_session.query(remind.Event).count() == 1
+
+
+def test_new_reminder_is_scheduled(plugin):
+    plugin.handle_message(format_message(
+        'glados remind me in 5 minutes to check the oven'
+    ))
+    event = plugin.db_session.query(remind.Event).filter_by(
+        what='to check the oven'
+    ).one()
+    assert (event.time, event.id) in plugin.upcoming
+    when = event.time
+    assert timedelta(minutes=4) < when - datetime.now() <= \
+        timedelta(minutes=5)
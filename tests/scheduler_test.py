@@ -0,0 +1,48 @@
+import datetime
+
+from scheduler import CronSchedule
+
+START = datetime.datetime(2020, 1, 1, 12, 0, 0)
+
+
+class FakePlugin:
+    def __init__(self, interval, missed_runs='once'):
+        self.interval = interval
+        self.missed_runs = missed_runs
+        self.last_run_time = START
+
+
+def at(minutes=0, seconds=0):
+    return START + datetime.timedelta(minutes=minutes, seconds=seconds)
+
+
+def test_next_deadline_is_earliest_plugin():
+    hourly = FakePlugin('0 * * * *')
+    minutely = FakePlugin('* * * * *')
+    schedule = CronSchedule([hourly, minutely])
+    assert schedule.next_deadline() == at(minutes=1)
+    assert schedule.pop_due(at(seconds=59)) == []
+    assert schedule.pop_due(at(minutes=1)) == [minutely]
+    assert schedule.next_deadline() == at(minutes=2)
+
+
+def test_second_precision():
+    plugin = FakePlugin('* * * * * */10')
+    schedule = CronSchedule([plugin])
+    assert schedule.next_deadline() == at(seconds=10)
+    assert schedule.pop_due(at(seconds=10)) == [plugin]
+    assert schedule.next_deadline() == at(seconds=20)
+
+
+def test_missed_run_policies():
+    once = FakePlugin('* * * * *', 'once')
+    every = FakePlugin('* * * * *', 'all')
+    skip = FakePlugin('* * * * *', 'skip')
+    schedule = CronSchedule([once, every, skip])
+    due = schedule.pop_due(at(minutes=3, seconds=30))
+    assert due.count(once) == 1
+    assert due.count(every) == 3
+    assert due.count(skip) == 0
+    assert schedule.next_deadline() == at(minutes=4)
+    due = schedule.pop_due(at(minutes=4))
+    assert due.count(skip) == 1
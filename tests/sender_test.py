@@ -0,0 +1,143 @@
+# pylint: disable=redefined-outer-name
+import threading
+
+import pytest
+
+from sender import SlackError, SlackSender, TokenBucket, gather
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+        self.blocked = {}
+        self.waiting = threading.Event()
+        self.rate_limited = 0
+
+    def post(self, url, data, timeout=None):
+        gate = self.blocked.get(data['channel'])
+        if gate is not None:
+            self.waiting.set()
+            gate.wait(5)
+        with self.lock:
+            self.sent.append((data['channel'], data.get('text')))
+            if self.rate_limited:
+                self.rate_limited -= 1
+                return FakeResponse({'ok': False, 'error': 'ratelimited'},
+                                    429, {'Retry-After': '0'})
+        if data.get('text') == 'bad':
+            return FakeResponse({'ok': False, 'error': 'channel_not_found'})
+        return FakeResponse({'ok': True, 'channel': data['channel']})
+
+
+@pytest.fixture
+def session():
+    return FakeSession()
+
+
+@pytest.fixture
+def sender(session):
+    slack_sender = SlackSender(workers=4, session=session, rate=1000,
+                               burst=1000)
+    yield slack_sender
+    slack_sender.close()
+
+
+def test_send_returns_future(sender):
+    future = sender.send('url', {'channel': 'C1', 'text': 'hi'})
+    assert future.result(5) == {'ok': True, 'channel': 'C1'}
+
+
+def test_keeps_channel_order(sender, session):
+    futures = [sender.send('url', {'channel': 'C1', 'text': str(i)})
+               for i in range(20)]
+    for future in futures:
+        future.result(5)
+    sent_text = '\n'.join(text for _, text in session.sent)
+    assert sent_text == '\n'.join(str(_) for _ in range(20))
+
+
+def test_slow_channel_does_not_block_others(sender, session):
+    gate = threading.Event()
+    session.blocked['SLOW'] = gate
+    slow = sender.send('url', {'channel': 'SLOW', 'text': 'first'})
+    fast = sender.send('url', {'channel': 'FAST', 'text': 'second'})
+    fast.result(5)
+    assert not slow.done()
+    gate.set()
+    slow.result(5)
+    assert session.sent == [('FAST', 'second'), ('SLOW', 'first')]
+
+
+def test_slack_errors_are_raised(sender):
+    future = sender.send('url', {'channel': 'C1', 'text': 'bad'})
+    with pytest.raises(SlackError):
+        future.result(5)
+    assert future.exception().error == 'channel_not_found'
+
+
+def test_coalesces_queued_plain_text(sender, session):
+    gate = session.blocked['C1'] = threading.Event()
+    # an idle channel's message is sent straight away, on its own
+    first = sender.send('url', {'channel': 'C1', 'text': 'first'})
+    assert session.waiting.wait(5)
+    futures = [sender.send('url', {'channel': 'C1', 'text': str(i)})
+               for i in range(3)]
+    attachment = sender.send('url', {'channel': 'C1', 'text': 'card',
+                                     'attachments': '[]'})
+    last = sender.send('url', {'channel': 'C1', 'text': 'last'})
+    gate.set()
+    sender.close()
+    assert session.sent == [
+        ('C1', 'first'),
+        ('C1', '0\n1\n2'),
+        ('C1', 'card'),
+        ('C1', 'last'),
+    ]
+    assert first.result()['ok']
+    assert futures[0].result() is futures[2].result()
+    assert attachment.result()['ok']
+    assert last.result()['ok']
+
+
+def test_retries_after_rate_limit(sender, session):
+    session.rate_limited = 2
+    future = sender.send('url', {'channel': 'C1', 'text': 'hi'})
+    assert future.result(5)['ok']
+    assert len(session.sent) == 3
+
+
+def test_gather_collects_every_result(sender, session):
+    gate = threading.Event()
+    session.blocked['@sorey'] = gate
+    combined = gather({
+        recipient: sender.send('url', {'channel': recipient, 'text': text})
+        for recipient, text in [('@sorey', 'hi'), ('@rose', 'bad')]
+    })
+    assert not combined.done()
+    gate.set()
+    results = combined.result(5)
+    assert results['@sorey']['ok']
+    assert results['@rose'].error == 'channel_not_found'
+    assert gather({}).result(0) == {}
+
+
+def test_token_bucket():
+    now = [0]
+    bucket = TokenBucket(1, 2, clock=lambda: now[0])
+    assert bucket.delay() == 0
+    assert bucket.delay() == 0
+    assert bucket.delay() == 1
+    assert bucket.delay() == 2
+    now[0] = 10
+    assert bucket.delay() == 0
@@ -0,0 +1,74 @@
+from threading import Thread
+
+import pytest
+import sqlalchemy
+
+from plugins.karma import KarmaItem
+from storage import Storage, create_engine, handler_session, load_config
+
+
+@pytest.fixture
+def storage(tmpdir):
+    url = 'sqlite:///{}'.format(tmpdir.join('memory.db'))
+    storage = Storage(create_engine(url))
+    yield storage
+    storage.close()
+
+
+def test_uses_wal(storage):
+    with storage.engine.connect() as connection:
+        mode = connection.execute(sqlalchemy.text('PRAGMA journal_mode'))
+        assert mode.scalar() == 'wal'
+
+
+def test_plugins_do_not_share_pending_changes(storage):
+    first = storage.session()
+    second = storage.session()
+    first.add(KarmaItem(name='edward', plus=1, minus=0))
+    second.add(KarmaItem(name='alphonse', plus=1, minus=0))
+    second.commit()
+    first.rollback()
+    names = [item.name for item in second.query(KarmaItem)]
+    assert names == ['alphonse']
+
+
+def test_handler_session_commits_or_rolls_back(storage):
+    session = storage.session()
+    with handler_session(session):
+        session.add(KarmaItem(name='roy', plus=1, minus=0))
+    with pytest.raises(ValueError):
+        with handler_session(session):
+            session.add(KarmaItem(name='envy', plus=0, minus=1))
+            raise ValueError()
+    names = [item.name for item in session.query(KarmaItem)]
+    assert names == ['roy']
+
+
+def test_threads_get_their_own_session(storage):
+    session = storage.session()
+    seen = []
+
+    def record():
+        seen.append(session())
+
+    threads = [Thread(target=record) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen[0] is not seen[1]
+
+
+def test_loads_config(tmpdir):
+    config_file = tmpdir.join('storage.json')
+    assert load_config(str(config_file)) == {}
+    config_file.write(
+        '{"url": "sqlite://", "pragmas": {"synchronous": "FULL"}}'
+    )
+    config = load_config(str(config_file))
+    assert config['url'] == 'sqlite://'
+    assert config['pragmas']['synchronous'] == 'FULL'
+    assert config['pragmas']['journal_mode'] == 'WAL'
+    config_file.write('{"uri": "sqlite://"}')
+    with pytest.raises(ValueError):
+        load_config(str(config_file))
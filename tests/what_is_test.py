@@ -0,0 +1,89 @@
+# pylint: disable=redefined-outer-name
+from unittest.mock import Mock
+
+import pytest
+import sqlalchemy
+
+from plugins import what_is
+from plugin_base import DeclarativeBase as Base
+
+
+def format_message(message):
+    return {
+        'type': 'message',
+        'text': message,
+        'user': 'PATRICK',
+        'channel': 'CHANNEL'
+    }
+
+
+@pytest.fixture
+def session():
+    # use in-memory
+    engine = sqlalchemy.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session_cls = sqlalchemy.orm.sessionmaker(engine)
+    return session_cls()
+
+
+@pytest.fixture
+def plugin(session):
+    plugin = what_is.WhatIs(session, Mock())
+    plugin.setup()
+    return plugin
+
+
+def ask(plugin, message):
+    plugin.handle_message(format_message(message))
+    return plugin.send.call_args[0][0]
+
+
+def test_remembers(plugin):
+    assert ask(plugin, 'glados, know that the cake is a lie') == \
+        'I will remember that the cake is a lie'
+    assert ask(plugin, 'glados what is The Cake?') == 'the cake is a lie'
+    assert ask(plugin, 'glados know that The Cake is delicious') == \
+        'I will remember that The Cake is delicious'
+    assert ask(plugin, 'glados what is the cake') == 'The Cake is delicious'
+    assert plugin.db_session.query(what_is.Item).count() == 1
+
+
+def test_suggests_near_misses(plugin):
+    ask(plugin, 'glados know that companion cube is your friend')
+    ask(plugin, 'glados know that aperture science is a lab')
+    assert ask(plugin, 'glados what is companion') == \
+        'companion is companion\nDid you mean: companion cube?'
+    assert ask(plugin, 'glados what is aperature science') == \
+        'aperature science is aperature science\n' \
+        'Did you mean: aperture science?'
+    assert ask(plugin, 'glados what is potato') == 'potato is potato'
+
+
+def test_merges_names_differing_in_case(session, capsys):
+    session.execute(sqlalchemy.text('DROP INDEX ix_items_lower_name'))
+    session.add(what_is.Item(name='GLaDOS', alias='old'))
+    session.add(what_is.Item(name='glados', alias='new'))
+    session.commit()
+    plugin = what_is.WhatIs(session, Mock())
+    plugin.setup()
+    session.commit()
+    assert "'GLaDOS' is 'old'" in capsys.readouterr().out
+    assert ask(plugin, 'glados what is GLADOS') == 'glados is new'
+    session.add(what_is.Item(name='Glados', alias='again'))
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        session.commit()
+
+
+def test_keeps_names_differing_in_punctuation(session, capsys):
+    session.add(what_is.Item(name='foo', alias='old'))
+    session.add(what_is.Item(name='foo?', alias='new'))
+    session.commit()
+    plugin = what_is.WhatIs(session, Mock())
+    plugin.setup()
+    session.commit()
+    assert capsys.readouterr().out == ''
+    assert session.query(what_is.Item).count() == 2
+    assert ask(plugin, 'glados what is foo') == 'foo? is new'
+    ask(plugin, 'glados know that Foo is newer')
+    assert ask(plugin, 'glados what is foo?') == 'Foo is newer'
+    assert session.query(what_is.Item).count() == 2
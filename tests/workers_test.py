@@ -0,0 +1,64 @@
+import threading
+
+from workers import HandlerPool
+
+
+class FakePlugin:
+    plugin_name = 'Fake'
+
+    def __init__(self, max_concurrency, handler_timeout=30):
+        self.max_concurrency = max_concurrency
+        self.handler_timeout = handler_timeout
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.handled = []
+
+    def handle_message(self, msg, gate):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        gate.wait(5)
+        with self.lock:
+            self.active -= 1
+            self.handled.append(msg)
+
+
+def test_limits_plugin_concurrency():
+    pool = HandlerPool(8)
+    plugin = FakePlugin(2)
+    gate = threading.Event()
+    for i in range(6):
+        pool.submit(plugin, plugin.handle_message, i, gate)
+    gate.set()
+    pool.close()
+    assert plugin.peak <= 2
+    assert sorted(plugin.handled) == list(range(6))
+
+
+def test_serialized_plugin_keeps_order():
+    pool = HandlerPool(8)
+    plugin = FakePlugin(1)
+    gate = threading.Event()
+    gate.set()
+    for i in range(10):
+        pool.submit(plugin, plugin.handle_message, i, gate)
+    pool.close()
+    assert plugin.handled == list(range(10))
+
+
+def test_hung_handler_releases_slot():
+    pool = HandlerPool(4)
+    plugin = FakePlugin(1, handler_timeout=0)
+    hung = threading.Event()
+    pool.submit(plugin, plugin.handle_message, 'hung', hung)
+    done = threading.Event()
+    done.set()
+    pool.submit(plugin, plugin.handle_message, 'next', done)
+    for _ in range(50):
+        if plugin.handled:
+            break
+        done.wait(0.01)
+    assert plugin.handled == ['next']
+    hung.set()
+    pool.close()
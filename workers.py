@@ -0,0 +1,73 @@
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock
+from traceback import print_exc
+
+HANDLER_WORKERS = 8
+
+
+class HandlerPool:
+    '''
+        Runs plugin handlers on a bounded pool of worker threads.
+        A plugin has at most `max_concurrency` handlers running at once and
+        the rest wait their turn in order. A handler that runs longer than
+        the plugin's `handler_timeout` is reported and stops counting
+        against that limit, so one hung call cannot wedge the plugin.
+    '''
+
+    def __init__(self, workers=HANDLER_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = Lock()
+        self.idle = Condition(self.lock)
+        self.tokens = itertools.count()
+        # plugin => {token: start time} of handlers currently running
+        self.running = {}
+        # plugin => deque of (fn, args) waiting for a free slot
+        self.waiting = {}
+
+    def submit(self, plugin, fn, *args):
+        with self.lock:
+            self.waiting.setdefault(plugin, deque()).append((fn, args))
+            self.expire(plugin)
+            self.fill(plugin)
+
+    def fill(self, plugin):
+        running = self.running.setdefault(plugin, {})
+        waiting = self.waiting.get(plugin)
+        while waiting and len(running) < plugin.max_concurrency:
+            fn, args = waiting.popleft()
+            token = next(self.tokens)
+            running[token] = time.monotonic()
+            self.executor.submit(self.run, plugin, token, fn, args)
+
+    def expire(self, plugin):
+        running = self.running.get(plugin, {})
+        deadline = time.monotonic() - plugin.handler_timeout
+        for token, start_time in list(running.items()):
+            if start_time < deadline:
+                print('{} handler still running after {}s'.format(
+                    plugin.plugin_name, plugin.handler_timeout
+                ))
+                del running[token]
+
+    def run(self, plugin, token, fn, args):
+        try:
+            fn(*args)
+        # pylint: disable=bare-except
+        except:
+            print_exc()
+        finally:
+            with self.lock:
+                self.running[plugin].pop(token, None)
+                self.fill(plugin)
+                self.idle.notify_all()
+
+    def close(self):
+        '''
+            Wait for every queued and running handler to finish.
+        '''
+        with self.idle:
+            self.idle.wait_for(lambda: not any(self.waiting.values()))
+        self.executor.shutdown(wait=True)